@@ -0,0 +1,172 @@
+"""
+Command line entry point: python -m sim <command> ...
+
+  run     one simulation, headless by default (--visual to watch or export it)
+  sweep   a configuration sweep across CPU cores (see sweep.py)
+  render  a recorded trace to a video or PNG frames
+  bench   the benchmarks in bench.py, including import cold-start time
+
+Only the modules a command needs are imported, so a headless run never
+loads matplotlib, requests or tokenc.
+"""
+import argparse
+import json
+import os
+import sys
+
+# The sim modules import each other by flat name (from engine import ...)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# The layout main.py runs when started directly
+DEFAULT_SPEC = {
+    "hospital": [
+        [-1, 1, -2, -2, -2],
+        [-2, 0, 0, 0, -2],
+        [-2, 0, 0, 0, -2],
+        [-2, 0, 0, 0, -2],
+    ],
+    "nurse_positions": [[1, 1], [1, 2], [1, 3]],
+    "doctor_positions": [[2, 1], [2, 2]],
+    "treatment_rooms_config": [
+        {"row": 1, "col": 0, "severity_type": 0},
+        {"row": 3, "col": 4, "severity_type": 1},
+    ],
+}
+
+
+def load_run_spec(path=None):
+    """
+    Read a single-run spec: the hospital, spawn_point and waiting_room_pos
+    of a sweep spec (see sweep.load_spec) plus one configuration's keys at
+    top level. Without a path, the default layout from main.py.
+
+    Returns:
+        (hospital, config, spawn_point, waiting_room_pos)
+    """
+    from sweep import CONFIG_KEYS, config_from_json
+
+    if path is None:
+        spec = DEFAULT_SPEC
+    else:
+        with open(path) as f:
+            spec = json.load(f)
+    config = config_from_json({key: spec[key] for key in CONFIG_KEYS if key in spec})
+    spawn_point = tuple(spec.get("spawn_point", (0, 0)))
+    waiting_room_pos = tuple(spec.get("waiting_room_pos", (0, 1)))
+    return spec["hospital"], config, spawn_point, waiting_room_pos
+
+
+def cmd_run(args):
+    from eventlog import SILENT, console_log
+    from simulation import Simulation, run_sim
+
+    hospital, config, spawn_point, waiting_room_pos = load_run_spec(args.spec)
+    if args.seed is not None:
+        config["seed"] = args.seed
+    sim = Simulation(
+        hospital,
+        spawn_point=spawn_point,
+        waiting_room_pos=waiting_room_pos,
+        log=console_log() if args.verbose else SILENT,
+        **config,
+    )
+
+    if args.visual or args.out:
+        from main import run_visual
+
+        run_visual(sim, max_ticks=args.ticks, interval=args.interval, out_path=args.out, renderer=args.renderer,
+                   spawn_interval=args.spawn_interval)
+        return
+
+    trace = None
+    if args.trace:
+        from recording import TraceRecorder
+
+        trace = TraceRecorder(sim)
+    stats = run_sim(sim, max_ticks=args.ticks, mode="tick" if trace else args.mode,
+                    spawn_interval=args.spawn_interval, trace=trace)
+    if trace is not None:
+        trace.finish().save(args.trace)
+    print(json.dumps(stats))
+
+
+def cmd_sweep(args):
+    import sweep
+
+    sweep.main(args.args)
+
+
+def cmd_render(args):
+    from recording import Trace
+    from render import export_trace
+
+    trace = Trace.load(args.trace)
+    count = export_trace(
+        trace,
+        args.out,
+        fps=args.fps,
+        dpi=args.dpi,
+        num_interp_frames=args.frames,
+        start=args.start,
+        stop=args.stop,
+        step=args.step,
+        workers=args.workers,
+    )
+    print(f"{count} frames -> {args.out}")
+
+
+def cmd_bench(args):
+    import bench
+
+    bench.main(args.benches)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m sim", description="ER simulation tools.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="run one simulation")
+    run.add_argument("spec", nargs="?", help="run spec JSON (see load_run_spec; default: main.py's layout)")
+    run.add_argument("-t", "--ticks", type=int, default=100)
+    run.add_argument("--mode", choices=("tick", "event"), default="event")
+    run.add_argument("--spawn-interval", type=int, default=5)
+    run.add_argument("--seed", type=int, default=None)
+    run.add_argument("-v", "--verbose", action="store_true", help="print the event log")
+    run.add_argument("--trace", help="record every tick to this .npz for `render` (forces tick mode)")
+    run.add_argument("--visual", action="store_true", help="animate the run (run_visual) instead of running headless")
+    run.add_argument("-o", "--out", help="with --visual: write a video or PNG frames instead of showing a window")
+    run.add_argument("--interval", type=int, default=100, help="with --visual: ms per frame")
+    run.add_argument("--renderer", choices=("inline", "process"), default="inline")
+    run.set_defaults(func=cmd_run)
+
+    sweep = commands.add_parser("sweep", help="run a configuration sweep (arguments as for sweep.py)", add_help=False)
+    sweep.add_argument("args", nargs=argparse.REMAINDER)
+    sweep.set_defaults(func=cmd_sweep)
+
+    render = commands.add_parser("render", help="render a recorded trace")
+    render.add_argument("trace", help="trace .npz from `run --trace`")
+    render.add_argument("out", help="video file (.mp4, .gif, ...) or a directory for PNG frames")
+    render.add_argument("--fps", type=int, default=30)
+    render.add_argument("--dpi", type=int, default=100)
+    render.add_argument("--frames", type=int, default=5, help="interpolated frames per tick")
+    render.add_argument("--start", type=int, default=None)
+    render.add_argument("--stop", type=int, default=None)
+    render.add_argument("--step", type=int, default=1)
+    render.add_argument("-j", "--workers", type=int, default=None)
+    render.set_defaults(func=cmd_render)
+
+    bench = commands.add_parser("bench", help="run benchmarks (routes, assignment, ensemble, imports)")
+    bench.add_argument("benches", nargs="*")
+    bench.set_defaults(func=cmd_bench)
+
+    # sweep takes sweep.py's own options, which this parser does not know
+    args, extra = parser.parse_known_args(argv)
+    if extra:
+        if args.command != "sweep":
+            parser.error(f"unrecognized arguments: {' '.join(extra)}")
+        args.args = extra + args.args
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
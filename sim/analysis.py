@@ -0,0 +1,205 @@
+"""
+Array-based congestion analysis behind the reports in main.py.
+
+Everything here works on (rows, cols) NumPy arrays and boolean masks.
+Per-cell {"row", "col", "congestion"} dicts are only built, by point_dicts,
+for the few cells a report actually lists.
+
+AnalysisCache memoizes whole analyses by grid contents and model, so the
+same grid is never uploaded or scored twice.
+"""
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+# Cells averaging below this count as dead zones
+DEAD_ZONE_LEVEL = 0.001
+
+# Analyses AnalysisCache keeps in memory before evicting the least recently used
+ANALYSIS_CACHE_SIZE = 1024
+
+
+def unscored_cells(sim_state):
+    """Cells left out of congestion scoring: the spawn point, the waiting room and the treatment rooms."""
+    cells = [getattr(sim_state, "spawn_point", (0, 0)), getattr(sim_state, "waiting_room_pos", (0, 1))]
+    cells.extend(getattr(sim_state, "treatment_rooms", {}).keys())
+    return cells
+
+
+def average_congestion(congestion_sum, congestion_count, masked_cells=()):
+    """Average entities per occupied tick for each cell, with masked_cells set to 0."""
+    avg_congestion = np.zeros(congestion_sum.shape)
+    np.divide(congestion_sum, congestion_count, out=avg_congestion, where=congestion_count > 0)
+    if masked_cells:
+        rows, cols = zip(*masked_cells)
+        avg_congestion[list(rows), list(cols)] = 0.0
+    return avg_congestion
+
+
+def cell_points(avg_congestion, mask=None):
+    """(rows, cols, congestion) arrays for the cells in mask (all cells by default), in row-major order."""
+    flat = np.flatnonzero(mask) if mask is not None else np.arange(avg_congestion.size)
+    rows, cols = np.divmod(flat, avg_congestion.shape[1])
+    return rows, cols, avg_congestion.ravel()[flat]
+
+
+def iqr_statistics(values):
+    """Summary statistics and the 1.5 * IQR outlier bounds of a 1-D array."""
+    q1, q3 = np.percentile(values, [25, 75])
+    iqr = q3 - q1
+    return {
+        "mean": float(np.mean(values)),
+        "std": float(np.std(values)),
+        "median": float(np.median(values)),
+        "min": float(np.min(values)),
+        "max": float(np.max(values)),
+        "q1": float(q1),
+        "q3": float(q3),
+        "iqr": float(iqr),
+        "lower_bound": float(q1 - 1.5 * iqr),
+        "upper_bound": float(q3 + 1.5 * iqr),
+    }
+
+
+def classify(values, lower_bound, upper_bound):
+    """
+    Masks splitting values into high_congestion (above upper_bound),
+    low_traffic (below lower_bound but not dead), dead_zones (below
+    DEAD_ZONE_LEVEL) and normal. The classes are checked in that order.
+    """
+    high = values > upper_bound
+    low = ~high & (values < lower_bound) & (values > DEAD_ZONE_LEVEL)
+    dead = ~high & ~low & (values < DEAD_ZONE_LEVEL)
+    return {
+        "high_congestion": high,
+        "low_traffic": low,
+        "dead_zones": dead,
+        "normal": ~(high | low | dead),
+    }
+
+
+def top_n(values, mask=None, n=10):
+    """
+    Flat indexes of the n largest values (among mask), largest first.
+
+    Ties are in index order, as a stable sort would leave them. argpartition
+    finds the cutoff, so only the values tied at or above it are sorted.
+    """
+    flat = np.ravel(values)
+    candidates = np.flatnonzero(mask) if mask is not None else np.arange(flat.size)
+    candidate_values = flat[candidates]
+    if n < len(candidates):
+        cutoff = candidate_values[np.argpartition(-candidate_values, n - 1)[n - 1]]
+        keep = candidate_values >= cutoff
+        candidates, candidate_values = candidates[keep], candidate_values[keep]
+    order = np.lexsort((candidates, -candidate_values))[:n]
+    return candidates[order]
+
+
+def point_dicts(avg_congestion, flat_indexes):
+    """[{"row", "col", "congestion"}] for the given flat cell indexes."""
+    cols = avg_congestion.shape[1]
+    values = avg_congestion.ravel()
+    return [
+        {"row": int(i // cols), "col": int(i % cols), "congestion": float(values[i])}
+        for i in np.asarray(flat_indexes).tolist()
+    ]
+
+
+def analysis_key(avg_congestion, model_id=None, base_url=None):
+    """
+    Cache key of one analysis: a SHA-256 of the grid's shape and float64
+    contents, and the model that analyzed it ("local" for the IQR fallback)
+    together with the Wood Wide deployment (base_url) serving that model.
+    """
+    grid = np.ascontiguousarray(avg_congestion, dtype=np.float64)
+    digest = hashlib.sha256(repr(grid.shape).encode())
+    digest.update(grid.tobytes())
+    digest.update(str(model_id or "local").encode())
+    if model_id:
+        digest.update(f"@{(base_url or '').rstrip('/')}".encode())
+    return digest.hexdigest()
+
+
+class AnalysisCache:
+    """
+    Anomaly analysis results keyed by analysis_key, held in memory and,
+    when a directory is given, as one <key>.json file each so they survive
+    across runs. Memory holds at most `maxsize` results (None: unbounded),
+    evicting the least recently used; the disk copy is kept and reloaded
+    on the next get. Cached results are shared between callers and must
+    not be mutated.
+    """
+    def __init__(self, directory=None, maxsize=ANALYSIS_CACHE_SIZE):
+        self.directory = directory
+        self.maxsize = maxsize
+        self.results = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def _remember(self, key, result):
+        with self.lock:
+            self.results[key] = result
+            self.results.move_to_end(key)
+            while self.maxsize is not None and len(self.results) > self.maxsize:
+                self.results.popitem(last=False)
+                self.evictions += 1
+
+    def get(self, key):
+        with self.lock:
+            result = self.results.get(key)
+            if result is not None:
+                self.results.move_to_end(key)
+        if result is None and self.directory is not None:
+            try:
+                with open(self._path(key)) as f:
+                    result = json.load(f)
+            except (OSError, ValueError):
+                result = None
+            if result is not None:
+                self._remember(key, result)
+        if result is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return result
+
+    def put(self, key, result):
+        self._remember(key, result)
+        if self.directory is not None:
+            os.makedirs(self.directory, exist_ok=True)
+            # Write then rename so a reader never sees a partial file; the
+            # temp name is per thread, as background analyses may share a key
+            tmp_path = f"{self._path(key)}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(result, f)
+            os.replace(tmp_path, self._path(key))
+
+    def clear(self):
+        """Drop the in-memory results and reset the counters (disk files are kept)."""
+        with self.lock:
+            self.results.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "size": len(self.results),
+            "maxsize": self.maxsize,
+            "directory": self.directory,
+        }
+
+
+# Shared by every analysis in this process; WOODWIDE_CACHE_DIR adds a disk cache
+ANALYSIS_CACHE = AnalysisCache(os.environ.get("WOODWIDE_CACHE_DIR"))
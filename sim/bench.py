@@ -0,0 +1,230 @@
+import random
+import time
+
+from engine import get_path, heuristic, reconstruct_path
+from dispatch import linear_sum_assignment
+
+
+def legacy_get_path(grid, start, end):
+    """Original queue.PriorityQueue A*, kept as the benchmark baseline."""
+    from queue import PriorityQueue
+    rows, cols = len(grid), len(grid[0])
+    open_set = PriorityQueue()
+    open_set.put((0, start))
+    came_from = {}
+    g_score = {start: 0}
+    f_score = {start: heuristic(start, end)}
+    dir = [(-1, 0), (1, 0), (0, -1), (0, 1)]
+    while not open_set.empty():
+        curr = open_set.get()[1]
+        if curr == end:
+            return reconstruct_path(came_from, curr)
+        for d in dir:
+            neighbor = (curr[0] + d[0], curr[1] + d[1])
+            if 0 <= neighbor[0] < rows and 0 <= neighbor[1] < cols:
+                cell_value = grid[neighbor[0]][neighbor[1]]
+
+                if cell_value == -2:
+                    continue
+                if cell_value in [-1, 4, 5] and neighbor != end:
+                    continue
+
+                tent_g_score = g_score[curr] + 1
+                if tent_g_score < g_score.get(neighbor, float('inf')):
+                    came_from[neighbor] = curr
+                    g_score[neighbor] = tent_g_score
+                    f_score[neighbor] = tent_g_score + heuristic(neighbor, end)
+                    if neighbor not in [i[1] for i in open_set.queue]:
+                        open_set.put((f_score[neighbor], neighbor))
+    return []
+
+
+def make_floor_plan(size, wall_density=0.2, seed=0):
+    """Square floor plan with random walls and an open border corridor."""
+    rng = random.Random(seed)
+    grid = [[0] * size for _ in range(size)]
+    for r in range(1, size - 1):
+        for c in range(1, size - 1):
+            if rng.random() < wall_density:
+                grid[r][c] = -2
+    return grid
+
+
+def _time_routes(fn, grid, routes, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for start, end in routes:
+            fn(grid, start, end)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def bench_get_path(sizes=(25, 50, 100, 200), num_routes=5, repeat=3, seed=0):
+    """
+    Time legacy vs heap A* on random floor plans of each size.
+
+    Returns a list of {"size", "legacy_s", "heap_s", "speedup"} dicts and
+    raises AssertionError if any route differs between the two.
+    """
+    results = []
+    for size in sizes:
+        grid = make_floor_plan(size, seed=seed)
+        rng = random.Random(seed)
+        free = [(r, c) for r in range(size) for c in range(size) if grid[r][c] == 0]
+        routes = [(rng.choice(free), rng.choice(free)) for _ in range(num_routes)]
+        routes.append(((0, 0), (size - 1, size - 1)))
+
+        for start, end in routes:
+            assert get_path(grid, start, end) == legacy_get_path(grid, start, end), (size, start, end)
+
+        legacy_s = _time_routes(legacy_get_path, grid, routes, repeat)
+        heap_s = _time_routes(get_path, grid, routes, repeat)
+        results.append({
+            "size": size,
+            "legacy_s": legacy_s,
+            "heap_s": heap_s,
+            "speedup": legacy_s / heap_s if heap_s > 0 else float('inf'),
+        })
+    return results
+
+
+def bench_assignment(sizes=(50, 100, 200, 400), repeat=3, seed=0):
+    """Time the nurse x (patient, room) assignment solve on square cost matrices."""
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    results = []
+    for size in sizes:
+        cost = rng.integers(0, 4 * size, size=(size, size)).astype(float)
+        best = float('inf')
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            linear_sum_assignment(cost)
+            best = min(best, time.perf_counter() - t0)
+        results.append({"size": size, "solve_s": best})
+    return results
+
+
+def bench_ensemble(replicas=(10, 100, 1000), ticks=300, size=30, seed=0):
+    """
+    Time Ensemble against one Simulation per replica on a random floor plan.
+
+    The per-replica cost of the scalar engine is measured on 10 silent runs
+    and scaled to each replica count.
+    """
+    from eventlog import SILENT
+    from simulation import Simulation, run_sim
+    from ensemble import Ensemble, run_ensemble
+
+    grid = make_floor_plan(size, wall_density=0.12, seed=seed)
+    grid[0][0], grid[0][1] = -1, 1
+    rng = random.Random(seed)
+    free = [(r, c) for r in range(size) for c in range(size) if grid[r][c] == 0 and r + c > 1]
+    rng.shuffle(free)
+    rooms = {pos: {"severity_type": i % 2, "occupancy": 0} for i, pos in enumerate(free[:8])}
+    nurses, doctors = free[8:14], free[14:18]
+
+    t0 = time.perf_counter()
+    for s in range(10):
+        run_sim(Simulation(grid, nurses, doctors, rooms, seed=s, log=SILENT), max_ticks=ticks)
+    per_replica = (time.perf_counter() - t0) / 10
+
+    results = []
+    for n in replicas:
+        t0 = time.perf_counter()
+        run_ensemble(Ensemble(grid, nurses, doctors, rooms, seeds=range(n)), max_ticks=ticks)
+        ensemble_s = time.perf_counter() - t0
+        results.append({
+            "replicas": n,
+            "scalar_s": per_replica * n,
+            "ensemble_s": ensemble_s,
+            "speedup": per_replica * n / ensemble_s,
+        })
+    return results
+
+
+def bench_import_time(modules=("simulation", "sweep", "main"), repeat=3):
+    """
+    Cold-start cost of importing each module in a fresh interpreter.
+
+    Each import runs in its own `python -X importtime` process (best of
+    repeat), with the sim directory first on sys.path. import_s is the
+    cumulative import time Python reports for the module; heavy lists the
+    optional dependencies (plotting, HTTP, prompt compression) that the
+    import pulled in, which should be none for headless entry points.
+    """
+    import os
+    import subprocess
+    import sys
+
+    sim_dir = os.path.dirname(os.path.abspath(__file__))
+    heavy = ("matplotlib", "PIL", "requests", "tokenc")
+    results = []
+    for module in modules:
+        code = f"import sys; import {module}; print(','.join(m for m in {heavy!r} if m in sys.modules))"
+        best = None
+        for _ in range(repeat):
+            proc = subprocess.run(
+                [sys.executable, "-X", "importtime", "-c", code],
+                cwd=sim_dir, capture_output=True, text=True, check=True,
+            )
+            # "import time: self [us] | cumulative | imported package", nesting by indentation
+            for line in proc.stderr.splitlines():
+                fields = line.split("|")
+                if len(fields) == 3 and fields[2].rstrip() == f" {module}":
+                    cumulative = int(fields[1]) / 1e6
+                    if best is None or cumulative < best:
+                        best = cumulative
+        loaded = proc.stdout.strip()
+        results.append({"module": module, "import_s": best, "heavy": loaded.split(",") if loaded else []})
+    return results
+
+
+def print_results(results):
+    print(f"{'grid':>9} {'legacy (s)':>12} {'heap (s)':>10} {'speedup':>9}")
+    for res in results:
+        print(f"{res['size']:>4}x{res['size']:<4} {res['legacy_s']:>12.4f} {res['heap_s']:>10.4f} {res['speedup']:>8.1f}x")
+
+
+BENCHES = ("routes", "assignment", "ensemble", "imports")
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Time the simulation's hot paths.")
+    parser.add_argument("benches", nargs="*", choices=BENCHES, help=f"benchmarks to run (default: all of {', '.join(BENCHES)})")
+    args = parser.parse_args(argv)
+    benches = args.benches or BENCHES
+
+    sections = []
+    if "routes" in benches:
+        sections.append(lambda: print_results(bench_get_path()))
+    if "assignment" in benches:
+        def assignment():
+            print(f"{'staff':>6} {'assignment (s)':>15}")
+            for res in bench_assignment():
+                print(f"{res['size']:>6} {res['solve_s']:>15.4f}")
+        sections.append(assignment)
+    if "ensemble" in benches:
+        def ensemble():
+            print(f"{'replicas':>8} {'scalar (s)':>11} {'ensemble (s)':>13} {'speedup':>9}")
+            for res in bench_ensemble():
+                print(f"{res['replicas']:>8} {res['scalar_s']:>11.3f} {res['ensemble_s']:>13.3f} {res['speedup']:>8.1f}x")
+        sections.append(ensemble)
+    if "imports" in benches:
+        def imports():
+            print(f"{'module':>10} {'import (s)':>11}  heavy dependencies loaded")
+            for res in bench_import_time():
+                print(f"{res['module']:>10} {res['import_s']:>11.3f}  {', '.join(res['heavy']) or '-'}")
+        sections.append(imports)
+
+    for i, section in enumerate(sections):
+        if i:
+            print()
+        section()
+
+
+if __name__ == "__main__":
+    main()
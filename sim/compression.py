@@ -0,0 +1,150 @@
+"""
+Optional prompt compression for the Gemini improvement prompt.
+
+A PromptCompressor wraps a backend with a compress(text, aggressiveness)
+method: NoopBackend (returns the text unchanged, needs nothing) or
+TokencBackend (the tokenc service, imported only when first used).
+Results are cached by a hash of the prompt, so identical layouts and
+findings across a sweep compress once, and compress_async queues the
+prompt for a few daemon worker threads and returns a Future, so neither
+a run nor interpreter exit waits on the service. A backend failure is
+printed, raised from the Future and not cached.
+
+Compression is off unless a compressor is passed in or the
+PROMPT_COMPRESSOR environment variable names a backend ("tokenc" or
+"noop"); see default_compressor.
+"""
+import hashlib
+import os
+import queue
+import threading
+from concurrent.futures import Future
+
+COMPRESSION_WORKERS = 2
+
+_default = None
+_default_lock = threading.Lock()
+
+
+class NoopBackend:
+    """Local stand-in: the "compressed" prompt is the prompt itself."""
+    name = "noop"
+
+    def compress(self, text, aggressiveness):
+        return text
+
+
+class TokencBackend:
+    """The tokenc compression service; TOKENC holds the API key by default."""
+    name = "tokenc"
+
+    def __init__(self, api_key=None):
+        self.api_key = api_key if api_key is not None else os.environ.get("TOKENC")
+        self.client = None
+
+    def compress(self, text, aggressiveness):
+        if self.client is None:
+            from tokenc import TokenClient
+
+            self.client = TokenClient(api_key=self.api_key)
+        result = self.client.compress_input(input=text, aggressiveness=aggressiveness)
+        return result if isinstance(result, str) else getattr(result, "output", None)
+
+
+BACKENDS = {"noop": NoopBackend, "tokenc": TokencBackend}
+
+
+def prompt_key(text, backend_name, aggressiveness):
+    """Cache key of one compression: SHA-256 of the backend, aggressiveness and prompt."""
+    digest = hashlib.sha256(f"{backend_name}:{aggressiveness}:".encode())
+    digest.update(text.encode())
+    return digest.hexdigest()
+
+
+class PromptCompressor:
+    """
+    Cached, non-blocking front end to a compression backend.
+
+    compress_async() returns a Future of the compressed prompt (None if the
+    backend returned nothing); a backend exception is set on the Future.
+    Concurrent requests for the same prompt share one Future and only
+    successful results are cached, so the backend is called once per
+    distinct prompt. Requests are queued for `workers` daemon threads,
+    started on first use. compress() waits for the result.
+    """
+    def __init__(self, backend=None, aggressiveness=0.8, workers=COMPRESSION_WORKERS):
+        self.backend = backend if backend is not None else NoopBackend()
+        self.aggressiveness = aggressiveness
+        self.workers = workers
+        self.results = {}
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.jobs = queue.SimpleQueue()
+        self.threads = []
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, text):
+        return prompt_key(text, self.backend.name, self.aggressiveness)
+
+    def _work(self):
+        while True:
+            key, text, future = self.jobs.get()
+            try:
+                compressed = self.backend.compress(text, self.aggressiveness)
+            except BaseException as e:
+                print(f"⚠️ Prompt compression failed, keeping the full prompt: {e}")
+                with self.lock:
+                    self.pending.pop(key, None)
+                future.set_exception(e)
+                continue
+            with self.lock:
+                if compressed is not None:
+                    self.results[key] = compressed
+                self.pending.pop(key, None)
+            future.set_result(compressed)
+
+    def compress(self, text):
+        return self.compress_async(text).result()
+
+    def compress_async(self, text):
+        key = self.key(text)
+        with self.lock:
+            if key in self.results:
+                self.hits += 1
+                future = Future()
+                future.set_result(self.results[key])
+                return future
+            future = self.pending.get(key)
+            if future is not None:
+                self.hits += 1
+                return future
+            self.misses += 1
+            future = self.pending[key] = Future()
+            if not self.threads:
+                for _ in range(self.workers):
+                    thread = threading.Thread(target=self._work, name="compress", daemon=True)
+                    thread.start()
+                    self.threads.append(thread)
+        self.jobs.put((key, text, future))
+        return future
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "size": len(self.results), "backend": self.backend.name}
+
+
+def default_compressor():
+    """
+    The shared PromptCompressor for the backend named by PROMPT_COMPRESSOR,
+    or None when the variable is unset (compression off).
+    """
+    global _default
+    name = os.environ.get("PROMPT_COMPRESSOR")
+    if not name:
+        return None
+    with _default_lock:
+        if _default is None or _default.backend.name != name:
+            if name not in BACKENDS:
+                raise ValueError(f"Unknown PROMPT_COMPRESSOR {name!r}, expected one of {', '.join(BACKENDS)}")
+            _default = PromptCompressor(BACKENDS[name]())
+        return _default
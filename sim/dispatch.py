@@ -0,0 +1,136 @@
+import weakref
+
+import numpy as np
+
+# Dispatch policies decide which idle nurse escorts which (patient, room) pair.
+# A policy is called as policy(nurses, pairs, sim) where nurses are the
+# idle nurses in list order, pairs are (patient, room_pos) tuples in
+# priority order and sim is the simulation.Simulation, and returns one
+# distinct nurse per pair. Policies are pickled along with the simulation.
+
+
+def greedy_dispatch(nurses, pairs, sim):
+    """First idle nurse in list order takes the highest-priority pair (default)."""
+    return nurses[:len(pairs)]
+
+
+def linear_sum_assignment(cost):
+    """
+    Minimum-cost assignment of every row to a distinct column (rows <= cols).
+
+    Shortest augmenting path Hungarian algorithm, O(rows^2 * cols) with the
+    per-column updates done as NumPy array operations.
+
+    Returns:
+        Array of column indexes, one per row
+    """
+    cost = np.asarray(cost, dtype=float)
+    n, m = cost.shape
+    if n > m:
+        raise ValueError(f"cost matrix has more rows than columns: {cost.shape}")
+
+    # 1-based potentials/matching as in the classic formulation; column 0 is a sentinel
+    u = np.zeros(n + 1)
+    v = np.zeros(m + 1)
+    p = np.zeros(m + 1, dtype=int)  # p[j] = row matched to column j (0 = free)
+    way = np.zeros(m + 1, dtype=int)
+
+    for i in range(1, n + 1):
+        p[0] = i
+        j0 = 0
+        minv = np.full(m + 1, np.inf)
+        used = np.zeros(m + 1, dtype=bool)
+        while True:
+            used[j0] = True
+            i0 = p[j0]
+            free = ~used[1:]
+            reduced = cost[i0 - 1] - u[i0] - v[1:]
+            better = free & (reduced < minv[1:])
+            minv[1:][better] = reduced[better]
+            way[1:][better] = j0
+
+            candidates = np.where(free, minv[1:], np.inf)
+            j1 = int(np.argmin(candidates)) + 1
+            delta = candidates[j1 - 1]
+
+            u[p[used]] += delta
+            v[used] -= delta
+            minv[1:][free] -= delta
+            j0 = j1
+            if p[j0] == 0:
+                break
+
+        # Flip the augmenting path
+        while j0:
+            j1 = way[j0]
+            p[j0] = p[j1]
+            j0 = j1
+
+    assignment = np.empty(n, dtype=int)
+    cols = np.nonzero(p[1:])[0]
+    assignment[p[1:][cols] - 1] = cols
+    return assignment
+
+
+class OptimalDispatch:
+    """
+    Match idle nurses to (patient, room) pairs minimising total travel.
+
+    cost[pair, nurse] = nurse -> waiting room + waiting room -> room, plus
+    room -> nurse idle position for severe patients (the nurse walks back
+    after handing over). All distances come from the simulation's distance
+    fields; the room -> idle position table is built once per simulation
+    and layout version. One instance can serve many simulations (e.g. every
+    run of a sweep): each gets its own tables, dropped with the simulation.
+    """
+    def __init__(self):
+        self.tables = weakref.WeakKeyDictionary()  # sim -> (routes.version, tables)
+
+    def __getstate__(self):
+        # Tables are rebuilt per simulation; send only the policy
+        return {}
+
+    def __setstate__(self, state):
+        self.__init__()
+
+    def _build_tables(self, sim):
+        routes = sim.routes
+        waiting_room_pos = sim.waiting_room_pos
+        field = routes.fields[waiting_room_pos]
+        unreachable = 4 * field.rows * field.cols
+
+        def clean(dist):
+            dist = np.asarray(dist, dtype=float)
+            dist[dist < 0] = unreachable
+            return dist
+
+        nurses = sim.nurses
+        rooms = list(sim.treatment_rooms.keys())
+        return {
+            "cols": field.cols,
+            "to_waiting_room": clean(field.dist),
+            "nurse_index": {nurse: i for i, nurse in enumerate(nurses)},
+            "room_index": {pos: j for j, pos in enumerate(rooms)},
+            "waiting_room_to_room": clean([routes.distance(waiting_room_pos, pos) for pos in rooms]),
+            "room_to_idle": clean([
+                [routes.distance(pos, nurse.idle_position) for pos in rooms] for nurse in nurses
+            ]),
+        }
+
+    def __call__(self, nurses, pairs, sim):
+        entry = self.tables.get(sim)
+        if entry is None or entry[0] != sim.routes.version:
+            entry = self.tables[sim] = (sim.routes.version, self._build_tables(sim))
+        tables = entry[1]
+        nurse_index, room_index, cols = tables["nurse_index"], tables["room_index"], tables["cols"]
+
+        nurse_rows = np.fromiter((nurse_index[n] for n in nurses), dtype=int, count=len(nurses))
+        flat_pos = np.fromiter((n.position[0] * cols + n.position[1] for n in nurses), dtype=int, count=len(nurses))
+        room_cols = np.fromiter((room_index[room] for _, room in pairs), dtype=int, count=len(pairs))
+        severe = np.fromiter((patient.severity >= 4 for patient, _ in pairs), dtype=bool, count=len(pairs))
+
+        # rows = pairs, cols = nurses
+        cost = tables["to_waiting_room"][flat_pos][None, :] + tables["waiting_room_to_room"][room_cols][:, None]
+        cost += np.where(severe[:, None], tables["room_to_idle"][np.ix_(nurse_rows, room_cols)].T, 0.0)
+
+        return [nurses[j] for j in linear_sum_assignment(cost)]
@@ -1,67 +1,347 @@
+from array import array
+from collections import OrderedDict, deque
+from hashlib import blake2b
+from heapq import heappush, heappop
+from math import inf
+
+class IdAllocator:
+    """Consecutive ids starting at 1; each simulation owns its own allocators."""
+    def __init__(self):
+        self.last = 0
+
+    def next(self):
+        self.last += 1
+        return self.last
+
 class Patient:
-    count = 0
-    next_id = 0
-    def __init__(self, severity, position):
+    __slots__ = ("severity", "position", "id")
+    def __init__(self, id, severity, position):
         self.severity = severity
         self.position = position
-        Patient.next_id += 1
-        Patient.count = Patient.next_id
-        self.id = Patient.count
+        self.id = id
     
     def __lt__(self, other):
         return self.severity > other.severity  # MAX-heap
 
 class Nurse:
-    count = 0
-    def __init__(self, state, idle_position):
+    __slots__ = ("state", "idle_position", "position", "id")
+    def __init__(self, id, state, idle_position):
         self.state = state
         self.idle_position = idle_position
         self.position = idle_position
-        Nurse.count += 1
-        self.id = Nurse.count
+        self.id = id
 
 class Doctor:
-    count = 0
-    def __init__(self, state, idle_position):
+    __slots__ = ("state", "idle_position", "position", "id")
+    def __init__(self, id, state, idle_position):
         self.state = state
         self.idle_position = idle_position
         self.position = idle_position
-        Doctor.count += 1
-        self.id = Doctor.count
+        self.id = id
+
+class FreeList:
+    """
+    Free resource indexes, handed out lowest index first.
+
+    add/discard are O(1); peek is amortised O(1) since discarded entries are
+    only popped off the heap when they reach the top. An index keeps at most
+    one heap entry (tracked in `pushed`), so re-adding an index whose stale
+    entry is still queued reuses it and the heap never outgrows the indexes.
+    """
+    def __init__(self, indexes=()):
+        self.free = set(indexes)
+        self.pushed = set(self.free)
+        self.heap = sorted(self.free)
+
+    def __len__(self):
+        return len(self.free)
+
+    def __contains__(self, index):
+        return index in self.free
+
+    def add(self, index):
+        if index not in self.free:
+            self.free.add(index)
+            if index not in self.pushed:
+                self.pushed.add(index)
+                heappush(self.heap, index)
+
+    def discard(self, index):
+        self.free.discard(index)
+
+    def ordered(self):
+        """All free indexes, lowest first."""
+        return sorted(self.free)
+
+    def peek(self):
+        heap = self.heap
+        while heap and heap[0] not in self.free:
+            self.pushed.discard(heappop(heap))
+        return heap[0] if heap else None
+
+class RandomPool:
+    """Set of free items supporting O(1) add, discard and uniform random choice."""
+    def __init__(self, items=()):
+        self.items = []
+        self.index = {}
+        for item in items:
+            self.add(item)
+
+    def __len__(self):
+        return len(self.items)
+
+    def __contains__(self, item):
+        return item in self.index
+
+    def add(self, item):
+        if item not in self.index:
+            self.index[item] = len(self.items)
+            self.items.append(item)
+
+    def discard(self, item):
+        i = self.index.pop(item, None)
+        if i is None:
+            return
+        last = self.items.pop()
+        if last is not item:
+            self.items[i] = last
+            self.index[last] = i
+
+    def choice(self, rng):
+        if not self.items:
+            return None
+        return self.items[rng.randrange(len(self.items))]
 
 # a-star for pathfinding
+# Binary heap instead of queue.PriorityQueue (no per-call locking) and a set
+# mirroring the heap contents for O(1) open-set membership. Like the original
+# implementation, a node already on the heap keeps its first f-score when a
+# cheaper route to it is found, so the returned routes are unchanged.
 def get_path(grid, start, end):
-    from queue import PriorityQueue
     rows, cols = len(grid), len(grid[0])
-    open_set = PriorityQueue()
-    open_set.put((0, start))
+    open_heap = [(0, start)]
+    open_nodes = {start}
     came_from = {}
     g_score = {start: 0}
-    f_score = {start: heuristic(start, end)}
     dir = [(-1, 0), (1, 0), (0, -1), (0, 1)]
-    while not open_set.empty():
-        curr = open_set.get()[1]
+    end_r, end_c = end
+    while open_heap:
+        curr = heappop(open_heap)[1]
+        open_nodes.discard(curr)
         if curr == end:
             return reconstruct_path(came_from, curr)
-        for d in dir:
-            neighbor = (curr[0] + d[0], curr[1] + d[1])
-            if 0 <= neighbor[0] < rows and 0 <= neighbor[1] < cols:
-                cell_value = grid[neighbor[0]][neighbor[1]]
+        r, c = curr
+        tent_g_score = g_score[curr] + 1
+        for dr, dc in dir:
+            nr, nc = r + dr, c + dc
+            if 0 <= nr < rows and 0 <= nc < cols:
+                cell_value = grid[nr][nc]
 
                 if cell_value == -2:
                     continue
-                if cell_value in [-1, 4, 5] and neighbor != end:
+                neighbor = (nr, nc)
+                if (cell_value == -1 or cell_value == 4 or cell_value == 5) and neighbor != end:
                     continue
 
-                tent_g_score = g_score[curr] + 1
-                if tent_g_score < g_score.get(neighbor, float('inf')):
+                if tent_g_score < g_score.get(neighbor, inf):
                     came_from[neighbor] = curr
                     g_score[neighbor] = tent_g_score
-                    f_score[neighbor] = tent_g_score + heuristic(neighbor, end)
-                    if neighbor not in [i[1] for i in open_set.queue]:
-                        open_set.put((f_score[neighbor], neighbor))
+                    if neighbor not in open_nodes:
+                        open_nodes.add(neighbor)
+                        heappush(open_heap, (tent_g_score + abs(nr - end_r) + abs(nc - end_c), neighbor))
     return []
 
+# BFS distance field towards one fixed destination. Walkability follows
+# get_path: walls are never entered, and spawn/treatment cells only as the
+# destination itself. Any cell may be a start, so non-walkable cells get a
+# distance but are not expanded. Distances and next hops are flat int arrays
+# (row * cols + col, -1 = none) so fields stay small and pickle as raw bytes.
+class DistanceField:
+    def __init__(self, grid, target):
+        self.target = target
+        self.rows, self.cols = len(grid), len(grid[0])
+        rows, cols = self.rows, self.cols
+        dist = array('i', [-1]) * (rows * cols)
+        next_hop = array('i', [-1]) * (rows * cols)
+        target_idx = target[0] * cols + target[1]
+        dist[target_idx] = 0
+        dir = [(-1, 0), (1, 0), (0, -1), (0, 1)]
+        frontier = deque([target])
+        while frontier:
+            curr = frontier.popleft()
+            r, c = curr
+            cell_value = grid[r][c]
+            if cell_value == -2:
+                continue
+            if curr != target and (cell_value == -1 or cell_value == 4 or cell_value == 5):
+                continue
+            curr_idx = r * cols + c
+            d = dist[curr_idx] + 1
+            for dr, dc in dir:
+                nr, nc = r + dr, c + dc
+                if 0 <= nr < rows and 0 <= nc < cols:
+                    idx = nr * cols + nc
+                    if dist[idx] == -1:
+                        dist[idx] = d
+                        next_hop[idx] = curr_idx
+                        frontier.append((nr, nc))
+        self.dist = dist
+        self.next_hop = next_hop
+
+    def distance(self, start):
+        """Steps from start to the target, or -1 if unreachable."""
+        return self.dist[start[0] * self.cols + start[1]]
+
+    def path(self, start):
+        """Route from start to the target in get_path format ([] if unreachable)."""
+        cols = self.cols
+        idx = start[0] * cols + start[1]
+        if self.dist[idx] == -1:
+            return []
+        total_path = [start]
+        next_hop = self.next_hop
+        idx = next_hop[idx]
+        while idx != -1:
+            total_path.append(divmod(idx, cols))
+            idx = next_hop[idx]
+        return total_path
+
+
+def layout_version(grid):
+    """
+    Content digest of a layout (BLAKE2b of its shape and cells), equal
+    across processes for equal grids. O(rows * cols): compute it when a
+    layout is built or checked, not per tick.
+    """
+    digest = blake2b(digest_size=16)
+    digest.update(f"{len(grid)}x{len(grid[0]) if grid else 0}".encode())
+    for row in grid:
+        digest.update(array("q", row).tobytes())
+    return digest.hexdigest()
+
+
+class RouteCache:
+    """
+    Bounded LRU cache of routes keyed by (start, end, layout version).
+
+    Cached routes are shared between callers and must not be mutated.
+    Entries for an older layout version are dropped as soon as a newer
+    version is looked up.
+    """
+    def __init__(self, maxsize=4096):
+        self.maxsize = maxsize
+        self.version = None
+        self.routes = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, start, end, version):
+        if version != self.version:
+            self.routes.clear()
+            self.version = version
+        key = (start, end)
+        path = self.routes.get(key)
+        if path is None:
+            self.misses += 1
+            return None
+        self.routes.move_to_end(key)
+        self.hits += 1
+        return path
+
+    def put(self, start, end, version, path):
+        if self.maxsize <= 0 or version != self.version:
+            return
+        self.routes[(start, end)] = path
+        if len(self.routes) > self.maxsize:
+            self.routes.popitem(last=False)
+            self.evictions += 1
+
+    def get_path(self, grid, start, end, version=None):
+        """Cached get_path; pass version to skip re-hashing the layout."""
+        if version is None:
+            version = layout_version(grid)
+        path = self.get(start, end, version)
+        if path is None:
+            path = get_path(grid, start, end)
+            self.put(start, end, version, path)
+        return path
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "size": len(self.routes),
+            "maxsize": self.maxsize,
+        }
+
+
+class RouteTable:
+    """
+    Distance fields for a fixed set of destinations, with A* for any other,
+    behind a RouteCache.
+
+    Edit the layout through edit_cell(), or call invalidate() after editing
+    the grid in place; the next refresh() then rebuilds the fields. version
+    counts those edits, so checking it each tick is O(1). `layout` is the
+    content digest (layout_version) of the grid the fields were built for.
+
+    Routes are returned as tuples shared through the cache, so tasks hold
+    references to one stored route instead of private copies.
+    """
+    def __init__(self, grid, targets, cache_size=4096):
+        self.grid = grid
+        self.targets = list(dict.fromkeys(targets))
+        self.cache = RouteCache(cache_size)
+        self.version = 0
+        self.built_version = None
+        self.refresh()
+
+    def edit_cell(self, pos, value):
+        """Set one grid cell and invalidate the routes if it changed."""
+        r, c = pos
+        if self.grid[r][c] != value:
+            self.grid[r][c] = value
+            self.invalidate()
+
+    def invalidate(self):
+        """Mark the layout as changed; routes are rebuilt on the next refresh()."""
+        self.version += 1
+
+    def refresh(self, rehash=False):
+        """
+        Rebuild the distance fields if the layout was invalidated since the
+        last call. With rehash, first re-digest the grid to catch in-place
+        edits made without invalidate() (O(rows * cols)).
+        """
+        if rehash and layout_version(self.grid) != self.layout:
+            self.invalidate()
+        if self.version == self.built_version:
+            return False
+        self.built_version = self.version
+        self.layout = layout_version(self.grid)
+        self.fields = {target: DistanceField(self.grid, target) for target in self.targets}
+        return True
+
+    def get_path(self, start, end):
+        path = self.cache.get(start, end, self.version)
+        if path is None:
+            field = self.fields.get(end)
+            if field is None:
+                path = tuple(get_path(self.grid, start, end))
+            else:
+                path = tuple(field.path(start))
+            self.cache.put(start, end, self.version, path)
+        return path
+
+    def distance(self, start, end):
+        field = self.fields.get(end)
+        if field is None:
+            path = self.get_path(start, end)
+            return len(path) - 1 if path else -1
+        return field.distance(start)
+
 def heuristic(a, b):
     return abs(a[0] - b[0]) + abs(a[1] - b[1])
 
@@ -0,0 +1,449 @@
+import random
+
+import numpy as np
+
+from engine import RouteTable, layout_version
+from simulation import mark_rooms, route_targets
+from tasks import (
+    TO_WAITING_ROOM, ESCORT_TO_ROOM, NURSE_RETURN, NURSE_TREATING,
+    DOCTOR_TO_ROOM, DOCTOR_TREATING, DOCTOR_RETURN,
+)
+
+IDLE = -1
+
+# Kinds of doctor hand-off events ordered within a tick (see _doctor_events)
+REQUEST_WAITING = 0   # a waiting_for_doctor task asks for an idle doctor
+REQUEST_NURSE = 1     # a nurse finished handing over a severe patient
+RELEASE = 2           # a doctor returned to the idle position
+
+_NO_SEQ = np.iinfo(np.int64).max
+
+
+class Ensemble:
+    """
+    N replicas of one configuration advanced in lockstep with NumPy.
+
+    Replica i follows exactly the trajectory of Simulation(..., seed=seeds[i])
+    under the default greedy dispatch: the same nurse and doctor positions,
+    room occupancy and stats at every tick. Agent positions are flat cell
+    indexes (row * cols + col) in [replica, agent] arrays; waiting queues
+    are per-class counts, since within a class the queue order only decides
+    which patient id is seen first.
+
+    Routes are read once from a RouteTable (shared with other simulations
+    via routes=, as in Simulation) into padded arrays covering every pair of
+    stations: the waiting room, spawn point, rooms and idle positions. The
+    layout must not change while the ensemble runs.
+
+    Walking, treatment countdowns, dispatch and discharges are array
+    operations over all replicas. Doctor hand-offs depend on task order
+    within a tick and the per-replica random generator, so those are
+    resolved per event rank, with only the random draws done per replica.
+    """
+    def __init__(
+        self,
+        hospital,
+        nurse_positions,
+        doctor_positions,
+        treatment_rooms_config,
+        seeds,
+        spawn_point=(0, 0),
+        waiting_room_pos=(0, 1),
+        pattern=[2, 5, 3, 1, 5, 2, 3, 1, 5, 3],
+        treatment_time=5,
+        routes=None,
+    ):
+        hospital = mark_rooms(hospital, treatment_rooms_config)
+        staff_positions = list(nurse_positions) + list(doctor_positions)
+        if routes is None:
+            routes = RouteTable(hospital, route_targets(spawn_point, waiting_room_pos, treatment_rooms_config.keys(), staff_positions))
+        elif routes.layout != layout_version(hospital):
+            raise ValueError("routes were built for a different layout")
+        self.routes = routes
+        self.hospital = routes.grid
+        self.cols = len(hospital[0])
+
+        self.seeds = list(seeds)
+        self.rngs = [random.Random(seed) for seed in self.seeds]
+        self.pattern = pattern
+        self.pattern_index = 0
+        self.tick = 0
+        self.treatment_time = treatment_time
+        self.room_list = list(treatment_rooms_config.keys())
+        self.room_type = np.array([treatment_rooms_config[pos]["severity_type"] for pos in self.room_list], dtype=np.int8)
+
+        self._build_routes(spawn_point, waiting_room_pos, nurse_positions, doctor_positions)
+
+        n = len(self.seeds)
+        k = len(nurse_positions)
+        d = len(doctor_positions)
+        self.queue = np.zeros((n, 2), dtype=np.int64)  # severity_type -> waiting patients
+        self.active_patients = np.zeros(n, dtype=np.int64)
+        occupied = np.array([treatment_rooms_config[pos]["occupancy"] != 0 for pos in self.room_list], dtype=bool)
+        self.room_busy = np.tile(occupied, (n, 1))
+        self.next_seq = np.zeros(n, dtype=np.int64)  # task creation counter, orders the hand-offs
+
+        self.nurse_stage = np.full((n, k), IDLE, dtype=np.int8)
+        self.nurse_pos = np.tile(self.cell_of_station[self.nurse_idle_station], (n, 1))
+        self.nurse_route = np.zeros((n, k), dtype=np.int64)
+        self.nurse_step = np.zeros((n, k), dtype=np.int64)
+        self.nurse_room = np.zeros((n, k), dtype=np.int64)
+        self.nurse_severe = np.zeros((n, k), dtype=bool)
+        self.nurse_counter = np.zeros((n, k), dtype=np.int64)
+        self.nurse_seq = np.zeros((n, k), dtype=np.int64)
+        self.escorted_pos = np.zeros((n, k), dtype=np.int64)  # position of the patient a nurse escorts
+
+        self.doctor_stage = np.full((n, d), IDLE, dtype=np.int8)
+        self.doctor_pos = np.tile(self.cell_of_station[self.doctor_idle_station], (n, 1))
+        self.doctor_route = np.zeros((n, d), dtype=np.int64)
+        self.doctor_step = np.zeros((n, d), dtype=np.int64)
+        self.doctor_room = np.zeros((n, d), dtype=np.int64)
+        self.doctor_counter = np.zeros((n, d), dtype=np.int64)
+        self.doctor_seq = np.zeros((n, d), dtype=np.int64)
+
+        # Idle doctors in engine.RandomPool order, so random picks match Simulation
+        self.pool_items = np.tile(np.arange(d), (n, 1))
+        self.pool_len = np.full(n, d, dtype=np.int64)
+
+        # Severe patients waiting in their room for a doctor: task seq (_NO_SEQ = empty) and room
+        self.waiting_seq = np.zeros((n, 0), dtype=np.int64)
+        self.waiting_room = np.zeros((n, 0), dtype=np.int64)
+
+        # Patients walking from their room to the spawn point (route -1 = empty slot)
+        self.discharge_route = np.full((n, 4), -1, dtype=np.int64)
+        self.discharge_step = np.zeros((n, 4), dtype=np.int64)
+        self.discharge_pos = np.zeros((n, 4), dtype=np.int64)
+
+    def _build_routes(self, spawn_point, waiting_room_pos, nurse_positions, doctor_positions):
+        cols = self.cols
+        stations = list(dict.fromkeys(
+            [waiting_room_pos, spawn_point] + self.room_list + list(nurse_positions) + list(doctor_positions)
+        ))
+        station_index = {pos: i for i, pos in enumerate(stations)}
+        self.cell_of_station = np.array([r * cols + c for r, c in stations], dtype=np.int64)
+        self.station_of_cell = np.full(len(self.hospital) * cols, -1, dtype=np.int64)
+        self.station_of_cell[self.cell_of_station] = np.arange(len(stations))
+
+        paths = [self.routes.get_path(start, end) for start in stations for end in stations]
+        # Discharge falls back to standing on the spawn point when it is unreachable
+        paths.append((spawn_point,))
+        max_len = max(1, max(len(path) for path in paths))
+        self.route_cells = np.zeros((len(paths), max_len), dtype=np.int64)
+        self.route_len = np.array([len(path) for path in paths], dtype=np.int64)
+        for i, path in enumerate(paths):
+            self.route_cells[i, :len(path)] = [r * cols + c for r, c in path]
+        s = len(stations)
+        self.route_of = np.arange(s * s, dtype=np.int64).reshape(s, s)
+
+        self.waiting_station = station_index[waiting_room_pos]
+        self.spawn_station = station_index[spawn_point]
+        self.room_station = np.array([station_index[pos] for pos in self.room_list], dtype=np.int64)
+        self.nurse_idle_station = np.array([station_index[pos] for pos in nurse_positions], dtype=np.int64)
+        self.doctor_idle_station = np.array([station_index[pos] for pos in doctor_positions], dtype=np.int64)
+        discharge = self.route_of[self.room_station, self.spawn_station]
+        self.room_discharge_route = np.where(self.route_len[discharge] > 0, discharge, len(paths) - 1)
+
+    def _route(self, from_cell, to_station):
+        return self.route_of[self.station_of_cell[from_cell], to_station]
+
+    def _move(self, route, step, pos, mask):
+        """move_along_path for every masked agent; returns the mask of those already at the end."""
+        done = mask & (step >= self.route_len[route])
+        moving = mask & ~done
+        step[moving] += 1
+        pos[moving] = self.route_cells[route[moving], step[moving] - 1]
+        return done
+
+    def spawn_patient(self):
+        severity = self.pattern[self.pattern_index]
+        self.pattern_index = (self.pattern_index + 1) % len(self.pattern)
+        self.queue[:, 0 if severity < 4 else 1] += 1
+        self.active_patients += 1
+
+    def patient_to_room(self):
+        """
+        Simulation.patient_to_room for every replica. Severe patients always
+        outrank the rest, so each replica takes as many severe pairs as
+        nurses, severe patients and high-severity rooms allow, then fills up
+        with low-severity pairs; the lowest-index idle nurses get them in
+        that order and each class takes its free rooms lowest index first.
+        """
+        idle = self.nurse_stage == IDLE
+        free = ~self.room_busy
+        free_high = free & (self.room_type == 1)
+        free_low = free & (self.room_type == 0)
+        n_idle = idle.sum(1)
+        p_high = np.minimum(np.minimum(n_idle, self.queue[:, 1]), free_high.sum(1))
+        p_low = np.minimum(np.minimum(n_idle - p_high, self.queue[:, 0]), free_low.sum(1))
+        pairs = p_high + p_low
+        if not pairs.any():
+            return
+        self.queue[:, 1] -= p_high
+        self.queue[:, 0] -= p_low
+
+        rank = np.cumsum(idle, 1) - 1
+        assigned = idle & (rank < pairs[:, None])
+        severe = rank < p_high[:, None]
+        # k-th free room of each type, lowest index first
+        high_rooms = np.argsort(~free_high, axis=1, kind="stable")
+        low_rooms = np.argsort(~free_low, axis=1, kind="stable")
+        last = len(self.room_list) - 1
+        room = np.where(
+            severe,
+            np.take_along_axis(high_rooms, np.clip(rank, 0, last), 1),
+            np.take_along_axis(low_rooms, np.clip(rank - p_high[:, None], 0, last), 1),
+        )
+
+        rows, nurses = np.nonzero(assigned)
+        rooms = room[rows, nurses]
+        self.room_busy[rows, rooms] = True
+        self.nurse_stage[rows, nurses] = TO_WAITING_ROOM
+        self.nurse_room[rows, nurses] = rooms
+        self.nurse_severe[rows, nurses] = severe[rows, nurses]
+        self.nurse_seq[rows, nurses] = self.next_seq[rows] + rank[rows, nurses]
+        self.nurse_route[rows, nurses] = self._route(self.nurse_pos[rows, nurses], self.waiting_station)
+        self.nurse_step[rows, nurses] = 0
+        self.escorted_pos[rows, nurses] = self.cell_of_station[self.spawn_station]
+        self.next_seq += pairs
+
+    def process_tasks(self):
+        """Advance every task of every replica by one tick (tasks.run_stages semantics)."""
+        discharged = self._move(self.discharge_route, self.discharge_step, self.discharge_pos, self.discharge_route >= 0)
+        self.discharge_route[discharged] = -1
+        self.active_patients -= discharged.sum(1)
+
+        # Each task runs the handler of the stage it is in at the start of the tick
+        nurse_stage = self.nurse_stage.copy()
+        doctor_stage = self.doctor_stage.copy()
+        treatment_time = self.treatment_time
+
+        # Nurses
+        done = self._move(self.nurse_route, self.nurse_step, self.nurse_pos, nurse_stage == TO_WAITING_ROOM)
+        rows, nurses = np.nonzero(done)
+        self.nurse_stage[rows, nurses] = ESCORT_TO_ROOM
+        self.nurse_route[rows, nurses] = self.route_of[self.waiting_station, self.room_station[self.nurse_room[rows, nurses]]]
+        self.nurse_step[rows, nurses] = 0
+        self.escorted_pos[rows, nurses] = self.cell_of_station[self.waiting_station]
+
+        escorting = nurse_stage == ESCORT_TO_ROOM
+        done = self._move(self.nurse_route, self.nurse_step, self.nurse_pos, escorting)
+        walking = escorting & ~done
+        self.escorted_pos[walking] = self.nurse_pos[walking]
+        rows, nurses = np.nonzero(done)
+        self.escorted_pos[rows, nurses] = self.cell_of_station[self.room_station[self.nurse_room[rows, nurses]]]
+        severe = self.nurse_severe[rows, nurses]
+        r, k = rows[severe], nurses[severe]
+        self.nurse_stage[r, k] = NURSE_RETURN
+        self.nurse_route[r, k] = self._route(self.nurse_pos[r, k], self.nurse_idle_station[k])
+        self.nurse_step[r, k] = 0
+        r, k = rows[~severe], nurses[~severe]
+        self.nurse_stage[r, k] = NURSE_TREATING
+        self.nurse_counter[r, k] = 0
+
+        handed_over = self._move(self.nurse_route, self.nurse_step, self.nurse_pos, nurse_stage == NURSE_RETURN)
+        self.nurse_stage[handed_over] = IDLE
+
+        treating = nurse_stage == NURSE_TREATING
+        self.nurse_counter[treating] += 1
+        nurse_discharge = treating & (self.nurse_counter >= treatment_time)
+        self.nurse_stage[nurse_discharge] = IDLE
+        rows, nurses = np.nonzero(nurse_discharge)
+        self.room_busy[rows, self.nurse_room[rows, nurses]] = False
+
+        # Doctors
+        done = self._move(self.doctor_route, self.doctor_step, self.doctor_pos, doctor_stage == DOCTOR_TO_ROOM)
+        self.doctor_stage[done] = DOCTOR_TREATING
+
+        treating = doctor_stage == DOCTOR_TREATING
+        self.doctor_counter[treating] += 1
+        rows, doctors = np.nonzero(treating & (self.doctor_counter >= treatment_time))
+        self.doctor_stage[rows, doctors] = DOCTOR_RETURN
+        self.doctor_route[rows, doctors] = self._route(self.doctor_pos[rows, doctors], self.doctor_idle_station[doctors])
+        self.doctor_step[rows, doctors] = 0
+        self.room_busy[rows, self.doctor_room[rows, doctors]] = False
+
+        released = self._move(self.doctor_route, self.doctor_step, self.doctor_pos, doctor_stage == DOCTOR_RETURN)
+        self.doctor_stage[released] = IDLE
+
+        self._start_discharges(
+            np.concatenate([nurse_discharge, released], 1),
+            np.concatenate([self.nurse_room, self.doctor_room], 1),
+        )
+        assigned = self._doctor_events(handed_over, released)
+
+        # Doctor tasks created this tick take their first step straight away
+        done = self._move(self.doctor_route, self.doctor_step, self.doctor_pos, assigned)
+        self.doctor_stage[done] = DOCTOR_TREATING
+
+    def _start_discharges(self, mask, rooms):
+        """Add a discharge walk from rooms[r, j] for every masked (r, j)."""
+        new = mask.sum(1)
+        if not new.any():
+            return
+        free = self.discharge_route < 0
+        needed = int((new - free.sum(1)).max())
+        if needed > 0:
+            n, width = self.discharge_route.shape
+            grow = max(needed, width)
+            self.discharge_route = np.concatenate([self.discharge_route, np.full((n, grow), -1, dtype=np.int64)], 1)
+            self.discharge_step = np.concatenate([self.discharge_step, np.zeros((n, grow), dtype=np.int64)], 1)
+            self.discharge_pos = np.concatenate([self.discharge_pos, np.zeros((n, grow), dtype=np.int64)], 1)
+            free = self.discharge_route < 0
+        free_slots = np.argsort(~free, axis=1, kind="stable")
+        slot = np.take_along_axis(free_slots, np.clip(np.cumsum(mask, 1) - 1, 0, free_slots.shape[1] - 1), 1)
+        rows, cols = np.nonzero(mask)
+        slots = slot[rows, cols]
+        room = rooms[rows, cols]
+        self.discharge_route[rows, slots] = self.room_discharge_route[room]
+        self.discharge_step[rows, slots] = 0
+        self.discharge_pos[rows, slots] = self.cell_of_station[self.room_station[room]]
+
+    def _doctor_events(self, handed_over, released):
+        """
+        Resolve this tick's doctor requests and releases in task creation
+        order and return the mask of doctors given a new task.
+
+        Every waiting task and every nurse finishing a hand-over requests a
+        doctor; a request succeeds iff one is idle at that moment, so the
+        idle count follows c_i = max(0, c_{i-1} + d_i) with d = +1 per release
+        and -1 per request, computed with a running minimum. A nurse whose
+        request fails leaves a new waiting task, which asks once more after
+        all older tasks. Successful requests then draw a doctor from the
+        replica's pool, in order, one event rank at a time.
+        """
+        n, d = self.doctor_stage.shape
+        k = handed_over.shape[1]
+        w = self.waiting_seq.shape[1]
+        assigned = np.zeros((n, d), dtype=bool)
+        if not (handed_over.any() or released.any() or w):
+            return assigned
+
+        seq = np.concatenate([
+            self.waiting_seq,
+            np.where(handed_over, self.nurse_seq, _NO_SEQ),
+            np.where(released, self.doctor_seq, _NO_SEQ),
+        ], 1)
+        kind = np.concatenate([
+            np.full(w, REQUEST_WAITING), np.full(k, REQUEST_NURSE), np.full(d, RELEASE),
+        ])[None, :].repeat(n, 0)
+        arg = np.concatenate([self.waiting_room, self.nurse_room, np.tile(np.arange(d), (n, 1))], 1)
+        source = np.tile(np.arange(w + k + d), (n, 1))
+
+        order = np.argsort(seq, axis=1, kind="stable")
+        n_events = int((seq != _NO_SEQ).sum(1).max())
+        if n_events == 0:
+            return assigned
+        order = order[:, :n_events]
+        seq = np.take_along_axis(seq, order, 1)
+        kind = np.take_along_axis(kind, order, 1)
+        arg = np.take_along_axis(arg, order, 1)
+        source = np.take_along_axis(source, order, 1)
+        valid = seq != _NO_SEQ
+        request = valid & (kind != RELEASE)
+        release = valid & (kind == RELEASE)
+
+        c0 = self.pool_len
+        x = c0[:, None] + np.cumsum(release.astype(np.int64) - request, 1)
+        idle_after = x - np.minimum.accumulate(np.minimum(x, 0), axis=1)
+        idle_before = np.concatenate([c0[:, None], idle_after[:, :-1]], 1)
+        success = request & (idle_before > 0)
+
+        # New tasks in creation order: a doctor task per success, a waiting task per failed nurse request
+        created = (valid & (kind == REQUEST_NURSE)) | success
+        new_seq = self.next_seq[:, None] + np.cumsum(created, 1) - 1
+        n_created = created.sum(1)
+        failed_nurse = valid & (kind == REQUEST_NURSE) & ~success
+        failed_rank = np.cumsum(failed_nurse, 1) - 1
+        retry_success = failed_nurse & (failed_rank < idle_after[:, -1:])
+        still_waiting = failed_nurse & ~retry_success
+        retry_seq = self.next_seq[:, None] + n_created[:, None] + failed_rank
+        self.next_seq += n_created + retry_success.sum(1)
+
+        # Pool operations (releases and successful requests) in order
+        op_key = np.concatenate([
+            np.where(release | success, np.arange(n_events), _NO_SEQ),
+            np.where(retry_success, n_events + failed_rank, _NO_SEQ),
+        ], 1)
+        op_order = np.argsort(op_key, axis=1, kind="stable")
+        n_ops = int((op_key != _NO_SEQ).sum(1).max())
+        op_order = op_order[:, :n_ops]
+        op_valid = np.take_along_axis(op_key, op_order, 1) != _NO_SEQ
+        op_release = np.take_along_axis(np.concatenate([release, np.zeros_like(release)], 1), op_order, 1)
+        op_arg = np.take_along_axis(np.concatenate([arg, arg], 1), op_order, 1)
+        op_seq = np.take_along_axis(np.concatenate([new_seq, retry_seq], 1), op_order, 1)
+
+        pool_items, pool_len = self.pool_items, self.pool_len
+        for e in range(n_ops):
+            rows = np.nonzero(op_valid[:, e] & op_release[:, e])[0]
+            if len(rows):
+                doctors = op_arg[rows, e]
+                pool_items[rows, pool_len[rows]] = doctors
+                pool_len[rows] += 1
+
+            rows = np.nonzero(op_valid[:, e] & ~op_release[:, e])[0]
+            if not len(rows):
+                continue
+            rngs = self.rngs
+            picks = np.array([rngs[r].randrange(size) for r, size in zip(rows.tolist(), pool_len[rows].tolist())], dtype=np.int64)
+            doctors = pool_items[rows, picks]
+            last = pool_items[rows, pool_len[rows] - 1]
+            pool_len[rows] -= 1
+            pool_items[rows, picks] = last
+
+            rooms = op_arg[rows, e]
+            self.doctor_stage[rows, doctors] = DOCTOR_TO_ROOM
+            self.doctor_room[rows, doctors] = rooms
+            self.doctor_seq[rows, doctors] = op_seq[rows, e]
+            self.doctor_route[rows, doctors] = self._route(self.doctor_pos[rows, doctors], self.room_station[rooms])
+            self.doctor_step[rows, doctors] = 0
+            self.doctor_counter[rows, doctors] = 0
+            assigned[rows, doctors] = True
+
+        # Waiting tasks: drop the ones served, append the new ones, keep creation order
+        served = success & (kind == REQUEST_WAITING)
+        rows, cols = np.nonzero(served)
+        self.waiting_seq[rows, source[rows, cols]] = _NO_SEQ
+        waiting_seq = np.concatenate([self.waiting_seq, np.where(still_waiting, new_seq, _NO_SEQ)], 1)
+        waiting_room = np.concatenate([self.waiting_room, arg], 1)
+        width = int((waiting_seq != _NO_SEQ).sum(1).max())
+        keep = np.argsort(waiting_seq, axis=1, kind="stable")[:, :width]
+        self.waiting_seq = np.take_along_axis(waiting_seq, keep, 1)
+        self.waiting_room = np.take_along_axis(waiting_room, keep, 1)
+        return assigned
+
+    def step(self, tick, spawn_interval=5):
+        """Run one tick in every replica (Simulation.step)."""
+        self.tick = tick
+        if tick % spawn_interval == 0:
+            self.spawn_patient()
+        self.patient_to_room()
+        self.process_tasks()
+
+    def positions(self, cells):
+        """(row, col) pairs for an array of flat cell indexes."""
+        return np.stack(np.divmod(cells, self.cols), -1)
+
+    def stats(self):
+        """Simulation.stats for every replica, as arrays indexed by replica."""
+        n_nurses = self.nurse_stage.shape[1]
+        n_doctors = self.doctor_stage.shape[1]
+        return {
+            "active_patients": self.active_patients.copy(),
+            "waiting": self.queue.sum(1),
+            "nurses_busy": (self.nurse_stage != IDLE).sum(1),
+            "nurses_total": np.full(len(self.seeds), n_nurses),
+            "doctors_busy": n_doctors - self.pool_len,
+            "doctors_total": np.full(len(self.seeds), n_doctors),
+        }
+
+
+def run_ensemble(ensemble, max_ticks=100, spawn_interval=5):
+    """
+    Run every replica of the ensemble for max_ticks ticks (run_sim without output).
+
+    Returns:
+        Final stats dict of per-replica arrays (see Ensemble.stats)
+    """
+    for tick in range(max_ticks):
+        ensemble.step(tick, spawn_interval)
+    return ensemble.stats()
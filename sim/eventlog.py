@@ -0,0 +1,163 @@
+import json
+from collections import deque
+
+DEBUG = 10     # per-tick summaries from run_sim
+INFO = 20      # patient and staff lifecycle events
+WARNING = 30   # route fallbacks
+OFF = 100
+
+# Lifecycle events, one record per event: {"tick", "event", **fields}
+#   spawn       patient, severity
+#   assign      role ("nurse"/"doctor"), staff, patient, room[, waited]
+#   arrive      patient, room
+#   idle        role, staff                  staff member back at the idle position
+#   wait        patient                      severe patient waiting for a doctor
+#   treat       staff, patient               doctor starts treating
+#   treated     role, patient[, path_length] treatment complete (nurse: discharge starts)
+#   discharge   patient, path_length         discharge walk starts after a doctor treatment
+#   discharged  patient
+#   no_path     start, end                   (WARNING)
+#   tick        -                            (DEBUG) start of a run_sim tick
+#   tick_stats  active_patients, waiting, active_tasks   (DEBUG)
+
+
+class EventLog:
+    """
+    Leveled event log for a simulation.
+
+    Callers guard every emit with the flag for its level, e.g.
+        if log.info:
+            log.emit(tick, "spawn", patient=patient.id, severity=severity)
+    so a disabled level costs one attribute check and no formatting.
+    """
+    def __init__(self, level=INFO, sinks=()):
+        self.sinks = list(sinks)
+        self.set_level(level)
+
+    def set_level(self, level):
+        self.level = level
+        enabled = bool(self.sinks)
+        self.debug = enabled and level <= DEBUG
+        self.info = enabled and level <= INFO
+        self.warning = enabled and level <= WARNING
+
+    def add_sink(self, sink):
+        self.sinks.append(sink)
+        self.set_level(self.level)
+
+    def emit(self, tick, event, **fields):
+        record = {"tick": tick, "event": event}
+        record.update(fields)
+        for sink in self.sinks:
+            sink.write(record)
+
+    def close(self):
+        for sink in self.sinks:
+            close = getattr(sink, "close", None)
+            if close is not None:
+                close()
+
+
+class RingBuffer:
+    """Keeps the last `capacity` records in memory."""
+    def __init__(self, capacity=10000):
+        self.records = deque(maxlen=capacity)
+
+    def write(self, record):
+        self.records.append(record)
+
+    def __len__(self):
+        return len(self.records)
+
+    def __iter__(self):
+        return iter(self.records)
+
+
+class NDJSONSink:
+    """Appends one JSON line per record to a file (tuples become lists)."""
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "a")
+
+    def write(self, record):
+        self.file.write(json.dumps(record) + "\n")
+
+    def close(self):
+        self.file.close()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["file"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.file = open(self.path, "a")
+
+
+class ConsoleSink:
+    """Prints records as the simulation's original console messages."""
+    def write(self, record):
+        print(format_record(record))
+
+
+def format_record(record):
+    event = record["event"]
+    tick = record["tick"]
+    if event == "spawn":
+        return f"Tick {tick}: Patient {record['patient']} spawned with severity {record['severity']}"
+    if event == "assign":
+        if record["role"] == "nurse":
+            return f"Tick {tick}: Nurse {record['staff']} assigned to Patient {record['patient']} for room {record['room']}"
+        if record.get("waited"):
+            return f"Tick {tick}: Doctor {record['staff']} now available for Patient {record['patient']}"
+        return f"Tick {tick}: Doctor {record['staff']} assigned to Patient {record['patient']}"
+    if event == "arrive":
+        return f"Tick {tick}: Patient {record['patient']} arrived at room {record['room']}"
+    if event == "idle":
+        return f"Tick {tick}: {record['role'].capitalize()} {record['staff']} returned to idle position"
+    if event == "wait":
+        return f"Tick {tick}: Patient {record['patient']} waiting for doctor"
+    if event == "treat":
+        return f"Tick {tick}: Doctor {record['staff']} treating Patient {record['patient']}"
+    if event == "treated":
+        if record["role"] == "nurse":
+            return f"Tick {tick}: Patient {record['patient']} treatment complete, discharging (path length: {record['path_length']})"
+        return f"Tick {tick}: Patient {record['patient']} treatment complete, doctor returning"
+    if event == "discharge":
+        return f"Tick {tick}: Patient {record['patient']} starting discharge (path length: {record['path_length']})"
+    if event == "discharged":
+        return f"Tick {tick}: Patient {record['patient']} discharged"
+    if event == "no_path":
+        return f"WARNING: No path found from {record['start']} to {record['end']}"
+    if event == "tick":
+        return f"\n=== Tick {tick} ==="
+    if event == "tick_stats":
+        return f"Active patients: {record['active_patients']}, Waiting: {record['waiting']}, Active tasks: {record['active_tasks']}"
+    return json.dumps(record)
+
+
+def console_log(level=DEBUG):
+    """Log printing every event as the simulation always has (the default)."""
+    return EventLog(level, [ConsoleSink()])
+
+
+class SilentLog(EventLog):
+    """
+    Disabled log that stays disabled: set_level and add_sink raise, so the
+    shared SILENT can't start logging for every simulation that uses it.
+    """
+    def __init__(self):
+        self.sinks = ()
+        self.level = OFF
+        self.debug = self.info = self.warning = False
+
+    def set_level(self, level):
+        raise TypeError("SilentLog is always off; use EventLog(level, sinks) for a log of your own")
+
+    def add_sink(self, sink):
+        raise TypeError("SilentLog is always off; use EventLog(level, sinks) for a log of your own")
+
+
+# Shared disabled log for headless runs
+SILENT = SilentLog()
@@ -1,14 +1,26 @@
-from engine import Patient, Nurse, Doctor, get_path
-from visualizer import HospitalVisualizer
-import heapq
-import random
+from simulation import Simulation, run_sim
+from recording import OccupancyIndex
+from analysis import (
+    ANALYSIS_CACHE,
+    analysis_key,
+    average_congestion,
+    cell_points,
+    classify,
+    iqr_statistics,
+    point_dicts,
+    top_n,
+    unscored_cells,
+)
+from dispatch import greedy_dispatch
 import os
+import sys
 import time
-import matplotlib.pyplot as plt
 import json
 import numpy as np
-import requests
-from tokenc import TokenClient
+
+# matplotlib (visualizer, render), requests (woodwide) and tokenc
+# (compression) are imported inside the functions that use them, so
+# headless runs and sweeps start without them.
 
 
 def create_simulation(
@@ -19,427 +31,105 @@ def create_simulation(
     spawn_point=(0, 0),
     waiting_room_pos=(0, 1),
     pattern=[2, 5, 3, 1, 5, 2, 3, 1, 5, 3],
+    route_cache_size=4096,
+    seed=None,
+    dispatch_policy=greedy_dispatch,
+    log=None,
 ):
     """
-    Create a simulation context with the given configuration.
+    Create a simulation with the given configuration.
 
-    Args:
-        hospital: 2D array representing hospital layout
-                  -2: Wall (impassable)
-                  -1: Spawn point
-                   0: Free space (walkable)
-                   1: Waiting room
-                  Treatment rooms are automatically marked based on treatment_rooms_config
-        nurse_positions: List of (row, col) tuples for nurse idle positions
-        doctor_positions: List of (row, col) tuples for doctor idle positions
-        treatment_rooms_config: Dict mapping (row, col) to {'severity_type': 0 or 1, 'occupancy': 0}
-                               severity_type 0 = low severity (will be marked as 4 in grid)
-                               severity_type 1 = high severity (will be marked as 5 in grid)
-        spawn_point: Tuple (row, col) where patients spawn
-        waiting_room_pos: Tuple (row, col) for waiting room position
-        pattern: List of patient severity values to cycle through
+    See Simulation in simulation.py for the arguments.
 
     Returns:
-        Dictionary containing all simulation state and functions
+        Simulation holding all state, with spawn_patient(), patient_to_room(),
+        process_tasks() and step() as methods
     """
-    # Create a copy of the hospital grid and mark treatment rooms
-    hospital = [row[:] for row in hospital]  # Deep copy
-
-    # Mark treatment rooms in the hospital grid based on config
-    for pos, info in treatment_rooms_config.items():
-        r, c = pos
-        if info["severity_type"] == 0:
-            hospital[r][c] = 4  # Low severity treatment room
-        else:
-            hospital[r][c] = 5  # High severity treatment room
-
-    # Create nurses
-    nurses = [Nurse(state=0, idle_position=pos) for pos in nurse_positions]
-
-    # Create doctors
-    doctors = [Doctor(state=0, idle_position=pos) for pos in doctor_positions]
-
-    # Copy treatment rooms to avoid mutation
-    treatment_rooms = {pos: info.copy() for pos, info in treatment_rooms_config.items()}
-
-    # Simulation state
-    sim_state = {
-        "hospital": hospital,
-        "nurses": nurses,
-        "doctors": doctors,
-        "treatment_rooms": treatment_rooms,
-        "spawn_point": spawn_point,
-        "waiting_room_pos": waiting_room_pos,
-        "pattern": pattern,
-        "pattern_index": 0,
-        "waiting_room": [],
-        "tick": 0,
-        "active_tasks": [],
-    }
-
-    def spawn_patient():
-        severity = sim_state["pattern"][sim_state["pattern_index"]]
-        sim_state["pattern_index"] = (sim_state["pattern_index"] + 1) % len(sim_state["pattern"])
-        patient = Patient(severity=severity, position=sim_state["spawn_point"])
-        heapq.heappush(sim_state["waiting_room"], patient)
-        print(f"Tick {sim_state['tick']}: Patient {patient.id} spawned with severity {severity}")
-
-    def get_idle_nurse():
-        for nurse in sim_state["nurses"]:
-            if nurse.state == 0:
-                return nurse
-        return None
+    return Simulation(
+        hospital,
+        nurse_positions,
+        doctor_positions,
+        treatment_rooms_config,
+        spawn_point=spawn_point,
+        waiting_room_pos=waiting_room_pos,
+        pattern=pattern,
+        route_cache_size=route_cache_size,
+        seed=seed,
+        dispatch_policy=dispatch_policy,
+        log=log,
+    )
 
-    def get_idle_doctor():
-        idle_docs = [doc for doc in sim_state["doctors"] if doc.state == 0]
-        if idle_docs:
-            return random.choice(idle_docs)
-        return None
 
-    def get_free_room(severity):
-        severity_type = 0 if severity < 4 else 1
-        for room_pos, room_info in sim_state["treatment_rooms"].items():
-            if room_info["severity_type"] == severity_type and room_info["occupancy"] == 0:
-                return room_pos
-        return None
+def run_visual(
+    sim_state,
+    max_ticks=100,
+    interval=100,
+    num_interp_frames=5,
+    out_path=None,
+    fps=30,
+    dpi=100,
+    renderer="inline",
+    ring_slots=256,
+    spawn_interval=5,
+):
+    """
+    Run simulation with graphical visualization with smooth movement.
+    A patient spawns every spawn_interval ticks, as in run_sim.
 
-    def patient_to_room():
-        if not sim_state["waiting_room"]:
-            return
-
-        nurse = get_idle_nurse()
-        if not nurse:
-            return
-
-        patient = heapq.heappop(sim_state["waiting_room"])
-        room_pos = get_free_room(patient.severity)
-
-        if not room_pos:
-            heapq.heappush(sim_state["waiting_room"], patient)
-            return
-
-        sim_state["treatment_rooms"][room_pos]["occupancy"] = 1
-        nurse.state = 1
-
-        task = {
-            "type": "escort_patient",
-            "nurse": nurse,
-            "patient": patient,
-            "room": room_pos,
-            "stage": "to_waiting_room",
-            "path": get_path(sim_state["hospital"], nurse.position, sim_state["waiting_room_pos"]),
-            "path_index": 0,
-            "treatment_time": 5,
-        }
-        sim_state["active_tasks"].append(task)
-        print(f"Tick {sim_state['tick']}: Nurse {nurse.id} assigned to Patient {patient.id} for room {room_pos}")
-
-    def move_along_path(entity, task):
-        """
-        Move entity along path.
-
-        Returns:
-            True if reached destination, False otherwise
-        """
-        # If path is empty, we're already at destination
-        if not task["path"]:
-            return True
-
-        if task["path_index"] < len(task["path"]):
-            entity.position = task["path"][task["path_index"]]
-            task["path_index"] += 1
-            return False
-        return True
-
-    def process_tasks():
-        completed_tasks = []
-
-        for task in sim_state["active_tasks"]:
-            if task["type"] == "escort_patient":
-                if task["stage"] == "to_waiting_room":
-                    if move_along_path(task["nurse"], task):
-                        task["stage"] = "escort_to_room"
-                        task["path"] = get_path(sim_state["hospital"], sim_state["waiting_room_pos"], task["room"])
-                        task["path_index"] = 0
-                        task["patient"].position = sim_state["waiting_room_pos"]
-
-                elif task["stage"] == "escort_to_room":
-                    if move_along_path(task["nurse"], task):
-                        task["patient"].position = task["room"]
-                        print(f"Tick {sim_state['tick']}: Patient {task['patient'].id} arrived at room {task['room']}")
-
-                        if task["patient"].severity >= 4:
-                            task["stage"] = "nurse_return"
-                            task["path"] = get_path(
-                                sim_state["hospital"], task["nurse"].position, task["nurse"].idle_position
-                            )
-                            task["path_index"] = 0
-                        else:
-                            task["stage"] = "treating"
-                            task["treatment_counter"] = 0
-                    else:
-                        task["patient"].position = task["nurse"].position
-
-                elif task["stage"] == "nurse_return":
-                    if move_along_path(task["nurse"], task):
-                        task["nurse"].state = 0
-                        print(f"Tick {sim_state['tick']}: Nurse {task['nurse'].id} returned to idle position")
-
-                        doctor = get_idle_doctor()
-                        if doctor:
-                            doctor.state = 1
-                            doctor_task = {
-                                "type": "doctor_treat",
-                                "doctor": doctor,
-                                "patient": task["patient"],
-                                "room": task["room"],
-                                "stage": "to_room",
-                                "path": get_path(sim_state["hospital"], doctor.position, task["room"]),
-                                "path_index": 0,
-                                "treatment_time": task["treatment_time"],
-                                "treatment_counter": 0,
-                            }
-                            sim_state["active_tasks"].append(doctor_task)
-                            print(f"Tick {sim_state['tick']}: Doctor {doctor.id} assigned to Patient {task['patient'].id}")
-                        else:
-                            waiting_doctor_task = {
-                                "type": "waiting_for_doctor",
-                                "patient": task["patient"],
-                                "room": task["room"],
-                                "treatment_time": task["treatment_time"],
-                            }
-                            sim_state["active_tasks"].append(waiting_doctor_task)
-                            print(f"Tick {sim_state['tick']}: Patient {task['patient'].id} waiting for doctor")
-
-                        completed_tasks.append(task)
-
-                elif task["stage"] == "treating":
-                    task["treatment_counter"] += 1
-                    if task["treatment_counter"] >= task["treatment_time"]:
-                        task["nurse"].state = 0
-                        task["stage"] = "patient_discharge"
-                        # Ensure patient is at the treatment room before creating discharge path
-                        task["patient"].position = task["room"]
-                        discharge_path = get_path(sim_state["hospital"], task["room"], sim_state["spawn_point"])
-                        if not discharge_path:
-                            print(f"WARNING: No path found from {task['room']} to {sim_state['spawn_point']}")
-                            discharge_path = [sim_state["spawn_point"]]  # Fallback
-                        task["path"] = discharge_path
-                        task["path_index"] = 0
-                        sim_state["treatment_rooms"][task["room"]]["occupancy"] = 0
-                        print(
-                            f"Tick {sim_state['tick']}: Patient {task['patient'].id} treatment complete, discharging (path length: {len(discharge_path)})"
-                        )
-
-                elif task["stage"] == "patient_discharge":
-                    if move_along_path(task["patient"], task):
-                        Patient.count -= 1
-                        print(f"Tick {sim_state['tick']}: Patient {task['patient'].id} discharged")
-                        completed_tasks.append(task)
-
-            elif task["type"] == "waiting_for_doctor":
-                doctor = get_idle_doctor()
-                if doctor:
-                    doctor.state = 1
-                    doctor_task = {
-                        "type": "doctor_treat",
-                        "doctor": doctor,
-                        "patient": task["patient"],
-                        "room": task["room"],
-                        "stage": "to_room",
-                        "path": get_path(sim_state["hospital"], doctor.position, task["room"]),
-                        "path_index": 0,
-                        "treatment_time": task["treatment_time"],
-                        "treatment_counter": 0,
-                    }
-                    sim_state["active_tasks"].append(doctor_task)
-                    print(f"Tick {sim_state['tick']}: Doctor {doctor.id} now available for Patient {task['patient'].id}")
-                    completed_tasks.append(task)
-
-            elif task["type"] == "doctor_treat":
-                if task["stage"] == "to_room":
-                    if move_along_path(task["doctor"], task):
-                        task["stage"] = "treating"
-                        print(f"Tick {sim_state['tick']}: Doctor {task['doctor'].id} treating Patient {task['patient'].id}")
-
-                elif task["stage"] == "treating":
-                    task["treatment_counter"] += 1
-                    if task["treatment_counter"] >= task["treatment_time"]:
-                        task["stage"] = "doctor_return"
-                        task["path"] = get_path(
-                            sim_state["hospital"], task["doctor"].position, task["doctor"].idle_position
-                        )
-                        task["path_index"] = 0
-                        sim_state["treatment_rooms"][task["room"]]["occupancy"] = 0
-                        print(f"Tick {sim_state['tick']}: Patient {task['patient'].id} treatment complete, doctor returning")
-
-                elif task["stage"] == "doctor_return":
-                    if move_along_path(task["doctor"], task):
-                        task["doctor"].state = 0
-                        print(f"Tick {sim_state['tick']}: Doctor {task['doctor'].id} returned to idle position")
-                        task["stage"] = "patient_discharge"
-                        # Ensure patient is at the treatment room before creating discharge path
-                        task["patient"].position = task["room"]
-                        discharge_path = get_path(sim_state["hospital"], task["room"], sim_state["spawn_point"])
-                        if not discharge_path:
-                            print(f"WARNING: No path found from {task['room']} to {sim_state['spawn_point']}")
-                            discharge_path = [sim_state["spawn_point"]]  # Fallback
-                        task["path"] = discharge_path
-                        task["path_index"] = 0
-                        print(
-                            f"Tick {sim_state['tick']}: Patient {task['patient'].id} starting discharge (path length: {len(discharge_path)})"
-                        )
-
-                elif task["stage"] == "patient_discharge":
-                    if move_along_path(task["patient"], task):
-                        Patient.count -= 1
-                        print(f"Tick {sim_state['tick']}: Patient {task['patient'].id} discharged")
-                        completed_tasks.append(task)
-
-        for task in completed_tasks:
-            if task in sim_state["active_tasks"]:
-                sim_state["active_tasks"].remove(task)
-
-    # Add functions to sim_state
-    sim_state["spawn_patient"] = spawn_patient
-    sim_state["patient_to_room"] = patient_to_room
-    sim_state["process_tasks"] = process_tasks
-
-    return sim_state
-
-
-def run_sim(sim_state, max_ticks=100):
-    """Run simulation without visualization"""
-    for tick in range(max_ticks):
-        sim_state["tick"] = tick
-        print(f"\n=== Tick {tick} ===")
-
-        if tick % 5 == 0:
-            sim_state["spawn_patient"]()
-
-        sim_state["patient_to_room"]()
-        sim_state["process_tasks"]()
-
-        print(
-            f"Active patients: {Patient.count}, Waiting: {len(sim_state['waiting_room'])}, Active tasks: {len(sim_state['active_tasks'])}"
-        )
+    With out_path set nothing is shown: frames are rendered headless (Agg)
+    to a video file (.mp4 via ffmpeg, .gif) or, for a path without an
+    extension, a directory of PNG frames. num_interp_frames sets the frames
+    drawn per tick.
 
+    renderer="process" draws in a separate process instead: the simulation
+    publishes each tick to a shared-memory TickRing of ring_slots ticks.
+    In a window it runs ahead at full speed while the renderer reads the
+    ring at its own frame rate (skipping ticks if it falls a whole ring
+    behind; the count is reported), and the congestion report runs without
+    waiting for the window. With out_path no tick is skipped: the
+    simulation waits whenever the ring is full.
 
-def run_visual(sim_state, max_ticks=100, interval=100):
-    """
-    Run simulation with graphical visualization with smooth movement.
+    With out_path the congestion analysis figure is saved next to the
+    output (<out_path without extension>_congestion.png) rather than shown,
+    and matplotlib uses the Agg backend unless pyplot was already imported.
 
     Returns:
         avg_congestion: 2D numpy array with average entities per occupied tick for each grid square
     """
-    viz = HospitalVisualizer(sim_state["hospital"], sim_state["nurses"], sim_state["doctors"], sim_state["treatment_rooms"])
-
-    rows = len(sim_state["hospital"])
-    cols = len(sim_state["hospital"][0])
+    rows = len(sim_state.hospital)
+    cols = len(sim_state.hospital[0])
     congestion_sum = np.zeros((rows, cols))
     congestion_count = np.zeros((rows, cols))
+    occupancy = OccupancyIndex(sim_state)
+
+    def advance(tick):
+        """Step the simulation and add the tick to the congestion totals."""
+        # Run simulation logic
+        sim_state.step(tick, spawn_interval)
+        occupancy.update(sim_state)
 
-    def capture_positions():
-        """Capture current positions of all entities"""
-        positions = {}
-        for nurse in sim_state["nurses"]:
-            positions[f"nurse_{nurse.id}"] = nurse.position
-        for doctor in sim_state["doctors"]:
-            positions[f"doctor_{doctor.id}"] = doctor.position
-        for task in sim_state["active_tasks"]:
-            if "patient" in task:
-                positions[f"patient_{task['patient'].id}"] = task["patient"].position
-        return positions
-
-    def detect_swaps(prev_positions, curr_positions):
-        """Detect when two entities are swapping positions between adjacent squares"""
-        swaps = []
-        checked_pairs = set()
-
-        for entity_id1, curr_pos1 in curr_positions.items():
-            prev_pos1 = prev_positions.get(entity_id1)
-            if prev_pos1 is None or prev_pos1 == curr_pos1:
-                continue
-
-            # Check if positions are adjacent (manhattan distance = 1)
-            if abs(prev_pos1[0] - curr_pos1[0]) + abs(prev_pos1[1] - curr_pos1[1]) != 1:
-                continue
-
-            # Check if another entity is moving from curr_pos1 to prev_pos1
-            for entity_id2, curr_pos2 in curr_positions.items():
-                if entity_id1 == entity_id2:
-                    continue
-
-                pair_key = tuple(sorted([entity_id1, entity_id2]))
-                if pair_key in checked_pairs:
-                    continue
-
-                prev_pos2 = prev_positions.get(entity_id2)
-                if prev_pos2 is None:
-                    continue
-
-                # Check if entities are swapping: entity1 goes from A to B, entity2 goes from B to A
-                if prev_pos1 == curr_pos2 and prev_pos2 == curr_pos1:
-                    type1, id1 = entity_id1.split("_")
-                    type2, id2 = entity_id2.split("_")
-                    swaps.append((prev_pos1, curr_pos1, type1, int(id1), type2, int(id2)))
-                    checked_pairs.add(pair_key)
-                    break
-
-        return swaps
+        # Track congestion for this tick - count every entity in the squares
+        # where some entity moved (flat cell indexes, each cell once)
+        cells, counts = occupancy.congestion()
+        congestion_sum.ravel()[cells] += counts
+        congestion_count.ravel()[cells] += 1
 
     def simulation_generator():
         for tick in range(max_ticks):
-            sim_state["tick"] = tick
-
-            prev_positions = capture_positions()
-
-            # Run simulation logic
-            if tick % 5 == 0:
-                sim_state["spawn_patient"]()
-
-            sim_state["patient_to_room"]()
-            sim_state["process_tasks"]()
+            advance(tick)
+            prev_positions = occupancy.positions(before=True)
+            curr_positions = occupancy.positions()
 
-            curr_positions = capture_positions()
+            swaps = occupancy.swaps()
 
-            # Track congestion for this tick - only count entities if there's movement
-            tick_congestion = np.zeros((rows, cols))
-            has_movement = np.zeros((rows, cols), dtype=bool)
-
-            # First pass: identify squares with moving entities
-            for entity_id, pos in curr_positions.items():
-                prev_pos = prev_positions.get(entity_id)
-                if prev_pos is not None and prev_pos != pos:
-                    r, c = pos
-                    has_movement[r, c] = True
-
-            # Second pass: count entities only in squares with movement
-            for entity_id, pos in curr_positions.items():
-                r, c = pos
-                if has_movement[r, c]:
-                    tick_congestion[r, c] += 1
-
-            congestion_sum[:] += tick_congestion
-            congestion_count[:] += (tick_congestion > 0).astype(int)
-
-            swaps = detect_swaps(prev_positions, curr_positions)
-
-            stats = {
-                "active_patients": Patient.count,
-                "waiting": len(sim_state["waiting_room"]),
-                "nurses_busy": sum(1 for n in sim_state["nurses"] if n.state == 1),
-                "nurses_total": len(sim_state["nurses"]),
-                "doctors_busy": sum(1 for d in sim_state["doctors"] if d.state == 1),
-                "doctors_total": len(sim_state["doctors"]),
-            }
+            stats = sim_state.stats()
 
             # Yield multiple frames for smooth interpolation
             for frame in range(viz.num_interp_frames):
                 t = frame / viz.num_interp_frames
                 yield {
                     "tick": tick,
-                    "active_tasks": sim_state["active_tasks"],
+                    "active_tasks": sim_state.active_tasks,
                     "stats": stats,
                     "prev_positions": prev_positions,
                     "curr_positions": curr_positions,
@@ -447,41 +137,81 @@ def run_visual(sim_state, max_ticks=100, interval=100):
                     "swaps": swaps,
                 }
 
-    from matplotlib.animation import FuncAnimation
+    if out_path is not None and "matplotlib.pyplot" not in sys.modules:
+        import matplotlib
 
-    _anim = FuncAnimation(
-        viz.fig,
-        viz.update,
-        frames=simulation_generator(),
-        interval=interval,
-        blit=False,
-        repeat=False,
-    )
-
-    viz.show()
-
-    # Calculate average congestion (your original correct logic)
-    avg_congestion = np.full((rows, cols), 0.0)
-    for r in range(rows):
-        for c in range(cols):
-            if congestion_count[r, c] > 0:
-                avg_congestion[r, c] = congestion_sum[r, c] / congestion_count[r, c]
+        matplotlib.use("Agg")  # nothing is shown, so no display is needed
 
-    avg_congestion[0, 0] = 0.0
-    avg_congestion[0, 1] = 0.0
+    ring = None
+    render_process = None
+    try:
+        if renderer == "process":
+            from render import start_renderer
+            from ring import TickRing
+
+            ring = TickRing.create(slots=ring_slots)
+            ring.write(sim_state)  # starting state
+            render_process = start_renderer(ring, sim_state, num_interp_frames=num_interp_frames, interval=interval,
+                                            out_path=out_path, fps=fps, dpi=dpi)
+            for tick in range(max_ticks):
+                advance(tick)
+                if out_path is not None and not ring.wait_for_slot(render_process.is_alive):
+                    raise RuntimeError(f"renderer exited with code {render_process.exitcode}")
+                ring.write(sim_state)
+            ring.finish()
+            if ring.truncated:
+                print(f"WARNING: more than {ring.max_agents} agents in a tick; the renderer showed the first {ring.max_agents}")
+        else:
+            from render import save_png_sequence, save_video
+            from visualizer import HospitalVisualizer
+
+            viz = HospitalVisualizer(sim_state.hospital, sim_state.nurses, sim_state.doctors, sim_state.treatment_rooms,
+                                     num_interp_frames=num_interp_frames)
+            if out_path is None:
+                from matplotlib.animation import FuncAnimation
+
+                _anim = FuncAnimation(
+                    viz.fig,
+                    viz.update,
+                    frames=simulation_generator(),
+                    init_func=viz.init_frame,
+                    interval=interval,
+                    blit=True,
+                    repeat=False,
+                )
+
+                viz.show()
+            elif os.path.splitext(out_path)[1]:
+                save_video(viz, simulation_generator(), out_path, fps=fps, dpi=dpi)
+            else:
+                save_png_sequence(viz, simulation_generator(), out_path, dpi=dpi)
 
-    # Zero all treatment room positions
-    for (r, c) in sim_state["treatment_rooms"].keys():
-        avg_congestion[r, c] = 0.0
+        # Average congestion, zero on the spawn, waiting room and treatment rooms
+        avg_congestion = average_congestion(congestion_sum, congestion_count, unscored_cells(sim_state))
 
-    save_congestion_to_csv(avg_congestion)
-    display_congestion_analysis(sim_state, congestion_sum, congestion_count, max_ticks)
+        save_congestion_to_csv(avg_congestion)
+        analysis_path = None if out_path is None else f"{os.path.splitext(out_path.rstrip(os.sep))[0]}_congestion.png"
+        display_congestion_analysis(sim_state, congestion_sum, congestion_count, max_ticks, save_path=analysis_path)
 
-    # ✅ Wood Wide AI anomaly detection integrated here
-    anomaly_results = analyze_congestion_with_woodwide(avg_congestion)
+        # ✅ Wood Wide AI anomaly detection integrated here
+        anomaly_results = analyze_congestion_with_woodwide(avg_congestion)
 
-    # Generate and print Gemini improvement prompt (does NOT send to Gemini)
-    generate_gemini_improvement_prompt(sim_state, avg_congestion, anomaly_results)
+        # Generate and print Gemini improvement prompt (does NOT send to Gemini)
+        generate_gemini_improvement_prompt(sim_state, avg_congestion, anomaly_results)
+    except BaseException:
+        # Don't leave the renderer drawing (or a window open) for a failed run
+        if render_process is not None:
+            render_process.terminate()
+        raise
+    finally:
+        # Always release the renderer and the shared-memory segment
+        if ring is not None:
+            ring.finish()
+            if render_process is not None:
+                render_process.join()
+            if ring.skipped:
+                print(f"WARNING: the renderer fell behind and skipped {ring.skipped} ticks")
+            ring.close()
 
     return avg_congestion
 
@@ -501,63 +231,41 @@ def save_congestion_to_csv(avg_congestion):
     print(f"\nCongestion data saved to: {filepath}")
 
 
-def display_congestion_analysis(sim_state, congestion_sum, congestion_count, total_ticks):
+def display_congestion_analysis(sim_state, congestion_sum, congestion_count, total_ticks, save_path=None):
     """
     Display post-simulation congestion analysis (and PRINT the exact text payload
     we would send to Gemini asking for improvements). Does NOT send anything.
+
+    With save_path the figure is written there as an image instead of shown.
     """
     import json
-    import matplotlib.patches as patches
+    import matplotlib.pyplot as plt
+    from matplotlib.colors import to_rgba
+    from visualizer import LABEL_CELL_LIMIT, TICK_CELL_LIMIT
 
-    hospital = sim_state["hospital"]
+    hospital = sim_state.hospital
     rows = len(hospital)
     cols = len(hospital[0])
 
     # ---- compute avg congestion ----
-    avg_congestion = np.zeros((rows, cols), dtype=float)
-    for r in range(rows):
-        for c in range(cols):
-            if congestion_count[r, c] > 0:
-                avg_congestion[r, c] = congestion_sum[r, c] / congestion_count[r, c]
-            else:
-                avg_congestion[r, c] = 0.0
-
-    # mask out any special squares you don't want to consider congestion
-    avg_congestion[0, 0] = 0.0
-    avg_congestion[0, 1] = 0.0
-    for (r, c) in sim_state["treatment_rooms"].keys():
-        avg_congestion[r, c] = 0.0
+    # spawn, waiting room and treatment rooms are masked out of congestion
+    avg_congestion = average_congestion(congestion_sum, congestion_count, unscored_cells(sim_state))
 
     # ---- visualize (your existing plot) ----
     fig, ax = plt.subplots(figsize=(10, 8))
     fig.suptitle("Post-Simulation Congestion Analysis (All Squares)", fontsize=14, fontweight="bold")
 
-    for r in range(rows):
-        for c in range(cols):
-            cell_value = hospital[r][c]
-            pos = (r, c)
-
-            if cell_value == -2:
-                color = "#2C3E50"; alpha = 0.3
-            elif pos == (0, 0):
-                color = "#95A5A6"; alpha = 0.3
-            elif pos == (0, 1):
-                color = "#F39C12"; alpha = 0.3
-            elif pos in sim_state["treatment_rooms"]:
-                if sim_state["treatment_rooms"][pos]["severity_type"] == 0:
-                    color = "#3498DB"
-                else:
-                    color = "#E74C3C"
-                alpha = 0.3
-            else:
-                color = "#ECF0F1"; alpha = 0.1
-
-            rect = patches.Rectangle(
-                (c - 0.5, r - 0.5), 1, 1,
-                linewidth=1, edgecolor="gray",
-                facecolor=color, alpha=alpha
-            )
-            ax.add_patch(rect)
+    # Cell backgrounds as one RGBA image: walls, spawn, waiting room, rooms, free
+    grid = np.asarray(hospital)
+    background = np.empty((rows, cols, 4))
+    background[:] = to_rgba("#ECF0F1", 0.1)
+    background[grid == -2] = to_rgba("#2C3E50", 0.3)
+    background[0, 0] = to_rgba("#95A5A6", 0.3)
+    background[0, 1] = to_rgba("#F39C12", 0.3)
+    for (r, c), info in sim_state.treatment_rooms.items():
+        if grid[r, c] != -2 and (r, c) not in ((0, 0), (0, 1)):
+            background[r, c] = to_rgba("#3498DB" if info["severity_type"] == 0 else "#E74C3C", 0.3)
+    ax.imshow(background, interpolation="nearest")
 
     vmax = np.max(avg_congestion) if np.max(avg_congestion) > 0 else 1.0
     im = ax.imshow(avg_congestion, cmap="YlOrRd", interpolation="nearest", vmin=0, vmax=vmax, alpha=0.8)
@@ -565,24 +273,32 @@ def display_congestion_analysis(sim_state, congestion_sum, congestion_count, tot
     cbar = plt.colorbar(im, ax=ax)
     cbar.set_label("Average Entities per Tick", rotation=270, labelpad=20)
 
-    max_congestion = np.max(avg_congestion)
-    for r in range(rows):
-        for c in range(cols):
-            val = avg_congestion[r, c]
-            ax.text(
-                c, r, f"{val:.2f}",
-                ha="center", va="center",
-                fontsize=10, fontweight="bold",
-                color="white" if val > max_congestion / 2 else "black",
-            )
+    # Per-cell values only while they can be read
+    if rows * cols <= LABEL_CELL_LIMIT:
+        max_congestion = np.max(avg_congestion)
+        for r in range(rows):
+            for c in range(cols):
+                val = avg_congestion[r, c]
+                ax.text(
+                    c, r, f"{val:.2f}",
+                    ha="center", va="center",
+                    fontsize=10, fontweight="bold",
+                    color="white" if val > max_congestion / 2 else "black",
+                )
 
     ax.set_xlim(-0.5, cols - 0.5)
     ax.set_ylim(-0.5, rows - 0.5)
     ax.set_aspect("equal")
     ax.invert_yaxis()
-    ax.set_xticks(range(cols))
-    ax.set_yticks(range(rows))
-    ax.grid(True, alpha=0.3, linewidth=1.5)
+    if max(rows, cols) <= TICK_CELL_LIMIT:
+        ax.set_xticks(range(cols))
+        ax.set_yticks(range(rows))
+        ax.grid(True, alpha=0.3, linewidth=1.5)
+        # Cell borders
+        ax.set_xticks(np.arange(cols + 1) - 0.5, minor=True)
+        ax.set_yticks(np.arange(rows + 1) - 0.5, minor=True)
+        ax.grid(True, which="minor", color="gray", alpha=0.3, linewidth=1)
+        ax.tick_params(which="minor", length=0)
     ax.set_xlabel("Column")
     ax.set_ylabel("Row")
 
@@ -599,37 +315,39 @@ def display_congestion_analysis(sim_state, congestion_sum, congestion_count, tot
     # )
 
     plt.tight_layout()
-    plt.show()
+    if save_path is None:
+        plt.show()
+    else:
+        fig.savefig(save_path)
+        plt.close(fig)
+        print(f"Congestion analysis saved to: {save_path}")
 
     # =========================
     # BUILD GEMINI TEXT PAYLOAD (PRINT ONLY, DO NOT SEND)
     # =========================
 
-    # --- derive key locations from sim_state (edit these if your sim uses different keys) ---
+    # --- derive key locations from sim_state (edit these if your sim uses different attributes) ---
     spawn_points = []
     waiting_areas = []
 
-    # common patterns: explicit lists in sim_state OR encoded in hospital grid
-    if "spawn_points" in sim_state:
-        spawn_points = list(sim_state["spawn_points"])
+    # common patterns: explicit lists on sim_state OR encoded in hospital grid
+    if hasattr(sim_state, "spawn_points"):
+        spawn_points = list(sim_state.spawn_points)
     else:
         # fallback guess: (0,1) looks like your entry in the viz
         spawn_points = [(0, 1)]
 
-    if "waiting_areas" in sim_state:
-        waiting_areas = list(sim_state["waiting_areas"])
+    if hasattr(sim_state, "waiting_areas"):
+        waiting_areas = list(sim_state.waiting_areas)
     else:
         # fallback guess: any cell with value 1 is a waiting square
-        for rr in range(rows):
-            for cc in range(cols):
-                if hospital[rr][cc] == 1:
-                    waiting_areas.append((rr, cc))
+        waiting_areas = [tuple(cell) for cell in np.argwhere(np.asarray(hospital) == 1).tolist()]
 
-    nurse_positions = list(sim_state.get("nurse_positions", []))
-    doctor_positions = list(sim_state.get("doctor_positions", []))
+    nurse_positions = list(getattr(sim_state, "nurse_positions", []))
+    doctor_positions = list(getattr(sim_state, "doctor_positions", []))
 
     treatment_rooms = []
-    for (rr, cc), meta in sim_state.get("treatment_rooms", {}).items():
+    for (rr, cc), meta in getattr(sim_state, "treatment_rooms", {}).items():
         treatment_rooms.append({
             "row": int(rr), "col": int(cc),
             "severity_type": int(meta.get("severity_type", -1)),
@@ -646,7 +364,7 @@ def display_congestion_analysis(sim_state, congestion_sum, congestion_count, tot
     if ww_results:
         ww_out = display_anomaly_results(
             ww_results,
-            [{"row": r, "col": c, "congestion": float(avg_congestion[r, c])} for r in range(rows) for c in range(cols)],
+            cell_points(avg_congestion),
             grid_shape=avg_congestion.shape,
             only_congested=True,
             top_n=10,
@@ -657,12 +375,7 @@ def display_congestion_analysis(sim_state, congestion_sum, congestion_count, tot
 
     # fallback: if none congested, take heaviest congestion cells
     if not congested_points:
-        flat = []
-        for rr in range(rows):
-            for cc in range(cols):
-                flat.append({"row": rr, "col": cc, "congestion": float(avg_congestion[rr, cc])})
-        flat.sort(key=lambda x: x["congestion"], reverse=True)
-        heavy_points = [p for p in flat if p["congestion"] > 0][:10]  # top 10 non-zero
+        heavy_points = point_dicts(avg_congestion, top_n(avg_congestion, avg_congestion > 0, 10))  # top 10 non-zero
     else:
         heavy_points = []  # not needed if we have anomalies
 
@@ -734,112 +447,116 @@ def display_congestion_analysis(sim_state, congestion_sum, congestion_count, tot
 # Wood Wide AI integration
 # =========================
 
-def analyze_congestion_with_woodwide(avg_congestion, api_key=None, model_id=None, base_url=None):
+def _woodwide_settings(api_key, model_id, base_url):
+    if api_key is None:
+        api_key = os.environ.get("WOODWIDE")
+
+    if model_id is None:
+        model_id = os.environ.get("WOODWIDE_MODEL_ID")
+
+    if base_url is None:
+        base_url = os.environ.get("WOODWIDE_BASE_URL", "https://beta.woodwide.ai")
+    return api_key, model_id, base_url
+
+
+def _print_missing_woodwide(api_key, model_id):
+    print("\n" + "=" * 60)
+    print("🌲 WOOD WIDE AI (INFERENCE ONLY)")
+    print("=" * 60)
+    if not api_key:
+        print("⚠️ Missing API key. Set WOODWIDE_API_KEY (or WOODWIDE).")
+    if not model_id:
+        print("⚠️ Missing model id. Set WOODWIDE_MODEL_ID to use inference-only mode.")
+    print("➡️ Falling back to local anomaly detection (no training performed).")
+    print("=" * 60)
+
+
+def _woodwide_infer(valid_points, api_key, model_id, base_url, dataset_prefix="hospital_congestion_infer"):
+    """
+    Upload one inference dataset of (rows, cols, congestion) points and run
+    model_id on it through the shared woodwide client. Returns the response
+    JSON, or None (after printing the error) if the API answers with an
+    error. Network errors and timeouts propagate once retries run out.
+    """
+    from woodwide import WoodWideError, get_client
+
+    client = get_client(api_key, base_url)
+    infer_dataset_name = f"{dataset_prefix}_{int(time.time())}"
+
+    try:
+        print(f"\n[1/2] 📤 Uploading inference dataset to Wood Wide AI...")
+        infer_dataset_id = client.upload_dataset(valid_points, infer_dataset_name)
+        print(f"✅ Inference dataset uploaded. ID: {infer_dataset_id}")
+
+        print(f"\n[2/2] 🔍 Running inference...")
+        return client.infer(model_id, infer_dataset_id)
+
+    except WoodWideError as e:
+        print(f"❌ Error {'uploading inference dataset' if e.step == 'upload' else 'running inference'}: {e.status_code}")
+        print(e.text)
+        return None
+
+
+def analyze_congestion_with_woodwide(avg_congestion, api_key=None, model_id=None, base_url=None, cache=None):
     """
     Inference-only anomaly detection via Wood Wide AI.
 
     ✅ Never trains a model.
     ✅ Uploads ONLY an inference dataset, then calls infer on an existing model_id.
     ✅ If model_id is missing, falls back to local anomaly detection.
+    ✅ Results are memoized in cache (analysis.ANALYSIS_CACHE by default) by
+       grid contents and model id, so an identical grid is analyzed once.
+       Fallbacks after a failed request are not cached.
 
     Env vars supported:
       - WOODWIDE_API_KEY   (preferred)
       - WOODWIDE           (back-compat if you already used this)
       - WOODWIDE_MODEL_ID  (required for inference-only)
       - WOODWIDE_BASE_URL  (optional)
+      - WOODWIDE_CACHE_DIR (optional, keeps cached results on disk)
     """
-    import csv
-    import os
-    import tempfile
-    import time
-    import requests
-
-    if api_key is None:
-        api_key = os.environ.get("WOODWIDE")
-
-    if model_id is None:
-        model_id = os.environ.get("WOODWIDE_MODEL_ID")
-
-    if base_url is None:
-        base_url = os.environ.get("WOODWIDE_BASE_URL", "https://beta.woodwide.ai")
+    api_key, model_id, base_url = _woodwide_settings(api_key, model_id, base_url)
+    if cache is None:
+        cache = ANALYSIS_CACHE
 
-    # --- gather valid points ---
-    rows, cols = avg_congestion.shape
-    valid_points = []
-    for r in range(rows):
-        for c in range(cols):
-            if avg_congestion[r, c] >= 0:
-                valid_points.append({"row": r, "col": c, "congestion": float(avg_congestion[r, c])})
+    # --- gather valid points, as (rows, cols, congestion) arrays ---
+    valid = avg_congestion >= 0
+    valid_points = cell_points(avg_congestion, valid)
+    num_points = len(valid_points[0])
 
-    if not valid_points:
+    if not num_points:
         print("⚠️ No valid congestion data points to analyze.")
         return None
 
+    remote = bool(api_key and model_id)
+    key = analysis_key(avg_congestion, model_id if remote else None, base_url)
+    cached = cache.get(key)
+    if cached is not None:
+        print(f"\n♻️ Reusing cached anomaly analysis for this congestion grid ({key[:12]})")
+        return cached
+
     # If missing creds/model, do NOT attempt training. Just fall back.
-    if not api_key or not model_id:
-        print("\n" + "=" * 60)
-        print("🌲 WOOD WIDE AI (INFERENCE ONLY)")
-        print("=" * 60)
-        if not api_key:
-            print("⚠️ Missing API key. Set WOODWIDE_API_KEY (or WOODWIDE).")
-        if not model_id:
-            print("⚠️ Missing model id. Set WOODWIDE_MODEL_ID to use inference-only mode.")
-        print("➡️ Falling back to local anomaly detection (no training performed).")
-        print("=" * 60)
-        return run_local_anomaly_detection(valid_points)
+    if not remote:
+        _print_missing_woodwide(api_key, model_id)
+        results = run_local_anomaly_detection(avg_congestion, valid)
+        cache.put(key, results)
+        return results
 
     print("\n" + "=" * 60)
     print("🌲 WOOD WIDE AI (INFERENCE ONLY — NO TRAINING)")
     print("=" * 60)
-    print(f"📊 Found {len(valid_points)} data points for inference")
+    print(f"📊 Found {num_points} data points for inference")
     print(f"🤖 Using existing model_id: {model_id}")
     print(f"🌐 Base URL: {base_url}")
 
-    # --- write inference CSV (only test/infer dataset) ---
-    infer_csv = tempfile.NamedTemporaryFile(mode="w", suffix=".csv", delete=False, newline="")
-    infer_csv_path = infer_csv.name
+    # Only the remote path needs requests (local-only runs never load it)
+    import requests
 
     try:
-        writer = csv.writer(infer_csv)
-        writer.writerow(["row", "col", "congestion"])
-        for point in valid_points:
-            writer.writerow([point["row"], point["col"], f"{point['congestion']:.4f}"])
-        infer_csv.close()
-
-        headers = {"accept": "application/json", "Authorization": f"Bearer {api_key}"}
-
-        timestamp = int(time.time())
-        infer_dataset_name = f"hospital_congestion_infer_{timestamp}"
-
-        print(f"\n[1/2] 📤 Uploading inference dataset to Wood Wide AI...")
-        with open(infer_csv_path, "rb") as f:
-            files = {"file": ("congestion_infer.csv", f, "text/csv")}
-            data = {"name": infer_dataset_name, "overwrite": "true"}
-            response = requests.post(f"{base_url}/api/datasets", headers=headers, files=files, data=data)
-
-        if response.status_code != 200:
-            print(f"❌ Error uploading inference dataset: {response.status_code}")
-            print(response.text)
+        results = _woodwide_infer(valid_points, api_key, model_id, base_url)
+        if results is None:
             print("➡️ Falling back to local anomaly detection (no training performed).")
-            return run_local_anomaly_detection(valid_points)
-
-        infer_dataset_id = response.json().get("id")
-        print(f"✅ Inference dataset uploaded. ID: {infer_dataset_id}")
-
-        print(f"\n[2/2] 🔍 Running inference...")
-        response = requests.post(
-            f"{base_url}/api/models/prediction/{model_id}/infer",
-            headers=headers,
-            params={"dataset_id": infer_dataset_id},
-        )
-
-        if response.status_code != 200:
-            print(f"❌ Error running inference: {response.status_code}")
-            print(response.text)
-            print("➡️ Falling back to local anomaly detection (no training performed).")
-            return run_local_anomaly_detection(valid_points)
-
-        results = response.json()
+            return run_local_anomaly_detection(avg_congestion, valid)
 
         print("\n" + "-" * 60)
         print("📈 ANOMALY DETECTION RESULTS (Wood Wide AI — inference only)")
@@ -848,137 +565,239 @@ def analyze_congestion_with_woodwide(avg_congestion, api_key=None, model_id=None
         display_anomaly_results(results, valid_points)
         print("=" * 60)
 
+        cache.put(key, results)
         return results
 
     except requests.exceptions.RequestException as e:
         print(f"❌ Network error: {e}")
         print("➡️ Falling back to local anomaly detection (no training performed).")
-        return run_local_anomaly_detection(valid_points)
+        return run_local_anomaly_detection(avg_congestion, valid)
 
     except Exception as e:
         print(f"❌ Error during inference-only anomaly detection: {e}")
         import traceback
         traceback.print_exc()
         print("➡️ Falling back to local anomaly detection (no training performed).")
-        return run_local_anomaly_detection(valid_points)
+        return run_local_anomaly_detection(avg_congestion, valid)
 
-    finally:
+
+def analyze_congestion_in_background(avg_congestion, **kwargs):
+    """
+    Start analyze_congestion_with_woodwide on the woodwide background pool
+    and return its Future, so the caller can keep simulating while the
+    upload and inference are in flight. kwargs are passed through.
+    """
+    from woodwide import run_in_background
+
+    return run_in_background(analyze_congestion_with_woodwide, np.array(avg_congestion, dtype=float), **kwargs)
+
+
+def _split_predictions(results, sizes):
+    """
+    Split one inference response over len(sizes) consecutive blocks of
+    points into one response per block, each indexed from 0. Returns None
+    if the response shape is not one display_anomaly_results understands.
+    """
+    offsets = np.concatenate([[0], np.cumsum(sizes)]).tolist()
+    blocks = list(zip(offsets[:-1], offsets[1:]))
+
+    if isinstance(results, dict) and isinstance(results.get("prediction"), dict):
+        maps = {name: results[name] for name in ("prediction", "prediction_probs") if isinstance(results.get(name), dict)}
+        return [
+            {
+                name: {str(i - start): values[str(i)] for i in range(start, stop) if str(i) in values}
+                for name, values in maps.items()
+            }
+            for start, stop in blocks
+        ]
+
+    if isinstance(results, dict) and isinstance(results.get("predictions"), list):
+        return [{"predictions": results["predictions"][start:stop]} for start, stop in blocks]
+
+    if isinstance(results, list):
+        return [results[start:stop] for start, stop in blocks]
+
+    return None
+
+
+def analyze_congestion_batch(grids, api_key=None, model_id=None, base_url=None, cache=None):
+    """
+    Anomaly analysis of many congestion grids (e.g. the run_visual result of
+    every configuration of a sweep) with a single dataset upload and a
+    single inference call.
+
+    Grids already in cache, and repeats of the same grid, are not sent. The
+    points of the remaining grids are uploaded one grid after another and
+    the predictions split back per grid, so each result is the response
+    analyze_congestion_with_woodwide would give for that grid alone. Without
+    credentials, or if the request fails, each grid gets the local fallback.
+
+    Returns:
+        List of results in the order of grids (None for a grid with no points)
+    """
+    api_key, model_id, base_url = _woodwide_settings(api_key, model_id, base_url)
+    if cache is None:
+        cache = ANALYSIS_CACHE
+    grids = [np.asarray(grid, dtype=float) for grid in grids]
+    remote = bool(api_key and model_id)
+
+    keys = [analysis_key(grid, model_id if remote else None, base_url) for grid in grids]
+    results = {}
+    pending = {}  # key -> grid, in first-seen order
+    for key, grid in zip(keys, grids):
+        if key in results or key in pending:
+            continue
+        cached = cache.get(key)
+        if cached is not None:
+            results[key] = cached
+        elif not np.any(grid >= 0):
+            results[key] = None
+        else:
+            pending[key] = grid
+
+    print("\n" + "=" * 60)
+    print(f"🌲 BATCH ANOMALY ANALYSIS: {len(grids)} grids, {len(pending)} to analyze, "
+          f"{len(grids) - len(pending)} cached or repeated")
+    print("=" * 60)
+
+    if pending and remote:
+        import requests
+
+        points = [cell_points(grid, grid >= 0) for grid in pending.values()]
+        sizes = [len(p[0]) for p in points]
+        batch_points = tuple(np.concatenate(column) for column in zip(*points))
+        print(f"📊 Found {len(batch_points[0])} data points for inference")
+        print(f"🤖 Using existing model_id: {model_id}")
+        print(f"🌐 Base URL: {base_url}")
+        split = None
         try:
-            if os.path.exists(infer_csv_path):
-                os.remove(infer_csv_path)
-        except Exception:
-            pass
+            response = _woodwide_infer(batch_points, api_key, model_id, base_url, "hospital_congestion_batch")
+            if response is not None:
+                split = _split_predictions(response, sizes)
+                if split is None:
+                    print("⚠️ Unrecognized inference response; cannot split it per grid.")
+        except requests.exceptions.RequestException as e:
+            print(f"❌ Network error: {e}")
+        if split is not None:
+            for key, part in zip(pending, split):
+                cache.put(key, part)
+                results[key] = part
+            pending = {}
+        else:
+            print("➡️ Falling back to local anomaly detection (no training performed).")
+    elif pending:
+        _print_missing_woodwide(api_key, model_id)
 
+    for key, grid in pending.items():
+        results[key] = run_local_anomaly_detection(grid, grid >= 0)
+        if not remote:
+            cache.put(key, results[key])
 
-def run_local_anomaly_detection(valid_points):
-    """Local statistical anomaly detection (IQR) fallback."""
+    return [results[key] for key in keys]
+
+
+def run_local_anomaly_detection(avg_congestion, valid=None, top_n_points=10):
+    """
+    Local statistical anomaly detection (IQR) fallback over the cells in
+    valid (all cells by default).
+
+    The anomaly lists hold only the points printed: the top_n_points most
+    congested high anomalies, and the first dead zones and low-traffic
+    cells in row-major order. "counts" has the size of every class.
+    """
     print("\n" + "-" * 60)
     print("📈 LOCAL ANOMALY DETECTION RESULTS")
     print("-" * 60)
 
-    congestion_values = [p["congestion"] for p in valid_points]
-
-    mean_val = float(np.mean(congestion_values))
-    std_val = float(np.std(congestion_values))
-    median_val = float(np.median(congestion_values))
-    min_val = float(np.min(congestion_values))
-    max_val = float(np.max(congestion_values))
+    if valid is None:
+        valid = np.ones(avg_congestion.shape, dtype=bool)
+    congestion_values = avg_congestion[valid]
+    stats = iqr_statistics(congestion_values)
 
     print(f"\n📊 Congestion Statistics:")
-    print(f" Points analyzed: {len(valid_points)}")
-    print(f" Mean: {mean_val:.4f}")
-    print(f" Median: {median_val:.4f}")
-    print(f" Std Dev: {std_val:.4f}")
-    print(f" Min: {min_val:.4f}")
-    print(f" Max: {max_val:.4f}")
-
-    q1 = np.percentile(congestion_values, 25)
-    q3 = np.percentile(congestion_values, 75)
-    iqr = q3 - q1
-
-    lower_bound = q1 - 1.5 * iqr
-    upper_bound = q3 + 1.5 * iqr
-
-    high_anomalies = []
-    low_anomalies = []
-    dead_zones = []
-    normal_points = []
-
-    for point in valid_points:
-        congestion = point["congestion"]
-        if congestion > upper_bound:
-            high_anomalies.append(point)
-        elif congestion < lower_bound and congestion > 0.001:
-            low_anomalies.append(point)
-        elif congestion < 0.001:
-            dead_zones.append(point)
-        else:
-            normal_points.append(point)
+    print(f" Points analyzed: {congestion_values.size}")
+    print(f" Mean: {stats['mean']:.4f}")
+    print(f" Median: {stats['median']:.4f}")
+    print(f" Std Dev: {stats['std']:.4f}")
+    print(f" Min: {stats['min']:.4f}")
+    print(f" Max: {stats['max']:.4f}")
+
+    lower_bound = stats["lower_bound"]
+    upper_bound = stats["upper_bound"]
+
+    # Class masks over the whole grid (cells outside valid are in no class)
+    classes = {
+        name: mask & valid
+        for name, mask in classify(avg_congestion, lower_bound, upper_bound).items()
+    }
+    counts = {name: int(np.count_nonzero(mask)) for name, mask in classes.items()}
+    high_anomalies = point_dicts(avg_congestion, top_n(avg_congestion, classes["high_congestion"], top_n_points))
+    dead_zones = point_dicts(avg_congestion, np.flatnonzero(classes["dead_zones"])[:top_n_points])
+    low_anomalies = point_dicts(avg_congestion, np.flatnonzero(classes["low_traffic"])[:top_n_points])
 
     print(f"\n🔍 Anomaly Detection (IQR Method):")
     print(f" Lower bound: {lower_bound:.4f}")
     print(f" Upper bound: {upper_bound:.4f}")
 
     if high_anomalies:
-        print(f"\n🔴 HIGH CONGESTION ANOMALIES ({len(high_anomalies)} found):")
-        high_anomalies_sorted = sorted(high_anomalies, key=lambda x: x["congestion"], reverse=True)
-        for point in high_anomalies_sorted[:10]:
+        print(f"\n🔴 HIGH CONGESTION ANOMALIES ({counts['high_congestion']} found):")
+        for point in high_anomalies:
             print(f" → Grid ({point['row']}, {point['col']}): congestion = {point['congestion']:.4f}")
-        if len(high_anomalies) > 10:
-            print(f" ... and {len(high_anomalies) - 10} more")
+        if counts["high_congestion"] > top_n_points:
+            print(f" ... and {counts['high_congestion'] - top_n_points} more")
     else:
         print(f"\n✅ No high congestion anomalies detected")
 
     if dead_zones:
-        print(f"\n🟡 DEAD ZONES ({len(dead_zones)} found):")
-        for point in dead_zones[:10]:
+        print(f"\n🟡 DEAD ZONES ({counts['dead_zones']} found):")
+        for point in dead_zones:
             print(f" → Grid ({point['row']}, {point['col']}): congestion = {point['congestion']:.4f}")
-        if len(dead_zones) > 10:
-            print(f" ... and {len(dead_zones) - 10} more")
+        if counts["dead_zones"] > top_n_points:
+            print(f" ... and {counts['dead_zones'] - top_n_points} more")
     else:
         print(f"\n✅ No dead zones detected")
 
     if low_anomalies:
-        print(f"\n🟠 LOW CONGESTION ANOMALIES ({len(low_anomalies)} found):")
-        for point in low_anomalies[:10]:
+        print(f"\n🟠 LOW CONGESTION ANOMALIES ({counts['low_traffic']} found):")
+        for point in low_anomalies:
             print(f" → Grid ({point['row']}, {point['col']}): congestion = {point['congestion']:.4f}")
-        if len(low_anomalies) > 10:
-            print(f" ... and {len(low_anomalies) - 10} more")
+        if counts["low_traffic"] > top_n_points:
+            print(f" ... and {counts['low_traffic'] - top_n_points} more")
 
     print(f"\n📋 Summary:")
-    print(f" Normal points: {len(normal_points)}")
-    print(f" High congestion (bottlenecks): {len(high_anomalies)}")
-    print(f" Dead zones (unused): {len(dead_zones)}")
-    print(f" Low traffic anomalies: {len(low_anomalies)}")
+    print(f" Normal points: {counts['normal']}")
+    print(f" High congestion (bottlenecks): {counts['high_congestion']}")
+    print(f" Dead zones (unused): {counts['dead_zones']}")
+    print(f" Low traffic anomalies: {counts['low_traffic']}")
     print("=" * 60)
 
     return {
         "method": "local_iqr",
-        "statistics": {"mean": mean_val, "std": std_val, "median": median_val, "q1": float(q1), "q3": float(q3), "iqr": float(iqr)},
+        "statistics": {name: stats[name] for name in ("mean", "std", "median", "q1", "q3", "iqr")},
         "anomalies": {"high_congestion": high_anomalies, "dead_zones": dead_zones, "low_traffic": low_anomalies},
-        "normal": normal_points,
+        "counts": counts,
     }
 
 
-def generate_gemini_improvement_prompt(sim_state, avg_congestion, anomaly_results):
+def build_gemini_improvement_prompt(sim_state, avg_congestion, anomaly_results):
     """
-    Generate a text prompt for Gemini to suggest hospital setup improvements.
+    Build the text prompt for Gemini to suggest hospital setup improvements.
     Describes the hospital layout, spawn/waiting rooms, treatment rooms, and congestion anomalies.
 
-    Returns the prompt string (does NOT send to Gemini).
+    Returns the prompt string (does NOT print, compress or send it).
     """
-    hospital = sim_state["hospital"]
+    hospital = sim_state.hospital
     rows = len(hospital)
     cols = len(hospital[0])
 
     # Extract spawn and waiting room positions
-    spawn_point = sim_state.get("spawn_point", (0, 0))
-    waiting_room_pos = sim_state.get("waiting_room_pos", (0, 1))
+    spawn_point = getattr(sim_state, "spawn_point", (0, 0))
+    waiting_room_pos = getattr(sim_state, "waiting_room_pos", (0, 1))
 
     # Separate treatment rooms by severity
     low_severity_rooms = []
     high_severity_rooms = []
-    for pos, info in sim_state.get("treatment_rooms", {}).items():
+    for pos, info in getattr(sim_state, "treatment_rooms", {}).items():
         room_data = {"position": pos, "severity_type": info.get("severity_type", 0)}
         if info.get("severity_type", 0) == 0:
             low_severity_rooms.append(room_data)
@@ -986,8 +805,8 @@ def generate_gemini_improvement_prompt(sim_state, avg_congestion, anomaly_result
             high_severity_rooms.append(room_data)
 
     # Get nurse and doctor positions
-    nurses = sim_state.get("nurses", [])
-    doctors = sim_state.get("doctors", [])
+    nurses = getattr(sim_state, "nurses", [])
+    doctors = getattr(sim_state, "doctors", [])
     nurse_idle_positions = [n.idle_position for n in nurses]
     doctor_idle_positions = [d.idle_position for d in doctors]
 
@@ -1005,13 +824,7 @@ def generate_gemini_improvement_prompt(sim_state, avg_congestion, anomaly_result
 
     # If no anomalies found, get top congestion cells manually
     if not congested_points:
-        flat_congestion = []
-        for r in range(rows):
-            for c in range(cols):
-                if avg_congestion[r, c] > 0:
-                    flat_congestion.append({"row": r, "col": c, "congestion": float(avg_congestion[r, c])})
-        flat_congestion.sort(key=lambda x: x["congestion"], reverse=True)
-        congested_points = flat_congestion[:10]
+        congested_points = point_dicts(avg_congestion, top_n(avg_congestion, avg_congestion > 0, 10))
 
     # Build the prompt
     prompt_lines = [
@@ -1107,14 +920,45 @@ def generate_gemini_improvement_prompt(sim_state, avg_congestion, anomaly_result
         "=" * 70,
     ])
 
-    prompt_text = "\n".join(prompt_lines)
+    return "\n".join(prompt_lines)
 
-    tc = TokenClient(api_key=os.environ.get("TOKENC"))
- 
-    compressed = tc.compress_input(
-    input=prompt_text,
-    aggressiveness=0.8
-    )
+
+def compress_improvement_prompt(prompt_text, compressor=None):
+    """
+    Start compressing an improvement prompt in the background.
+
+    compressor defaults to compression.default_compressor() (PROMPT_COMPRESSOR).
+    Requests for the same prompt share the compressor's cache, so calling
+    this after generate_gemini_improvement_prompt picks up the compression
+    it already started instead of compressing again.
+
+    Returns:
+        Future of the compressed prompt (raises if compression failed), or
+        None when compression is off
+    """
+    if compressor is None:
+        from compression import default_compressor
+
+        compressor = default_compressor()
+    if compressor is None:
+        return None
+    return compressor.compress_async(prompt_text)
+
+
+def generate_gemini_improvement_prompt(sim_state, avg_congestion, anomaly_results, compressor=None):
+    """
+    Build and print the Gemini improvement prompt (see build_gemini_improvement_prompt).
+
+    Compression is opt-in: with a compression.PromptCompressor (or
+    PROMPT_COMPRESSOR set, see compression.default_compressor) the prompt is
+    compressed in the background and cached by its hash; a failure is
+    printed when it happens. Get the compressed prompt with
+    compress_improvement_prompt(prompt, compressor).result().
+
+    Returns the uncompressed prompt string (does NOT send to Gemini).
+    """
+    prompt_text = build_gemini_improvement_prompt(sim_state, avg_congestion, anomaly_results)
+    compress_improvement_prompt(prompt_text, compressor)
 
     # Print the prompt
     print("\n" + prompt_text)
@@ -1132,11 +976,18 @@ def display_anomaly_results(results, valid_points, grid_shape=None, *, only_cong
 
     Args:
         results: WoodWide response JSON
-        valid_points: list of {"row","col","congestion"} in the SAME ORDER as your test CSV rows
+        valid_points: (rows, cols, congestion) arrays in the SAME ORDER as your test CSV rows
         grid_shape: (rows, cols) to build a 2D grid. If None, we infer from max row/col in valid_points.
         only_congested: print only congested points
         top_n: show top N congested points by congestion
         show_grid: if True, print a 2D label grid (ASCII) for quick sanity check
+
+    Returns:
+        dict with label_grid and prob_grid (nested lists, rows x cols, None
+        where a cell is not in valid_points or has no probability),
+        congested_points (the top_n most congested, as dicts),
+        congested_count, category_counts and grid_shape; None if the
+        response could not be parsed.
     """
     import json
 
@@ -1177,80 +1028,80 @@ def display_anomaly_results(results, valid_points, grid_shape=None, *, only_cong
         print(json.dumps(results, indent=2))
         return
 
+    point_rows, point_cols, point_congestion = (np.asarray(a) for a in valid_points)
+    num_points = len(point_rows)
+
     # --- infer grid shape if not provided ---
     if grid_shape is None:
-        max_r = max(p["row"] for p in valid_points) if valid_points else 0
-        max_c = max(p["col"] for p in valid_points) if valid_points else 0
+        max_r = int(point_rows.max()) if num_points else 0
+        max_c = int(point_cols.max()) if num_points else 0
         grid_shape = (max_r + 1, max_c + 1)
 
     rows, cols = grid_shape
 
-    # --- build 2D label grid (None where not in valid_points) ---
-    label_grid = [[None for _ in range(cols)] for _ in range(rows)]
-    prob_grid = [[None for _ in range(cols)] for _ in range(rows)]
-
-    category_counts = {}
-    congested_points = []
-
     # IMPORTANT: valid_points order == CSV row order == prediction index order
-    for i in range(len(valid_points)):
-        key = str(i)
-        label = pred_map.get(key, "unknown")
-        prob = prob_map.get(key, None)
-
-        r = int(valid_points[i]["row"])
-        c = int(valid_points[i]["col"])
-        cong = float(valid_points[i]["congestion"])
-
-        if 0 <= r < rows and 0 <= c < cols:
-            label_grid[r][c] = label
-            prob_grid[r][c] = prob
-
-        category_counts[label] = category_counts.get(label, 0) + 1
-
-        if is_congested_label(label):
-            congested_points.append({
-                "row": r, "col": c, "congestion": cong, "label": label,
-                "prob": float(prob) if prob is not None else None
-            })
+    labels = np.array([pred_map.get(str(i), "unknown") for i in range(num_points)], dtype=object)
+    probs = np.array([prob_map.get(str(i)) for i in range(num_points)], dtype=object)
+    probs = np.where(probs == None, np.nan, probs).astype(float)  # noqa: E711 (elementwise)
+
+    # Label classes are checked once per distinct label, then broadcast
+    unique_labels, label_index = np.unique(labels.astype(str), return_inverse=True)
+    congested = np.array([is_congested_label(label) for label in unique_labels], dtype=bool)[label_index]
+    dead = np.array(["dead" in label.lower() for label in unique_labels], dtype=bool)[label_index]
+
+    # --- build 2D label grid (None / nan where not in valid_points) ---
+    label_grid = np.full(grid_shape, None, dtype=object)
+    prob_grid = np.full(grid_shape, np.nan)
+    inside = (point_rows >= 0) & (point_rows < rows) & (point_cols >= 0) & (point_cols < cols)
+    label_grid[point_rows[inside], point_cols[inside]] = labels[inside]
+    prob_grid[point_rows[inside], point_cols[inside]] = probs[inside]
+
+    # counts in first-seen order
+    _, first_seen, counts = np.unique(labels.astype(str), return_index=True, return_counts=True)
+    order = np.argsort(first_seen)
+    category_counts = {str(labels[first_seen[i]]): int(counts[i]) for i in order}
+
+    # Only the top_n congested points, most congested first, become dicts
+    congested_index = np.flatnonzero(congested)
+    congested_count = len(congested_index)
+    top = congested_index[np.lexsort((congested_index, -point_congestion[congested_index]))[:top_n]]
+    congested_points = [
+        {
+            "row": int(point_rows[i]), "col": int(point_cols[i]), "congestion": float(point_congestion[i]),
+            "label": labels[i], "prob": None if np.isnan(probs[i]) else float(probs[i]),
+        }
+        for i in top.tolist()
+    ]
 
     # --- output congested points ---
     if only_congested:
         if not congested_points:
             print("✅ No congested anomalies detected.")
         else:
-            congested_points.sort(key=lambda x: x["congestion"], reverse=True)
-
             print("\n" + "-" * 60)
             print("🔴 CONGESTED POINTS (2D COORDS ONLY)")
             print("-" * 60)
-            print(f"Found {len(congested_points)} congested points. Showing top {min(top_n, len(congested_points))}:\n")
+            print(f"Found {congested_count} congested points. Showing top {len(congested_points)}:\n")
 
-            for p in congested_points[:top_n]:
+            for p in congested_points:
                 prob_txt = f" | prob={p['prob']:.3f}" if p["prob"] is not None else ""
                 print(f" → Grid ({p['row']}, {p['col']}): congestion={p['congestion']:.4f} | label={p['label']}{prob_txt}")
 
-            if len(congested_points) > top_n:
-                print(f"\n ... and {len(congested_points) - top_n} more congested points")
+            if congested_count > top_n:
+                print(f"\n ... and {congested_count - top_n} more congested points")
 
     # --- optional: quick 2D grid visualization ---
     if show_grid:
-        # compact symbols
-        def sym(label):
-            if label is None:
-                return " "   # not in valid_points
-            s = label.lower()
-            if "dead" in s:
-                return "."
-            if is_congested_label(label):
-                return "X"
-            return "o"
+        # compact symbols: " " not in valid_points, "." dead, "X" congested, "o" other
+        symbols = np.full(grid_shape, " ", dtype="<U1")
+        point_symbols = np.where(dead, ".", np.where(congested, "X", "o"))
+        symbols[point_rows[inside], point_cols[inside]] = point_symbols[inside]
 
         print("\n" + "-" * 60)
         print("🧱 2D LABEL GRID (X=congested, o=normal, .=dead/near-zero)")
         print("-" * 60)
         for r in range(rows):
-            print("".join(sym(label_grid[r][c]) for c in range(cols)))
+            print("".join(symbols[r]))
 
     # tiny distribution summary (useful sanity check)
     if not only_congested:
@@ -1259,9 +1110,10 @@ def display_anomaly_results(results, valid_points, grid_shape=None, *, only_cong
             print(f" - {cat}: {count}")
 
     return {
-        "label_grid": label_grid,
-        "prob_grid": prob_grid,
+        "label_grid": label_grid.tolist(),
+        "prob_grid": np.where(np.isnan(prob_grid), None, prob_grid).tolist(),
         "congested_points": congested_points,
+        "congested_count": congested_count,
         "category_counts": category_counts,
         "grid_shape": grid_shape,
     }
@@ -0,0 +1,414 @@
+from array import array
+
+import numpy as np
+
+NURSE, DOCTOR, PATIENT = 0, 1, 2
+KIND_NAMES = ("nurse", "doctor", "patient")
+
+
+def detect_swaps(prev_positions, curr_positions):
+    """
+    Detect when two entities are swapping positions between adjacent squares.
+
+    Each one-square move is filed under its (from, to) edge, so the partner
+    of a move A -> B is a lookup of the edge (B, A). Swaps are reported in
+    curr_positions order, pairing each mover with the first partner not
+    already paired with it.
+    """
+    moves = []
+    edges = {}
+    for entity_id, curr_pos in curr_positions.items():
+        prev_pos = prev_positions.get(entity_id)
+        if prev_pos is None or prev_pos == curr_pos:
+            continue
+        # Check if positions are adjacent (manhattan distance = 1)
+        if abs(prev_pos[0] - curr_pos[0]) + abs(prev_pos[1] - curr_pos[1]) != 1:
+            continue
+        moves.append((entity_id, prev_pos, curr_pos))
+        edges.setdefault((prev_pos, curr_pos), []).append(entity_id)
+
+    swaps = []
+    checked_pairs = set()
+    for entity_id1, prev_pos1, curr_pos1 in moves:
+        # Entities going the other way along the same edge
+        for entity_id2 in edges.get((curr_pos1, prev_pos1), ()):
+            pair_key = (entity_id1, entity_id2) if entity_id1 < entity_id2 else (entity_id2, entity_id1)
+            if pair_key in checked_pairs:
+                continue
+            type1, id1 = entity_id1.split("_")
+            type2, id2 = entity_id2.split("_")
+            swaps.append((prev_pos1, curr_pos1, type1, int(id1), type2, int(id2)))
+            checked_pairs.add(pair_key)
+            break
+
+    return swaps
+
+
+class EntityNames(dict):
+    """(kind, id) -> entity id string such as "nurse_3", formatted once per entity."""
+    def __missing__(self, key):
+        name = self[key] = f"{KIND_NAMES[key[0]]}_{key[1]}"
+        return name
+
+
+class OccupancyIndex:
+    """
+    Incrementally maintained record of where the agents of a live
+    simulation are, for run_visual's per-tick accounting.
+
+    Agents are small integers: nurses, then doctors, then patients in order
+    of first appearance (as in TraceRecorder). prev_cell / curr_cell hold
+    each agent's flat cell (row * cols + col, -1 when not on the floor)
+    before and after the last update, and `cells` maps a flat cell to the
+    set of agents in it; only agents that moved, arrived or left are
+    touched on update. `present` lists the agents on the floor in capture
+    order (staff, then patients in task order).
+    """
+    def __init__(self, sim, capacity=256):
+        self.cols = len(sim.hospital[0])
+        self.kinds = [NURSE] * len(sim.nurses) + [DOCTOR] * len(sim.doctors)
+        self.ids = [nurse.id for nurse in sim.nurses] + [doctor.id for doctor in sim.doctors]
+        self.patient_agent = {}
+        self.names = EntityNames()
+        capacity = max(capacity, len(self.ids))
+        self.prev_cell = np.full(capacity, -1, dtype=np.int64)
+        self.curr_cell = np.full(capacity, -1, dtype=np.int64)
+        self.prev_present = np.empty(0, dtype=np.int64)
+        self.present = np.empty(0, dtype=np.int64)
+        self.cells = {}
+        self.update(sim)
+
+    def _agent(self, patient):
+        agent = self.patient_agent.get(patient.id)
+        if agent is None:
+            agent = self.patient_agent[patient.id] = len(self.ids)
+            self.kinds.append(PATIENT)
+            self.ids.append(patient.id)
+            if agent == len(self.curr_cell):
+                grow = np.full(len(self.curr_cell), -1, dtype=np.int64)
+                self.prev_cell = np.concatenate([self.prev_cell, grow])
+                self.curr_cell = np.concatenate([self.curr_cell, grow])
+        return agent
+
+    def update(self, sim):
+        """Record the positions after the tick just stepped."""
+        cols = self.cols
+        agents = list(range(len(sim.nurses) + len(sim.doctors)))
+        cells = [r * cols + c for r, c in (member.position for staff in (sim.nurses, sim.doctors) for member in staff)]
+        seen = set()
+        for task in sim.active_tasks:
+            patient = task.patient
+            if patient is None or patient.id in seen:
+                continue
+            seen.add(patient.id)
+            agents.append(self._agent(patient))
+            r, c = patient.position
+            cells.append(r * cols + c)
+
+        n = len(self.ids)
+        self.prev_cell[:n] = self.curr_cell[:n]
+        self.curr_cell[self.present] = -1
+        present = np.array(agents, dtype=np.int64)
+        self.curr_cell[present] = cells
+        self.prev_present, self.present = self.present, present
+
+        # Move only the agents whose cell changed in the cell -> agents map
+        touched = np.union1d(self.prev_present, present)
+        before, after = self.prev_cell[touched], self.curr_cell[touched]
+        changed = before != after
+        occupants = self.cells
+        for agent, old, new in zip(touched[changed].tolist(), before[changed].tolist(), after[changed].tolist()):
+            if old >= 0:
+                occupants[old].discard(agent)
+            if new >= 0:
+                occupants.setdefault(new, set()).add(agent)
+
+    def moved(self):
+        """(agents, from cells, to cells) of the present agents that were on the floor before and moved."""
+        present = self.present
+        before, after = self.prev_cell[present], self.curr_cell[present]
+        moved = (before >= 0) & (before != after)
+        return present[moved], before[moved], after[moved]
+
+    def congestion(self):
+        """
+        Flat cells entered or moved within this tick by at least one agent,
+        and the number of agents in each (the run_visual congestion sample).
+        """
+        _, _, after = self.moved()
+        cells = np.unique(after)
+        occupants = self.cells
+        return cells, np.array([len(occupants[cell]) for cell in cells.tolist()], dtype=np.int64)
+
+    def name(self, agent):
+        return self.names[(self.kinds[agent], self.ids[agent])]
+
+    def positions(self, before=False):
+        """{entity_id: (row, col)} of the agents on the floor after (or before) the last update."""
+        agents, cells = (self.prev_present, self.prev_cell) if before else (self.present, self.curr_cell)
+        cols = self.cols
+        return {self.name(agent): divmod(cell, cols) for agent, cell in zip(agents.tolist(), cells[agents].tolist())}
+
+    def swaps(self):
+        """detect_swaps(positions(before=True), positions()) from the integer index."""
+        agents, before, after = self.moved()
+        cols = self.cols
+        adjacent = np.abs(before // cols - after // cols) + np.abs(before % cols - after % cols) == 1
+        moves = list(zip(agents[adjacent].tolist(), before[adjacent].tolist(), after[adjacent].tolist()))
+        edges = {}
+        for agent, old, new in moves:
+            edges.setdefault((old, new), []).append(agent)
+
+        swaps = []
+        checked_pairs = set()
+        for agent1, old, new in moves:
+            for agent2 in edges.get((new, old), ()):
+                pair_key = (agent1, agent2) if agent1 < agent2 else (agent2, agent1)
+                if pair_key in checked_pairs:
+                    continue
+                swaps.append((
+                    divmod(old, cols), divmod(new, cols),
+                    KIND_NAMES[self.kinds[agent1]], self.ids[agent1],
+                    KIND_NAMES[self.kinds[agent2]], self.ids[agent2],
+                ))
+                checked_pairs.add(pair_key)
+                break
+        return swaps
+
+
+class TraceRecorder:
+    """
+    Records the positions of every nurse, doctor and in-task patient after
+    each tick, plus the tick stats, for replay without re-simulating.
+
+    Entities get a fixed index when first seen (nurses, then doctors, then
+    patients in order of appearance). Each tick stores only the entities
+    whose cell changed, as (entity, row, col) with row = -1 when a patient
+    leaves; the full state is also kept every keyframe_every ticks so that
+    any tick can be reconstructed quickly. Call finish() for the Trace.
+    """
+    def __init__(self, sim, keyframe_every=256):
+        self.hospital = np.array(sim.hospital, dtype=np.int8)
+        self.rooms = np.array(
+            [(r, c, info["severity_type"]) for (r, c), info in sim.treatment_rooms.items()], dtype=np.int16
+        ).reshape(-1, 3)
+        self.keyframe_every = keyframe_every
+
+        self.kinds = array('b')
+        self.ids = array('i')
+        self.severity = array('b')
+        self.current = []  # entity -> (row, col), or None when not present
+        self.patient_entity = {}
+        for nurse in sim.nurses:
+            self._add_entity(NURSE, nurse.id, 0, nurse.position)
+        for doctor in sim.doctors:
+            self._add_entity(DOCTOR, doctor.id, 0, doctor.position)
+        self.totals = (len(sim.nurses), len(sim.doctors))
+        self.present_patients = set()
+        self._record_patients(sim, None)
+
+        self.ticks = array('i')
+        self.offsets = array('q', [0])
+        self.change_entity = array('i')
+        self.change_row = array('h')
+        self.change_col = array('h')
+        self.stats = array('i')
+        self.keyframes = [list(self.current)]
+
+    def _add_entity(self, kind, id, severity, position):
+        self.kinds.append(kind)
+        self.ids.append(id)
+        self.severity.append(severity)
+        self.current.append(position)
+        return len(self.current) - 1
+
+    def _change(self, entity, position):
+        self.current[entity] = position
+        self.change_entity.append(entity)
+        if position is None:
+            self.change_row.append(-1)
+            self.change_col.append(-1)
+        else:
+            self.change_row.append(position[0])
+            self.change_col.append(position[1])
+
+    def _record_patients(self, sim, change):
+        present = set()
+        for task in sim.active_tasks:
+            patient = task.patient
+            if patient is None:
+                continue
+            entity = self.patient_entity.get(patient.id)
+            if entity is None:
+                entity = self._add_entity(PATIENT, patient.id, patient.severity, None)
+                self.patient_entity[patient.id] = entity
+            present.add(entity)
+            if self.current[entity] != patient.position:
+                if change is None:
+                    self.current[entity] = patient.position
+                else:
+                    change(entity, patient.position)
+        if change is not None:
+            for entity in self.present_patients - present:
+                change(entity, None)
+        self.present_patients = present
+
+    def record(self, sim):
+        """Append the state after sim.tick (call once per stepped tick)."""
+        if self.ticks and len(self.ticks) % self.keyframe_every == 0:
+            self.keyframes.append(list(self.current))
+        self.ticks.append(sim.tick)
+
+        current = self.current
+        change = self._change
+        entity = 0
+        for staff in (sim.nurses, sim.doctors):
+            for member in staff:
+                if current[entity] != member.position:
+                    change(entity, member.position)
+                entity += 1
+        self._record_patients(sim, change)
+        self.offsets.append(len(self.change_entity))
+
+        stats = sim.stats()
+        self.stats.extend((stats["active_patients"], stats["waiting"], stats["nurses_busy"], stats["doctors_busy"]))
+
+    def finish(self):
+        n_entities = len(self.current)
+        keyframes = np.full((len(self.keyframes), n_entities, 2), -1, dtype=np.int16)
+        for k, state in enumerate(self.keyframes):
+            for entity, position in enumerate(state):
+                if position is not None:
+                    keyframes[k, entity] = position
+        return Trace(
+            hospital=self.hospital,
+            rooms=self.rooms,
+            kinds=np.frombuffer(self.kinds, dtype=np.int8).copy(),
+            ids=np.frombuffer(self.ids, dtype=np.int32).copy(),
+            severity=np.frombuffer(self.severity, dtype=np.int8).copy(),
+            ticks=np.frombuffer(self.ticks, dtype=np.int32).copy(),
+            offsets=np.frombuffer(self.offsets, dtype=np.int64).copy(),
+            change_entity=np.frombuffer(self.change_entity, dtype=np.int32).copy(),
+            change_row=np.frombuffer(self.change_row, dtype=np.int16).copy(),
+            change_col=np.frombuffer(self.change_col, dtype=np.int16).copy(),
+            stats=np.frombuffer(self.stats, dtype=np.int32).reshape(-1, 4).copy(),
+            totals=np.array(self.totals, dtype=np.int32),
+            keyframes=keyframes,
+            keyframe_every=np.int64(self.keyframe_every),
+        )
+
+
+class Trace:
+    """
+    Recorded run: per-tick position deltas (CSR style: the changes of trace
+    index i are change_*[offsets[i]:offsets[i + 1]]), per-tick stats and
+    keyframes of the full state before every keyframe_every-th index.
+    Positions are (row, col) with -1 for an entity not on the floor.
+    """
+    FIELDS = (
+        "hospital", "rooms", "kinds", "ids", "severity", "ticks", "offsets",
+        "change_entity", "change_row", "change_col", "stats", "totals",
+        "keyframes", "keyframe_every",
+    )
+
+    def __init__(self, **arrays):
+        for name in self.FIELDS:
+            setattr(self, name, arrays[name])
+        self.keyframe_every = int(self.keyframe_every)
+        self.names = [f"{KIND_NAMES[k]}_{i}" for k, i in zip(self.kinds.tolist(), self.ids.tolist())]
+
+    def __len__(self):
+        return len(self.ticks)
+
+    def save(self, path):
+        np.savez_compressed(path, **{name: getattr(self, name) for name in self.FIELDS})
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(**{name: data[name] for name in cls.FIELDS})
+
+    def index_of(self, tick):
+        """Trace index of a recorded tick."""
+        i = int(np.searchsorted(self.ticks, tick))
+        if i == len(self.ticks) or self.ticks[i] != tick:
+            raise KeyError(f"tick {tick} was not recorded")
+        return i
+
+    def treatment_rooms(self):
+        return {(int(r), int(c)): {"severity_type": int(t), "occupancy": 0} for r, c, t in self.rooms}
+
+    def _apply(self, state, start, stop):
+        """Apply the changes of trace indexes [start, stop) to state in place."""
+        a, b = self.offsets[start], self.offsets[stop]
+        if a == b:
+            return
+        entities = self.change_entity[a:b]
+        # Keep only the last change of each entity
+        _, last = np.unique(entities[::-1], return_index=True)
+        last = len(entities) - 1 - last
+        state[entities[last], 0] = self.change_row[a:b][last]
+        state[entities[last], 1] = self.change_col[a:b][last]
+
+    def state_at(self, i):
+        """(n_entities, 2) positions after trace index i (i = -1: before the first tick)."""
+        k = min((i + 1) // self.keyframe_every, len(self.keyframes) - 1)
+        state = self.keyframes[k].copy()
+        self._apply(state, k * self.keyframe_every, i + 1)
+        return state
+
+    def positions(self, state):
+        """{entity_id: (row, col)} for the entities on the floor, as run_visual captures them."""
+        names = self.names
+        present = np.nonzero(state[:, 0] >= 0)[0]
+        return {names[e]: (int(state[e, 0]), int(state[e, 1])) for e in present.tolist()}
+
+    def stats_at(self, i):
+        active_patients, waiting, nurses_busy, doctors_busy = self.stats[i].tolist()
+        nurses_total, doctors_total = self.totals.tolist()
+        return {
+            "active_patients": active_patients,
+            "waiting": waiting,
+            "nurses_busy": nurses_busy,
+            "nurses_total": nurses_total,
+            "doctors_busy": doctors_busy,
+            "doctors_total": doctors_total,
+        }
+
+    def frames(self, start=None, stop=None, step=1, num_interp_frames=5):
+        """
+        HospitalVisualizer.update frames for the recorded ticks in
+        [start, stop) (whole trace by default), every `step`-th tick, each
+        interpolated from the tick `step` indexes earlier.
+        """
+        first = 0 if start is None else self.index_of(start)
+        last = len(self.ticks) if stop is None else int(np.searchsorted(self.ticks, stop))
+        severe = {
+            self.names[e]: bool(self.severity[e] >= 4)
+            for e in np.nonzero(self.kinds == PATIENT)[0].tolist()
+        }
+        # Like every later frame, the first one moves from the tick `step` indexes back
+        before = max(first - step, -1)
+        state = self.state_at(before)
+        prev_positions = self.positions(state)
+        applied = before + 1
+        for i in range(first, last, step):
+            self._apply(state, applied, i + 1)
+            applied = i + 1
+            curr_positions = self.positions(state)
+            swaps = detect_swaps(prev_positions, curr_positions)
+            stats = self.stats_at(i)
+            # Like a live run, only patients still in a task are drawn
+            patient_high = {name: severe[name] for name in curr_positions if name in severe}
+            for frame in range(num_interp_frames):
+                yield {
+                    "tick": int(self.ticks[i]),
+                    "active_tasks": (),
+                    "patient_high": patient_high,
+                    "stats": stats,
+                    "prev_positions": prev_positions,
+                    "curr_positions": curr_positions,
+                    "interp_t": frame / num_interp_frames,
+                    "swaps": swaps,
+                }
+            prev_positions = curr_positions
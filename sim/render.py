@@ -0,0 +1,318 @@
+"""
+Headless rendering of HospitalVisualizer frames to a video, a GIF or a PNG
+sequence.
+
+Frames are drawn on an Agg canvas, so nothing here needs a display. The
+static parts of the figure are drawn once and each frame only redraws the
+visualizer's animated artists, as the blitted on-screen animation does.
+
+For long runs, record a trace with run_sim(..., trace=TraceRecorder(sim))
+and render it with export_trace, which splits PNG output across processes.
+start_renderer draws a live run in its own process from a ring.TickRing.
+
+pyplot (and visualizer, which uses it) is imported inside the functions,
+so worker processes select the Agg backend before pyplot loads.
+"""
+import multiprocessing
+import os
+import shutil
+import subprocess
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import matplotlib
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from PIL import Image
+
+from recording import PATIENT, EntityNames, detect_swaps
+from ring import TickRing
+
+FRAME_NAME = "frame_{:06d}.png"
+
+# Per-worker state set once by _init_worker: the trace and render settings
+_worker = {}
+
+
+def render_frames(viz, frames, dpi=100):
+    """
+    Draw each HospitalVisualizer.update frame and yield it as an (H, W, 4)
+    uint8 RGBA array. The array is a view of the canvas and is only valid
+    until the next frame is drawn.
+    """
+    import matplotlib.pyplot as plt
+
+    fig = viz.fig
+    plt.close(fig)  # keep the figure off pyplot and any GUI window
+    fig.set_dpi(dpi)
+    canvas = FigureCanvasAgg(fig)
+    fig.tight_layout()
+    for artist in viz.init_frame():
+        artist.set_animated(True)
+    canvas.draw()
+    background = canvas.copy_from_bbox(fig.bbox)
+    for frame in frames:
+        artists = viz.update(frame)
+        canvas.restore_region(background)
+        for artist in artists:
+            fig.draw_artist(artist)
+        yield np.asarray(canvas.buffer_rgba())
+
+
+def save_video(viz, frames, path, fps=30, dpi=100):
+    """
+    Render frames to a video file: .gif through Pillow, anything else
+    (.mp4, .mkv, ...) through ffmpeg. GIF frames are held in memory until
+    the file is written, so keep GIFs to short windows.
+
+    Returns:
+        Number of frames written
+    """
+    images = render_frames(viz, frames, dpi)
+    if path.lower().endswith(".gif"):
+        return _save_gif(images, path, fps)
+    return _save_ffmpeg(images, path, fps)
+
+
+def _save_gif(images, path, fps):
+    palette_frames = [Image.fromarray(image).convert("RGB").quantize() for image in images]
+    if not palette_frames:
+        return 0
+    palette_frames[0].save(
+        path, save_all=True, append_images=palette_frames[1:], duration=1000 / fps, loop=0
+    )
+    return len(palette_frames)
+
+
+def _save_ffmpeg(images, path, fps):
+    ffmpeg = shutil.which(matplotlib.rcParams["animation.ffmpeg_path"])
+    if ffmpeg is None:
+        raise RuntimeError("ffmpeg not found (set matplotlib's animation.ffmpeg_path), or write a .gif or PNG frames")
+    proc = None
+    count = 0
+    try:
+        for image in images:
+            if proc is None:
+                height, width = image.shape[:2]
+                proc = subprocess.Popen(
+                    [
+                        ffmpeg, "-y", "-loglevel", "error",
+                        "-f", "rawvideo", "-pix_fmt", "rgba", "-s", f"{width}x{height}", "-r", str(fps), "-i", "-",
+                        # yuv420p needs even dimensions
+                        "-vf", "pad=ceil(iw/2)*2:ceil(ih/2)*2",
+                        "-vcodec", "libx264", "-pix_fmt", "yuv420p",
+                        path,
+                    ],
+                    stdin=subprocess.PIPE,
+                )
+            proc.stdin.write(image.tobytes())
+            count += 1
+    finally:
+        if proc is not None:
+            proc.stdin.close()
+            proc.wait()
+    if proc is not None and proc.returncode != 0:
+        raise RuntimeError(f"ffmpeg exited with status {proc.returncode}")
+    return count
+
+
+def save_png_sequence(viz, frames, out_dir, dpi=100, first_index=0):
+    """
+    Render frames to out_dir/frame_000000.png, ... numbered from first_index.
+
+    Returns:
+        Number of frames written
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    count = 0
+    for n, image in enumerate(render_frames(viz, frames, dpi), start=first_index):
+        # Fast zlib level: encoding dominates the per-frame cost otherwise
+        Image.fromarray(image).save(os.path.join(out_dir, FRAME_NAME.format(n)), compress_level=1)
+        count += 1
+    return count
+
+
+def _init_worker(trace, out_dir, dpi, num_interp_frames):
+    matplotlib.use("Agg")
+    _worker["trace"] = trace
+    _worker["out_dir"] = out_dir
+    _worker["dpi"] = dpi
+    _worker["num_interp_frames"] = num_interp_frames
+
+
+def _render_chunk(first, last, step, first_index):
+    """Render trace indexes first, first + step, ... below last to PNGs numbered from first_index."""
+    from visualizer import HospitalVisualizer
+
+    trace = _worker["trace"]
+    num_interp_frames = _worker["num_interp_frames"]
+    viz = HospitalVisualizer.from_trace(trace, num_interp_frames=num_interp_frames)
+    start = int(trace.ticks[first])
+    stop = int(trace.ticks[last]) if last < len(trace) else None
+    frames = trace.frames(start, stop, step=step, num_interp_frames=num_interp_frames)
+    return save_png_sequence(viz, frames, _worker["out_dir"], _worker["dpi"], first_index)
+
+
+def export_trace(
+    trace,
+    out_path,
+    fps=30,
+    dpi=100,
+    num_interp_frames=5,
+    start=None,
+    stop=None,
+    step=1,
+    workers=None,
+    chunk_ticks=250,
+):
+    """
+    Render a recording.Trace offline, optionally only the ticks in [start, stop).
+
+    An out_path with an extension is written as one video file (see
+    save_video). Without one it is a directory of numbered PNG frames,
+    rendered in chunks of chunk_ticks ticks across a process pool. Each
+    chunk rebuilds its starting state from the trace, so the frames are the
+    same as a sequential render.
+
+    Returns:
+        Number of frames written
+    """
+    if os.path.splitext(out_path)[1]:
+        from visualizer import HospitalVisualizer
+
+        viz = HospitalVisualizer.from_trace(trace, num_interp_frames=num_interp_frames)
+        frames = trace.frames(start, stop, step=step, num_interp_frames=num_interp_frames)
+        return save_video(viz, frames, out_path, fps=fps, dpi=dpi)
+
+    first = 0 if start is None else trace.index_of(start)
+    last = len(trace) if stop is None else int(np.searchsorted(trace.ticks, stop))
+    indexes = range(first, last, step)
+    chunks = []
+    for k in range(0, len(indexes), chunk_ticks):
+        chunk_last = indexes[k + chunk_ticks] if k + chunk_ticks < len(indexes) else last
+        chunks.append((indexes[k], chunk_last, step, k * num_interp_frames))
+
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_worker, initargs=(trace, out_path, dpi, num_interp_frames)
+    ) as pool:
+        return sum(pool.map(_render_chunk, *zip(*chunks))) if chunks else 0
+
+
+def ring_frames(ring, totals, num_interp_frames=5, wait=0.01, idle=False):
+    """
+    HospitalVisualizer.update frames for the ticks of a TickRing as they
+    arrive. The first tick read is the starting state and only sets the
+    positions the next one moves from.
+
+    When no new tick is available this sleeps `wait` seconds, or yields None
+    if idle is set (so an animation keeps polling without blocking). It
+    ends once the producer has finished and every tick still held was read.
+    """
+    names = EntityNames()
+    nurses_total, doctors_total = totals
+    prev_positions = None
+    while True:
+        snapshot = ring.read()
+        if snapshot is None:
+            if ring.done:
+                return
+            if idle:
+                yield None
+            else:
+                time.sleep(wait)
+            continue
+
+        tick, stats, kinds, ids, rows, cols, high = snapshot
+        curr_positions = {}
+        patient_high = {}
+        for kind, id, r, c, severe in zip(kinds.tolist(), ids.tolist(), rows.tolist(), cols.tolist(), high.tolist()):
+            name = names[(kind, id)]
+            curr_positions[name] = (r, c)
+            if kind == PATIENT:
+                patient_high[name] = bool(severe)
+        if prev_positions is None:
+            prev_positions = curr_positions
+            continue
+
+        active_patients, waiting, nurses_busy, doctors_busy = stats.tolist()
+        stats = {
+            "active_patients": active_patients,
+            "waiting": waiting,
+            "nurses_busy": nurses_busy,
+            "nurses_total": nurses_total,
+            "doctors_busy": doctors_busy,
+            "doctors_total": doctors_total,
+        }
+        swaps = detect_swaps(prev_positions, curr_positions)
+        for frame in range(num_interp_frames):
+            yield {
+                "tick": tick,
+                "active_tasks": (),
+                "patient_high": patient_high,
+                "stats": stats,
+                "prev_positions": prev_positions,
+                "curr_positions": curr_positions,
+                "interp_t": frame / num_interp_frames,
+                "swaps": swaps,
+            }
+        prev_positions = curr_positions
+
+
+def _render_process(ring_spec, hospital, treatment_rooms, totals, num_interp_frames, interval, out_path, fps, dpi):
+    if out_path is not None:
+        matplotlib.use("Agg")
+    from visualizer import HospitalVisualizer
+
+    ring = TickRing.attach(*ring_spec)
+    try:
+        viz = HospitalVisualizer(hospital, [], [], treatment_rooms, num_interp_frames=num_interp_frames)
+        if out_path is None:
+            from matplotlib.animation import FuncAnimation
+
+            def draw(frame):
+                return viz.animated_artists() if frame is None else viz.update(frame)
+
+            _anim = FuncAnimation(
+                viz.fig,
+                draw,
+                frames=ring_frames(ring, totals, num_interp_frames, idle=True),
+                init_func=viz.init_frame,
+                interval=interval,
+                blit=True,
+                repeat=False,
+                cache_frame_data=False,
+            )
+            viz.show()
+        else:
+            frames = ring_frames(ring, totals, num_interp_frames)
+            if os.path.splitext(out_path)[1]:
+                save_video(viz, frames, out_path, fps=fps, dpi=dpi)
+            else:
+                save_png_sequence(viz, frames, out_path, dpi=dpi)
+    finally:
+        ring.close()
+
+
+def start_renderer(ring, sim, num_interp_frames=5, interval=100, out_path=None, fps=30, dpi=100):
+    """
+    Start a process that draws the ticks sim publishes to ring, in a window
+    at `interval` ms per frame or, with out_path, headless as in
+    save_video / save_png_sequence. Only the layout is sent once; ticks go
+    through the shared ring. Join the returned process when done.
+    """
+    process = multiprocessing.Process(
+        target=_render_process,
+        args=(
+            ring.spec(),
+            sim.hospital,
+            sim.treatment_rooms,
+            (len(sim.nurses), len(sim.doctors)),
+            num_interp_frames,
+            interval,
+            out_path,
+            fps,
+            dpi,
+        ),
+    )
+    process.start()
+    return process
@@ -0,0 +1,181 @@
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from recording import DOCTOR, NURSE, PATIENT
+
+# Header: ticks published, producer finished, ticks consumed by the
+# reader, ticks the reader skipped
+_HEADER = 4
+
+
+class TickRing:
+    """
+    Lock-free single-producer ring of per-tick agent snapshots in shared
+    memory, for drawing a run in another process.
+
+    Each of the `slots` slots holds one tick: its number, the four tick
+    stats and up to `max_agents` agents as (kind, id, row, col, high)
+    columns. By default the producer never waits: once the ring is full it
+    overwrites the oldest tick, and a reader that falls that far behind
+    skips ahead, counting the ticks it missed in `skipped`. A producer that
+    must not lose ticks (file output) calls wait_for_slot() before each
+    write. Every slot carries a sequence number that is odd while the slot
+    is being written, so a reader can tell a torn or overwritten copy and
+    drop it.
+    """
+    def __init__(self, shm, slots, max_agents, owner):
+        self.shm = shm
+        self.slots = slots
+        self.max_agents = max_agents
+        self.owner = owner
+        self.next_read = 0
+        self.truncated = False
+
+        buf = shm.buf
+        offset = 0
+
+        def view(dtype, shape):
+            nonlocal offset
+            array = np.ndarray(shape, dtype=dtype, buffer=buf, offset=offset)
+            offset += array.nbytes
+            return array
+
+        self.header = view(np.int64, _HEADER)
+        self.seq = view(np.int64, slots)
+        self.tick = view(np.int32, slots)
+        self.count = view(np.int32, slots)
+        self.stats = view(np.int32, (slots, 4))
+        self.ids = view(np.int32, (slots, max_agents))
+        self.rows = view(np.int16, (slots, max_agents))
+        self.cols = view(np.int16, (slots, max_agents))
+        self.kinds = view(np.int8, (slots, max_agents))
+        self.high = view(np.int8, (slots, max_agents))
+
+    @staticmethod
+    def nbytes(slots, max_agents):
+        return 8 * _HEADER + slots * (8 + 4 + 4 + 16 + max_agents * (4 + 2 + 2 + 1 + 1))
+
+    @classmethod
+    def create(cls, slots=256, max_agents=4096):
+        shm = shared_memory.SharedMemory(create=True, size=cls.nbytes(slots, max_agents))
+        ring = cls(shm, slots, max_agents, owner=True)
+        ring.header[:] = 0
+        ring.seq[:] = 0
+        return ring
+
+    @classmethod
+    def attach(cls, name, slots, max_agents):
+        return cls(shared_memory.SharedMemory(name=name), slots, max_agents, owner=False)
+
+    def spec(self):
+        """Arguments for attach() in another process."""
+        return self.shm.name, self.slots, self.max_agents
+
+    # Producer side
+
+    def write(self, sim):
+        """Publish the agents of sim after sim.tick (a live run_visual snapshot)."""
+        n = int(self.header[0])
+        s = n % self.slots
+        self.seq[s] = 2 * n + 1
+        ids, rows, cols, kinds, high = self.ids[s], self.rows[s], self.cols[s], self.kinds[s], self.high[s]
+        i = 0
+        limit = self.max_agents
+        for kind, staff in ((NURSE, sim.nurses), (DOCTOR, sim.doctors)):
+            for member in staff:
+                if i == limit:
+                    self.truncated = True
+                    break
+                kinds[i] = kind
+                ids[i] = member.id
+                rows[i], cols[i] = member.position
+                high[i] = 0
+                i += 1
+        for task in sim.active_tasks:
+            patient = task.patient
+            if patient is None:
+                continue
+            if i == limit:
+                self.truncated = True
+                break
+            kinds[i] = PATIENT
+            ids[i] = patient.id
+            rows[i], cols[i] = patient.position
+            high[i] = patient.severity >= 4
+            i += 1
+        stats = sim.stats()
+        self.stats[s] = (stats["active_patients"], stats["waiting"], stats["nurses_busy"], stats["doctors_busy"])
+        self.tick[s] = sim.tick
+        self.count[s] = i
+        self.seq[s] = 2 * n + 2
+        self.header[0] = n + 1
+
+    def wait_for_slot(self, alive=None, poll=0.001):
+        """
+        Block until the next write() would not overwrite a tick the reader
+        has yet to consume. Returns False, without waiting further, once
+        alive() (e.g. the renderer process's is_alive) turns false.
+        """
+        while int(self.header[0]) - int(self.header[2]) >= self.slots:
+            if alive is not None and not alive():
+                return False
+            time.sleep(poll)
+        return True
+
+    def finish(self):
+        """Mark the run complete; readers stop once they have caught up."""
+        self.header[1] = 1
+
+    @property
+    def skipped(self):
+        """Ticks the reader dropped because the producer overwrote them first."""
+        return int(self.header[3])
+
+    # Reader side
+
+    @property
+    def done(self):
+        return bool(self.header[1]) and self.next_read >= self.header[0]
+
+    def read(self):
+        """
+        Copy out the next unread tick as (tick, stats, kinds, ids, rows,
+        cols, high), or None if the producer has not published one yet.
+        """
+        while True:
+            written = int(self.header[0])
+            if self.next_read >= written:
+                return None
+            if self.next_read < written - self.slots:
+                # Lapped by the producer: skip to the oldest tick still held
+                self.header[3] += written - self.slots - self.next_read
+                self.next_read = written - self.slots
+            n = self.next_read
+            s = n % self.slots
+            if self.seq[s] == 2 * n + 2:
+                count = int(self.count[s])
+                snapshot = (
+                    int(self.tick[s]),
+                    self.stats[s].copy(),
+                    self.kinds[s, :count].copy(),
+                    self.ids[s, :count].copy(),
+                    self.rows[s, :count].copy(),
+                    self.cols[s, :count].copy(),
+                    self.high[s, :count].copy(),
+                )
+                if self.seq[s] == 2 * n + 2:
+                    self.next_read = self.header[2] = n + 1
+                    return snapshot
+            # Overwritten while reading; retry from the oldest tick still held
+            self.header[3] += 1
+            self.next_read = self.header[2] = n + 1
+
+    def close(self):
+        # Drop the numpy views before closing the mapping
+        for name in ("header", "seq", "tick", "count", "stats", "ids", "rows", "cols", "kinds", "high"):
+            setattr(self, name, None)
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
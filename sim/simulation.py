@@ -0,0 +1,323 @@
+import heapq
+import random
+
+from engine import IdAllocator, Patient, Nurse, Doctor, RouteTable, FreeList, RandomPool, layout_version
+from dispatch import greedy_dispatch
+from eventlog import console_log
+from tasks import Task, TaskList, TO_WAITING_ROOM, WAITING_FOR_DOCTOR, run_stages, next_task_event, fast_forward
+
+
+def mark_rooms(hospital, treatment_rooms_config):
+    """Copy of the hospital grid with treatment rooms marked as 4 (low) or 5 (high severity)."""
+    hospital = [row[:] for row in hospital]  # Deep copy
+    for pos, info in treatment_rooms_config.items():
+        r, c = pos
+        if info["severity_type"] == 0:
+            hospital[r][c] = 4  # Low severity treatment room
+        else:
+            hospital[r][c] = 5  # High severity treatment room
+    return hospital
+
+
+def route_targets(spawn_point, waiting_room_pos, room_positions, staff_positions):
+    """Cells every simulation route ends at, in RouteTable target order."""
+    targets = [waiting_room_pos, spawn_point]
+    targets += list(room_positions)
+    targets += list(staff_positions)
+    return targets
+
+
+class Simulation:
+    """
+    All state of one simulation run, with the per-tick operations as methods.
+
+    Everything lives in plain attributes (no closures), so a simulation can be
+    pickled mid-run to checkpoint it or to hand it to another process. The
+    dispatch policy must then be picklable too (a module-level function or an
+    instance such as dispatch.OptimalDispatch).
+
+    Args:
+        hospital: 2D array representing hospital layout
+                  -2: Wall (impassable)
+                  -1: Spawn point
+                   0: Free space (walkable)
+                   1: Waiting room
+                  Treatment rooms are automatically marked based on treatment_rooms_config
+        nurse_positions: List of (row, col) tuples for nurse idle positions
+        doctor_positions: List of (row, col) tuples for doctor idle positions
+        treatment_rooms_config: Dict mapping (row, col) to {'severity_type': 0 or 1, 'occupancy': 0}
+                               severity_type 0 = low severity (will be marked as 4 in grid)
+                               severity_type 1 = high severity (will be marked as 5 in grid)
+        spawn_point: Tuple (row, col) where patients spawn
+        waiting_room_pos: Tuple (row, col) for waiting room position
+        pattern: List of patient severity values to cycle through
+        route_cache_size: Max routes kept in the LRU route cache (routes.cache)
+        seed: Seed for the generator that picks among idle doctors
+        dispatch_policy: Callable choosing which idle nurse escorts each (patient, room)
+                         pair, see dispatch.py (default: first idle nurse in list order)
+        routes: Prebuilt RouteTable for the marked layout to share between
+                simulations instead of building one (see sweep.py); the
+                simulation then uses routes.grid as its hospital
+        log: eventlog.EventLog receiving lifecycle events (default: print
+             them to the console; eventlog.SILENT for headless runs)
+    """
+    def __init__(
+        self,
+        hospital,
+        nurse_positions,
+        doctor_positions,
+        treatment_rooms_config,
+        spawn_point=(0, 0),
+        waiting_room_pos=(0, 1),
+        pattern=[2, 5, 3, 1, 5, 2, 3, 1, 5, 3],
+        route_cache_size=4096,
+        seed=None,
+        dispatch_policy=greedy_dispatch,
+        routes=None,
+        log=None,
+    ):
+        # Create a copy of the hospital grid and mark treatment rooms
+        hospital = mark_rooms(hospital, treatment_rooms_config)
+        if routes is not None:
+            if routes.layout != layout_version(hospital):
+                raise ValueError("routes were built for a different layout")
+            hospital = routes.grid
+
+        # Ids and live counts belong to this simulation, so several can share a process
+        nurse_ids = IdAllocator()
+        doctor_ids = IdAllocator()
+
+        self.hospital = hospital
+        self.nurses = [Nurse(id=nurse_ids.next(), state=0, idle_position=pos) for pos in nurse_positions]
+        self.doctors = [Doctor(id=doctor_ids.next(), state=0, idle_position=pos) for pos in doctor_positions]
+        # Copy treatment rooms to avoid mutation
+        self.treatment_rooms = {pos: info.copy() for pos, info in treatment_rooms_config.items()}
+        self.spawn_point = spawn_point
+        self.waiting_room_pos = waiting_room_pos
+        self.pattern = pattern
+        self.pattern_index = 0
+        self.waiting_queues = {0: [], 1: []}  # severity_type -> MAX-heap of patients
+        self.tick = 0
+        self.patient_ids = IdAllocator()
+        self.active_patients = 0
+        self.active_tasks = TaskList()
+        self.rng = random.Random(seed)
+        self.dispatch_policy = dispatch_policy
+        self.log = log if log is not None else console_log()
+
+        # Every route in the simulation ends at one of these cells, so build a
+        # distance field for each once and route by following its gradient
+        if routes is None:
+            targets = route_targets(
+                spawn_point, waiting_room_pos, self.treatment_rooms.keys(),
+                list(nurse_positions) + list(doctor_positions),
+            )
+            routes = RouteTable(hospital, targets, cache_size=route_cache_size)
+        self.routes = routes
+
+        # Free-resource indexes, kept in sync by the set_* methods so that no
+        # lookup has to scan every nurse, doctor or room
+        self.nurse_index = {nurse: i for i, nurse in enumerate(self.nurses)}
+        self.room_list = list(self.treatment_rooms.keys())
+        self.room_index = {pos: i for i, pos in enumerate(self.room_list)}
+        self.idle_nurses = FreeList(i for i, nurse in enumerate(self.nurses) if nurse.state == 0)
+        self.idle_doctors = RandomPool(doc for doc in self.doctors if doc.state == 0)
+        self.free_rooms = {0: FreeList(), 1: FreeList()}
+        for pos, info in self.treatment_rooms.items():
+            if info["occupancy"] == 0:
+                self.free_rooms[info["severity_type"]].add(self.room_index[pos])
+
+    def get_route(self, start, end):
+        return self.routes.get_path(start, end)
+
+    def spawn_patient(self):
+        severity = self.pattern[self.pattern_index]
+        self.pattern_index = (self.pattern_index + 1) % len(self.pattern)
+        patient = Patient(id=self.patient_ids.next(), severity=severity, position=self.spawn_point)
+        self.active_patients += 1
+        heapq.heappush(self.waiting_queues[0 if severity < 4 else 1], patient)
+        if self.log.info:
+            self.log.emit(self.tick, "spawn", patient=patient.id, severity=severity)
+
+    def set_nurse_state(self, nurse, state):
+        nurse.state = state
+        if state == 0:
+            self.idle_nurses.add(self.nurse_index[nurse])
+        else:
+            self.idle_nurses.discard(self.nurse_index[nurse])
+
+    def set_doctor_state(self, doctor, state):
+        doctor.state = state
+        if state == 0:
+            self.idle_doctors.add(doctor)
+        else:
+            self.idle_doctors.discard(doctor)
+
+    def set_room_occupancy(self, room_pos, occupancy):
+        room_info = self.treatment_rooms[room_pos]
+        room_info["occupancy"] = occupancy
+        if occupancy == 0:
+            self.free_rooms[room_info["severity_type"]].add(self.room_index[room_pos])
+        else:
+            self.free_rooms[room_info["severity_type"]].discard(self.room_index[room_pos])
+
+    def get_idle_doctor(self):
+        return self.idle_doctors.choice(self.rng)
+
+    def get_free_room(self, severity):
+        severity_type = 0 if severity < 4 else 1
+        i = self.free_rooms[severity_type].peek()
+        return self.room_list[i] if i is not None else None
+
+    def patient_to_room(self):
+        """
+        Dispatch every feasible (idle nurse, free room) pair this tick.
+
+        Each severity class has its own queue, so a waiting patient with no
+        free room of their type never blocks patients of the other class.
+        Which nurse takes which pair is left to self.dispatch_policy.
+        """
+        queues = self.waiting_queues
+        free_rooms = self.free_rooms
+        pairs = []
+        while len(pairs) < len(self.idle_nurses):
+            # Highest-priority queue head among classes with a free room
+            best = None
+            for severity_type, queue in queues.items():
+                if queue and free_rooms[severity_type]:
+                    if best is None or queue[0] < queues[best][0]:
+                        best = severity_type
+            if best is None:
+                break
+
+            patient = heapq.heappop(queues[best])
+            room_pos = self.get_free_room(patient.severity)
+            self.set_room_occupancy(room_pos, 1)
+            pairs.append((patient, room_pos))
+
+        if not pairs:
+            return
+
+        idle = [self.nurses[i] for i in self.idle_nurses.ordered()]
+        assigned = self.dispatch_policy(idle, pairs, self)
+
+        for nurse, (patient, room_pos) in zip(assigned, pairs):
+            self.set_nurse_state(nurse, 1)
+
+            task = Task(
+                "escort_patient",
+                TO_WAITING_ROOM,
+                patient,
+                room_pos,
+                treatment_time=5,
+                nurse=nurse,
+                path=self.get_route(nurse.position, self.waiting_room_pos),
+            )
+            self.active_tasks.append(task)
+            if self.log.info:
+                self.log.emit(self.tick, "assign", role="nurse", staff=nurse.id, patient=patient.id, room=room_pos)
+
+    def process_tasks(self):
+        run_stages(self)
+
+    def step(self, tick, spawn_interval=5):
+        """Run one tick: spawn on the interval, dispatch nurses, advance every task."""
+        self.tick = tick
+        self.routes.refresh()
+
+        if tick % spawn_interval == 0:
+            self.spawn_patient()
+
+        self.patient_to_room()
+        self.process_tasks()
+
+    def waiting_count(self):
+        return sum(len(queue) for queue in self.waiting_queues.values())
+
+    def stats(self):
+        return {
+            "active_patients": self.active_patients,
+            "waiting": self.waiting_count(),
+            "nurses_busy": len(self.nurses) - len(self.idle_nurses),
+            "nurses_total": len(self.nurses),
+            "doctors_busy": len(self.doctors) - len(self.idle_doctors),
+            "doctors_total": len(self.doctors),
+        }
+
+    def next_event_tick(self, spawn_interval):
+        """
+        Next tick at which the state can change other than by walking or treatment
+        countdowns: a spawn, a task changing stage, or idle staff that can be
+        claimed straight away (a dispatchable patient, or a patient waiting for a
+        doctor while one is idle).
+        """
+        tick = self.tick
+        next_tick = (tick // spawn_interval + 1) * spawn_interval
+
+        if self.idle_nurses and any(
+            queue and self.free_rooms[severity_type]
+            for severity_type, queue in self.waiting_queues.items()
+        ):
+            return tick + 1
+        if self.idle_doctors and any(
+            task.stage == WAITING_FOR_DOCTOR for task in self.active_tasks
+        ):
+            return tick + 1
+
+        task_tick = next_task_event(self)
+        if task_tick is not None and task_tick < next_tick:
+            next_tick = task_tick
+        return next_tick
+
+    def fast_forward(self, ticks):
+        """Jump `ticks` quiet ticks ahead (see next_event_tick)."""
+        fast_forward(self, ticks)
+
+
+def run_sim(sim_state, max_ticks=100, mode="tick", spawn_interval=5, trace=None):
+    """
+    Run simulation without visualization.
+
+    mode="tick" steps every tick. mode="event" only steps the ticks where
+    something other than walking or a treatment countdown happens and jumps
+    over the rest (see Simulation.next_event_tick); it ends in the same state with the
+    same statistics, but skipped ticks are not logged. Each tick logs DEBUG
+    "tick" and "tick_stats" events to sim_state.log.
+
+    Pass a recording.TraceRecorder as trace to record every tick for replay
+    (tick mode only, since event mode skips the intermediate positions).
+
+    Returns:
+        Final stats dict (see Simulation.stats)
+    """
+    if mode not in ("tick", "event"):
+        raise ValueError(f"Unknown mode {mode!r}, expected 'tick' or 'event'")
+    if trace is not None and mode != "tick":
+        raise ValueError("Traces record every tick and need mode='tick'")
+
+    log = sim_state.log
+    tick = 0
+    while tick < max_ticks:
+        if log.debug:
+            log.emit(tick, "tick")
+        sim_state.step(tick, spawn_interval)
+        if trace is not None:
+            trace.record(sim_state)
+
+        if log.debug:
+            log.emit(
+                tick,
+                "tick_stats",
+                active_patients=sim_state.active_patients,
+                waiting=sim_state.waiting_count(),
+                active_tasks=len(sim_state.active_tasks),
+            )
+
+        if mode == "event":
+            next_tick = min(sim_state.next_event_tick(spawn_interval), max_ticks)
+            sim_state.fast_forward(next_tick - tick - 1)
+            tick = next_tick
+        else:
+            tick += 1
+
+    return sim_state.stats()
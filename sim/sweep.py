@@ -0,0 +1,238 @@
+import argparse
+import itertools
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from engine import RouteTable
+from eventlog import SILENT
+from simulation import Simulation, mark_rooms, route_targets, run_sim
+
+# Keys a sweep configuration may set; anything else is passed through to
+# Simulation unchanged (e.g. dispatch_policy, which must be picklable).
+CONFIG_KEYS = ("nurse_positions", "doctor_positions", "treatment_rooms_config", "pattern", "seed")
+
+# Per-worker state set once by _init_worker: the sweep's hospital grid, the
+# run settings and the route tables keyed by layout_key().
+_worker = {}
+
+
+def config_grid(**options):
+    """
+    Cartesian product of per-key option lists as a list of config dicts.
+
+    config_grid(nurse_positions=[a, b], seed=[0, 1]) gives four configs.
+    """
+    keys = list(options)
+    return [dict(zip(keys, values)) for values in itertools.product(*(options[k] for k in keys))]
+
+
+def layout_key(treatment_rooms_config):
+    """Runs whose treatment rooms sit in the same cells with the same types share a layout."""
+    return tuple(sorted((pos, info["severity_type"]) for pos, info in treatment_rooms_config.items()))
+
+
+def build_route_tables(hospital, configs, spawn_point=(0, 0), waiting_room_pos=(0, 1), route_cache_size=4096):
+    """
+    One RouteTable per distinct room layout in configs.
+
+    Each table has distance fields for the waiting room, spawn point, rooms
+    and the idle position of every nurse and doctor of any config on that
+    layout, so no run needs a field of its own.
+    """
+    staff = {}
+    rooms = {}
+    for config in configs:
+        key = layout_key(config["treatment_rooms_config"])
+        rooms[key] = config["treatment_rooms_config"]
+        staff.setdefault(key, []).extend(config["nurse_positions"])
+        staff[key].extend(config["doctor_positions"])
+
+    tables = {}
+    for key, treatment_rooms_config in rooms.items():
+        targets = route_targets(spawn_point, waiting_room_pos, treatment_rooms_config.keys(), staff[key])
+        tables[key] = RouteTable(mark_rooms(hospital, treatment_rooms_config), targets, cache_size=route_cache_size)
+    return tables
+
+
+def _init_worker(hospital, route_tables, kwargs):
+    _worker["hospital"] = hospital
+    _worker["route_tables"] = route_tables
+    _worker["kwargs"] = kwargs
+
+
+def run_config(hospital, config, max_ticks=100, mode="event", spawn_interval=5,
+               spawn_point=(0, 0), waiting_room_pos=(0, 1), route_tables=None):
+    """Run one configuration headless (no event log) and return its final stats."""
+    routes = None
+    if route_tables is not None:
+        routes = route_tables.get(layout_key(config["treatment_rooms_config"]))
+    sim = Simulation(
+        hospital,
+        spawn_point=spawn_point,
+        waiting_room_pos=waiting_room_pos,
+        routes=routes,
+        log=SILENT,
+        **config,
+    )
+    return run_sim(sim, max_ticks=max_ticks, mode=mode, spawn_interval=spawn_interval)
+
+
+def _run_indexed(index, config):
+    t0 = time.perf_counter()
+    stats = run_config(_worker["hospital"], config, route_tables=_worker["route_tables"], **_worker["kwargs"])
+    return index, stats, time.perf_counter() - t0
+
+
+def config_to_json(config):
+    """JSON-safe copy of a config: tuples become lists, rooms a list of {row, col, severity_type}."""
+    out = {}
+    for key, value in config.items():
+        if key == "treatment_rooms_config":
+            out[key] = [
+                {"row": r, "col": c, "severity_type": info["severity_type"]}
+                for (r, c), info in value.items()
+            ]
+        elif key in ("nurse_positions", "doctor_positions"):
+            out[key] = [list(pos) for pos in value]
+        elif key in CONFIG_KEYS:
+            out[key] = value
+        else:
+            # Pass-through Simulation arguments such as dispatch_policy: record the name
+            out[key] = getattr(value, "__name__", type(value).__name__)
+    return out
+
+
+def config_from_json(config):
+    """Inverse of config_to_json for the keys in CONFIG_KEYS."""
+    out = dict(config)
+    if "treatment_rooms_config" in out:
+        out["treatment_rooms_config"] = {
+            (room["row"], room["col"]): {"severity_type": room["severity_type"], "occupancy": 0}
+            for room in out["treatment_rooms_config"]
+        }
+    for key in ("nurse_positions", "doctor_positions"):
+        if key in out:
+            out[key] = [tuple(pos) for pos in out[key]]
+    return out
+
+
+def run_sweep(
+    hospital,
+    configs,
+    out_path=None,
+    max_ticks=100,
+    mode="event",
+    spawn_interval=5,
+    spawn_point=(0, 0),
+    waiting_room_pos=(0, 1),
+    workers=None,
+):
+    """
+    Run every configuration headless across a process pool.
+
+    Each config is a dict with nurse_positions, doctor_positions,
+    treatment_rooms_config, pattern and seed (see config_grid); the hospital
+    layout, spawn point and waiting room are shared by the whole sweep.
+    Route tables are built once per room layout in this process and handed,
+    with the layout, to each worker once at start-up; tasks only carry their
+    config.
+
+    Results are written to out_path as NDJSON, one line per run in
+    completion order and flushed as each run finishes, so a partial file is
+    usable if the sweep is interrupted.
+
+    Returns:
+        List of {"index", "config", "stats", "elapsed_s"} dicts in config order
+    """
+    configs = list(configs)
+    route_tables = build_route_tables(hospital, configs, spawn_point, waiting_room_pos)
+    kwargs = {
+        "max_ticks": max_ticks,
+        "mode": mode,
+        "spawn_interval": spawn_interval,
+        "spawn_point": spawn_point,
+        "waiting_room_pos": waiting_room_pos,
+    }
+
+    results = [None] * len(configs)
+    out = open(out_path, "w") if out_path is not None else None
+    try:
+        with ProcessPoolExecutor(
+            max_workers=workers, initializer=_init_worker, initargs=(hospital, route_tables, kwargs)
+        ) as pool:
+            futures = [pool.submit(_run_indexed, i, config) for i, config in enumerate(configs)]
+            for future in as_completed(futures):
+                index, stats, elapsed = future.result()
+                result = {
+                    "index": index,
+                    "config": config_to_json(configs[index]),
+                    "stats": stats,
+                    "elapsed_s": elapsed,
+                }
+                results[index] = result
+                if out is not None:
+                    out.write(json.dumps(result) + "\n")
+                    out.flush()
+    finally:
+        if out is not None:
+            out.close()
+    return results
+
+
+def load_spec(path):
+    """
+    Read a sweep spec from JSON.
+
+    {
+      "hospital": [[-1, 1, ...], ...],
+      "spawn_point": [0, 0],            (optional)
+      "waiting_room_pos": [0, 1],       (optional)
+      "grid": {"nurse_positions": [[[1, 1], [1, 2]], ...],
+               "doctor_positions": [...],
+               "treatment_rooms_config": [[{"row": 2, "col": 4, "severity_type": 0}, ...], ...],
+               "pattern": [[2, 5, 3, 1]],
+               "seed": [0, 1, 2]},
+      "configs": [{...}, ...]           (optional explicit configs, same keys)
+    }
+
+    Returns:
+        (hospital, configs, spawn_point, waiting_room_pos)
+    """
+    with open(path) as f:
+        spec = json.load(f)
+    configs = [config_from_json(c) for c in config_grid(**spec["grid"])] if "grid" in spec else []
+    configs += [config_from_json(c) for c in spec.get("configs", [])]
+    spawn_point = tuple(spec.get("spawn_point", (0, 0)))
+    waiting_room_pos = tuple(spec.get("waiting_room_pos", (0, 1)))
+    return spec["hospital"], configs, spawn_point, waiting_room_pos
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a staffing / room configuration sweep across CPU cores.")
+    parser.add_argument("spec", help="sweep spec JSON (see load_spec)")
+    parser.add_argument("-o", "--out", default="sweep_results.ndjson", help="NDJSON results file")
+    parser.add_argument("-t", "--ticks", type=int, default=100, help="ticks per run")
+    parser.add_argument("--mode", choices=("tick", "event"), default="event")
+    parser.add_argument("--spawn-interval", type=int, default=5)
+    parser.add_argument("-j", "--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    args = parser.parse_args(argv)
+
+    hospital, configs, spawn_point, waiting_room_pos = load_spec(args.spec)
+    t0 = time.perf_counter()
+    run_sweep(
+        hospital,
+        configs,
+        out_path=args.out,
+        max_ticks=args.ticks,
+        mode=args.mode,
+        spawn_interval=args.spawn_interval,
+        spawn_point=spawn_point,
+        waiting_room_pos=waiting_room_pos,
+        workers=args.workers,
+    )
+    print(f"{len(configs)} runs in {time.perf_counter() - t0:.1f}s -> {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,360 @@
+# Integer stage codes. Each active task's stage selects the handler that
+# advances it by one tick; the task kind is informational only.
+TO_WAITING_ROOM = 0      # escort: nurse walks to the waiting room
+ESCORT_TO_ROOM = 1       # escort: nurse and patient walk to the treatment room
+NURSE_RETURN = 2         # escort (severe): nurse walks back to the idle position
+NURSE_TREATING = 3       # escort (non-severe): nurse treats in the room
+PATIENT_DISCHARGE = 4    # patient walks alone to the spawn point
+WAITING_FOR_DOCTOR = 5   # severe patient waits in the room for an idle doctor
+DOCTOR_TO_ROOM = 6       # doctor walks to the treatment room
+DOCTOR_TREATING = 7      # doctor treats in the room
+DOCTOR_RETURN = 8        # doctor walks back to the idle position
+
+STAGE_NAMES = {
+    TO_WAITING_ROOM: "to_waiting_room",
+    ESCORT_TO_ROOM: "escort_to_room",
+    NURSE_RETURN: "nurse_return",
+    NURSE_TREATING: "treating",
+    PATIENT_DISCHARGE: "patient_discharge",
+    WAITING_FOR_DOCTOR: "waiting_for_doctor",
+    DOCTOR_TO_ROOM: "to_room",
+    DOCTOR_TREATING: "treating",
+    DOCTOR_RETURN: "doctor_return",
+}
+
+# stage code -> handler(sim, task); a handler returns True when the task is finished
+STAGE_HANDLERS = {}
+
+# stage code -> (quiet_ticks(task), advance(task, ticks)) for the event-driven
+# engine. quiet_ticks is how many upcoming ticks the handler would only walk
+# or count (None if the task waits on another task); advance applies that
+# many such ticks at once. Stages without an entry are stepped every tick.
+STAGE_SKIPS = {}
+
+
+def stage_handler(stage, name=None):
+    """Register the function advancing tasks in the given stage by one tick."""
+    def register(fn):
+        STAGE_HANDLERS[stage] = fn
+        if name is not None:
+            STAGE_NAMES[stage] = name
+        return fn
+    return register
+
+
+class Task:
+    """
+    One unit of work on a patient: an escort, a wait for a doctor or a doctor
+    treatment. path is a shared route from the simulation's route table and
+    must not be mutated.
+    """
+    __slots__ = (
+        "kind", "stage", "nurse", "doctor", "patient", "room",
+        "path", "path_index", "treatment_time", "treatment_counter", "slot",
+    )
+
+    def __init__(self, kind, stage, patient, room, treatment_time, nurse=None, doctor=None, path=()):
+        self.kind = kind
+        self.stage = stage
+        self.nurse = nurse
+        self.doctor = doctor
+        self.patient = patient
+        self.room = room
+        self.path = path
+        self.path_index = 0
+        self.treatment_time = treatment_time
+        self.treatment_counter = 0
+        self.slot = -1
+
+
+def stage_skip(stage, quiet_ticks, advance):
+    """Register how the event-driven engine fast-forwards tasks in a stage."""
+    STAGE_SKIPS[stage] = (quiet_ticks, advance)
+
+
+class TaskList:
+    """
+    Active tasks in creation order with O(1) removal.
+
+    remove() leaves a tombstone in the task's slot and compact() sweeps them
+    out in one pass, so creation order (which decides who gets a freed
+    doctor first) is preserved.
+    """
+    def __init__(self):
+        self.slots = []
+        self.removed = 0
+
+    def __len__(self):
+        return len(self.slots) - self.removed
+
+    def __iter__(self):
+        return (task for task in self.slots if task is not None)
+
+    def append(self, task):
+        task.slot = len(self.slots)
+        self.slots.append(task)
+
+    def remove(self, task):
+        self.slots[task.slot] = None
+        self.removed += 1
+
+    def compact(self):
+        if not self.removed:
+            return
+        self.slots = [task for task in self.slots if task is not None]
+        for slot, task in enumerate(self.slots):
+            task.slot = slot
+        self.removed = 0
+
+
+def run_stages(sim):
+    """Advance every active task by one tick, including tasks created during the tick."""
+    tasks = sim.active_tasks
+    slots = tasks.slots
+    handlers = STAGE_HANDLERS
+    i = 0
+    while i < len(slots):
+        task = slots[i]
+        if task is not None and handlers[task.stage](sim, task):
+            tasks.remove(task)
+        i += 1
+    tasks.compact()
+
+
+def next_task_event(sim):
+    """
+    Earliest tick at which some active task changes stage, given that
+    sim.tick has just been processed (None if no task will).
+    """
+    tick = sim.tick
+    skips = STAGE_SKIPS
+    soonest = None
+    for task in sim.active_tasks:
+        skip = skips.get(task.stage)
+        if skip is None:
+            return tick + 1
+        quiet = skip[0](task)
+        if quiet is not None and (soonest is None or quiet < soonest):
+            soonest = quiet
+            if quiet == 0:
+                break
+    return None if soonest is None else tick + 1 + soonest
+
+
+def fast_forward(sim, ticks):
+    """Apply `ticks` quiet ticks to every active task (see next_task_event)."""
+    if ticks <= 0:
+        return
+    skips = STAGE_SKIPS
+    for task in sim.active_tasks:
+        skips[task.stage][1](task, ticks)
+    sim.tick += ticks
+
+
+def move_along_path(entity, task):
+    """
+    Move entity along path.
+
+    Returns:
+        True if reached destination, False otherwise
+    """
+    # If path is empty, we're already at destination
+    if not task.path:
+        return True
+
+    if task.path_index < len(task.path):
+        entity.position = task.path[task.path_index]
+        task.path_index += 1
+        return False
+    return True
+
+
+def start_discharge(sim, task):
+    task.stage = PATIENT_DISCHARGE
+    # Ensure patient is at the treatment room before creating discharge path
+    task.patient.position = task.room
+    discharge_path = sim.get_route(task.room, sim.spawn_point)
+    if not discharge_path:
+        if sim.log.warning:
+            sim.log.emit(sim.tick, "no_path", start=task.room, end=sim.spawn_point)
+        discharge_path = (sim.spawn_point,)  # Fallback
+    task.path = discharge_path
+    task.path_index = 0
+    return discharge_path
+
+
+def assign_doctor(sim, doctor, task):
+    sim.set_doctor_state(doctor, 1)
+    doctor_task = Task(
+        "doctor_treat",
+        DOCTOR_TO_ROOM,
+        task.patient,
+        task.room,
+        task.treatment_time,
+        doctor=doctor,
+        path=sim.get_route(doctor.position, task.room),
+    )
+    sim.active_tasks.append(doctor_task)
+
+
+@stage_handler(TO_WAITING_ROOM)
+def to_waiting_room(sim, task):
+    if move_along_path(task.nurse, task):
+        task.stage = ESCORT_TO_ROOM
+        task.path = sim.get_route(sim.waiting_room_pos, task.room)
+        task.path_index = 0
+        task.patient.position = sim.waiting_room_pos
+    return False
+
+
+@stage_handler(ESCORT_TO_ROOM)
+def escort_to_room(sim, task):
+    if move_along_path(task.nurse, task):
+        task.patient.position = task.room
+        if sim.log.info:
+            sim.log.emit(sim.tick, "arrive", patient=task.patient.id, room=task.room)
+
+        if task.patient.severity >= 4:
+            task.stage = NURSE_RETURN
+            task.path = sim.get_route(task.nurse.position, task.nurse.idle_position)
+            task.path_index = 0
+        else:
+            task.stage = NURSE_TREATING
+            task.treatment_counter = 0
+    else:
+        task.patient.position = task.nurse.position
+    return False
+
+
+@stage_handler(NURSE_RETURN)
+def nurse_return(sim, task):
+    if not move_along_path(task.nurse, task):
+        return False
+
+    sim.set_nurse_state(task.nurse, 0)
+    log = sim.log
+    if log.info:
+        log.emit(sim.tick, "idle", role="nurse", staff=task.nurse.id)
+
+    doctor = sim.get_idle_doctor()
+    if doctor:
+        assign_doctor(sim, doctor, task)
+        if log.info:
+            log.emit(sim.tick, "assign", role="doctor", staff=doctor.id, patient=task.patient.id, room=task.room, waited=False)
+    else:
+        waiting_doctor_task = Task("waiting_for_doctor", WAITING_FOR_DOCTOR, task.patient, task.room, task.treatment_time)
+        sim.active_tasks.append(waiting_doctor_task)
+        if log.info:
+            log.emit(sim.tick, "wait", patient=task.patient.id)
+    return True
+
+
+@stage_handler(NURSE_TREATING)
+def nurse_treating(sim, task):
+    task.treatment_counter += 1
+    if task.treatment_counter >= task.treatment_time:
+        sim.set_nurse_state(task.nurse, 0)
+        discharge_path = start_discharge(sim, task)
+        sim.set_room_occupancy(task.room, 0)
+        if sim.log.info:
+            sim.log.emit(sim.tick, "treated", role="nurse", patient=task.patient.id, path_length=len(discharge_path))
+    return False
+
+
+@stage_handler(PATIENT_DISCHARGE)
+def patient_discharge(sim, task):
+    if move_along_path(task.patient, task):
+        sim.active_patients -= 1
+        if sim.log.info:
+            sim.log.emit(sim.tick, "discharged", patient=task.patient.id)
+        return True
+    return False
+
+
+@stage_handler(WAITING_FOR_DOCTOR)
+def waiting_for_doctor(sim, task):
+    doctor = sim.get_idle_doctor()
+    if not doctor:
+        return False
+    assign_doctor(sim, doctor, task)
+    if sim.log.info:
+        sim.log.emit(sim.tick, "assign", role="doctor", staff=doctor.id, patient=task.patient.id, room=task.room, waited=True)
+    return True
+
+
+@stage_handler(DOCTOR_TO_ROOM)
+def doctor_to_room(sim, task):
+    if move_along_path(task.doctor, task):
+        task.stage = DOCTOR_TREATING
+        if sim.log.info:
+            sim.log.emit(sim.tick, "treat", staff=task.doctor.id, patient=task.patient.id)
+    return False
+
+
+@stage_handler(DOCTOR_TREATING)
+def doctor_treating(sim, task):
+    task.treatment_counter += 1
+    if task.treatment_counter >= task.treatment_time:
+        task.stage = DOCTOR_RETURN
+        task.path = sim.get_route(task.doctor.position, task.doctor.idle_position)
+        task.path_index = 0
+        sim.set_room_occupancy(task.room, 0)
+        if sim.log.info:
+            sim.log.emit(sim.tick, "treated", role="doctor", patient=task.patient.id)
+    return False
+
+
+@stage_handler(DOCTOR_RETURN)
+def doctor_return(sim, task):
+    if move_along_path(task.doctor, task):
+        sim.set_doctor_state(task.doctor, 0)
+        log = sim.log
+        if log.info:
+            log.emit(sim.tick, "idle", role="doctor", staff=task.doctor.id)
+        discharge_path = start_discharge(sim, task)
+        if log.info:
+            log.emit(sim.tick, "discharge", patient=task.patient.id, path_length=len(discharge_path))
+    return False
+
+
+def walking(mover, follower=None):
+    """Skip rule for stages that move task.<mover> (and task.<follower> with it) along task.path."""
+    def quiet_ticks(task):
+        path = task.path
+        return len(path) - task.path_index if path else 0
+
+    def advance(task, ticks):
+        task.path_index += ticks
+        position = task.path[task.path_index - 1]
+        getattr(task, mover).position = position
+        if follower is not None:
+            getattr(task, follower).position = position
+
+    return quiet_ticks, advance
+
+
+def treating_quiet_ticks(task):
+    return max(0, task.treatment_time - task.treatment_counter - 1)
+
+
+def treating_advance(task, ticks):
+    task.treatment_counter += ticks
+
+
+def waiting_quiet_ticks(task):
+    return None
+
+
+def waiting_advance(task, ticks):
+    pass
+
+
+stage_skip(TO_WAITING_ROOM, *walking("nurse"))
+stage_skip(ESCORT_TO_ROOM, *walking("nurse", "patient"))
+stage_skip(NURSE_RETURN, *walking("nurse"))
+stage_skip(NURSE_TREATING, treating_quiet_ticks, treating_advance)
+stage_skip(PATIENT_DISCHARGE, *walking("patient"))
+stage_skip(WAITING_FOR_DOCTOR, waiting_quiet_ticks, waiting_advance)
+stage_skip(DOCTOR_TO_ROOM, *walking("doctor"))
+stage_skip(DOCTOR_TREATING, treating_quiet_ticks, treating_advance)
+stage_skip(DOCTOR_RETURN, *walking("doctor"))
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# The sim modules import each other by flat name (from engine import ...)
+SIM_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if SIM_DIR not in sys.path:
+    sys.path.insert(0, SIM_DIR)
@@ -0,0 +1,34 @@
+"""Small layouts shared by the tests."""
+import random
+
+from bench import make_floor_plan
+
+# The layout main.py runs when started directly
+HOSPITAL = [
+    [-1, 1, -2, -2, -2],
+    [-2, 0, 0, 0, -2],
+    [-2, 0, 0, 0, -2],
+    [-2, 0, 0, 0, -2],
+]
+NURSES = [(1, 1), (1, 2), (1, 3)]
+DOCTORS = [(2, 1), (2, 2)]
+
+
+def rooms():
+    return {
+        (1, 0): {"severity_type": 0, "occupancy": 0},
+        (3, 4): {"severity_type": 1, "occupancy": 0},
+    }
+
+
+def random_layout(size=20, seed=0, num_rooms=6, num_nurses=4, num_doctors=2):
+    """(hospital, nurses, doctors, rooms) on a random floor plan with the spawn and waiting room at (0, 0), (0, 1)."""
+    grid = make_floor_plan(size, wall_density=0.12, seed=seed)
+    grid[0][0], grid[0][1] = -1, 1
+    rng = random.Random(seed)
+    free = [(r, c) for r in range(size) for c in range(size) if grid[r][c] == 0 and r + c > 1]
+    rng.shuffle(free)
+    room_cells = free[:num_rooms]
+    nurses = free[num_rooms:num_rooms + num_nurses]
+    doctors = free[num_rooms + num_nurses:num_rooms + num_nurses + num_doctors]
+    return grid, nurses, doctors, {pos: {"severity_type": i % 2, "occupancy": 0} for i, pos in enumerate(room_cells)}
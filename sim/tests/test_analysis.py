@@ -0,0 +1,70 @@
+import numpy as np
+
+from analysis import AnalysisCache, analysis_key
+
+
+def test_cache_evicts_least_recently_used():
+    cache = AnalysisCache(maxsize=2)
+    cache.put("a", {"n": 1})
+    cache.put("b", {"n": 2})
+    assert cache.get("a") == {"n": 1}
+    cache.put("c", {"n": 3})
+    assert list(cache.results) == ["a", "c"]
+    assert cache.get("b") is None
+    assert cache.stats()["evictions"] == 1 and cache.stats()["size"] == 2
+
+
+def test_evicted_results_reload_from_disk(tmp_path):
+    cache = AnalysisCache(str(tmp_path), maxsize=1)
+    cache.put("a", {"n": 1})
+    cache.put("b", {"n": 2})
+    assert "a" not in cache.results
+    assert cache.get("a") == {"n": 1}
+    assert list(cache.results) == ["a"]
+
+
+def test_clear_resets_counters():
+    cache = AnalysisCache(maxsize=1)
+    cache.put("a", {"n": 1})
+    cache.put("b", {"n": 2})
+    cache.get("b")
+    cache.get("a")
+    cache.clear()
+    assert cache.stats() == {"hits": 0, "misses": 0, "evictions": 0, "size": 0, "maxsize": 1, "directory": None}
+
+
+def test_anomaly_results_grids_are_nested_lists(capsys):
+    import main
+
+    results = {"prediction": {"0": "high_congestion", "1": "normal"}, "prediction_probs": {"0": 0.9}}
+    points = (np.array([0, 1]), np.array([1, 0]), np.array([2.0, 0.5]))
+    parsed = main.display_anomaly_results(results, points, (2, 2), show_grid=False)
+    assert parsed["label_grid"] == [[None, "high_congestion"], ["normal", None]]
+    assert parsed["prob_grid"] == [[None, 0.9], [None, None]]
+    assert type(parsed["prob_grid"][0][1]) is float
+    assert parsed["congested_points"] == [{"row": 0, "col": 1, "congestion": 2.0, "label": "high_congestion", "prob": 0.9}]
+
+
+def test_key_depends_on_the_deployment():
+    grid = np.arange(6.0).reshape(2, 3)
+    a = analysis_key(grid, "m1", "https://a.example")
+    assert a == analysis_key(grid, "m1", "https://a.example/")
+    assert a != analysis_key(grid, "m1", "https://b.example")
+    assert analysis_key(grid) == analysis_key(grid, None, "https://a.example")
+
+
+def test_remote_results_are_not_shared_across_deployments(monkeypatch, capsys):
+    import main
+
+    calls = []
+
+    def infer(valid_points, api_key, model_id, base_url, *args):
+        calls.append(base_url)
+        return {"prediction": {str(i): "normal" for i in range(len(valid_points[0]))}}
+
+    monkeypatch.setattr(main, "_woodwide_infer", infer)
+    cache = AnalysisCache()
+    grid = np.arange(6.0).reshape(2, 3)
+    for base_url in ("https://a.example", "https://b.example", "https://a.example"):
+        main.analyze_congestion_with_woodwide(grid, "key", "m1", base_url, cache=cache)
+    assert calls == ["https://a.example", "https://b.example"]
@@ -0,0 +1,104 @@
+import subprocess
+import sys
+import threading
+import time
+
+import numpy as np
+import pytest
+
+import main
+from compression import PromptCompressor
+from tests.layouts import DOCTORS, HOSPITAL, NURSES, rooms
+
+
+class FakeBackend:
+    """Backend that counts calls, can be held on `gate`, and fails while `fail` is set."""
+    name = "fake"
+
+    def __init__(self):
+        self.calls = 0
+        self.gate = threading.Event()
+        self.gate.set()
+        self.fail = False
+
+    def compress(self, text, aggressiveness):
+        self.calls += 1
+        self.gate.wait(10)
+        if self.fail:
+            raise RuntimeError("service down")
+        return text[:10]
+
+
+def test_concurrent_requests_share_one_call():
+    backend = FakeBackend()
+    backend.gate.clear()
+    compressor = PromptCompressor(backend)
+    futures = [compressor.compress_async("prompt text") for _ in range(5)]
+    assert len(set(map(id, futures))) == 1
+    backend.gate.set()
+    assert futures[0].result(timeout=10) == "prompt tex"
+    assert compressor.compress("prompt text") == "prompt tex"
+    assert backend.calls == 1
+    assert compressor.stats()["misses"] == 1 and compressor.stats()["hits"] == 5
+
+
+def test_failure_is_raised_and_not_cached():
+    backend = FakeBackend()
+    backend.fail = True
+    compressor = PromptCompressor(backend)
+    with pytest.raises(RuntimeError):
+        compressor.compress("prompt text")
+    backend.fail = False
+    assert compressor.compress("prompt text") == "prompt tex"
+    assert backend.calls == 2
+
+
+def test_improvement_prompt_stays_a_string_and_shares_its_compression(capsys):
+    from simulation import Simulation
+
+    sim = Simulation(HOSPITAL, NURSES, DOCTORS, rooms(), seed=0)
+    backend = FakeBackend()
+    compressor = PromptCompressor(backend)
+    prompt = main.generate_gemini_improvement_prompt(sim, np.zeros(np.shape(HOSPITAL)), None, compressor=compressor)
+    assert isinstance(prompt, str)
+    assert main.compress_improvement_prompt(prompt, compressor).result(timeout=10) == prompt[:10]
+    assert backend.calls == 1
+
+    backend.fail = True
+    failing = PromptCompressor(backend)
+    prompt = main.generate_gemini_improvement_prompt(sim, np.zeros(np.shape(HOSPITAL)), None, compressor=failing)
+    with pytest.raises(RuntimeError):
+        main.compress_improvement_prompt(prompt, failing).result(timeout=10)
+    assert "Prompt compression failed" in capsys.readouterr().out
+
+
+def test_compression_is_off_by_default(monkeypatch):
+    monkeypatch.delenv("PROMPT_COMPRESSOR", raising=False)
+    assert main.compress_improvement_prompt("prompt") is None
+
+
+def test_misses_are_queued_for_a_fixed_set_of_threads():
+    backend = FakeBackend()
+    backend.gate.clear()
+    compressor = PromptCompressor(backend, workers=2)
+    before = threading.active_count()
+    futures = [compressor.compress_async(f"prompt {i}") for i in range(50)]
+    assert threading.active_count() - before == 2
+    backend.gate.set()
+    assert [f.result(timeout=10) for f in futures] == [f"prompt {i}"[:10] for i in range(50)]
+    assert backend.calls == 50 and len(compressor.threads) == 2
+
+
+def test_exit_does_not_wait_for_compression():
+    code = (
+        "import time\n"
+        "from compression import PromptCompressor\n"
+        "class Slow:\n"
+        "    name = 'slow'\n"
+        "    def compress(self, text, aggressiveness):\n"
+        "        time.sleep(30)\n"
+        "PromptCompressor(Slow()).compress_async('prompt')\n"
+    )
+    start = time.monotonic()
+    subprocess.run([sys.executable, "-c", code], cwd=main.__file__.rsplit("/", 1)[0], check=True, timeout=20)
+    assert time.monotonic() - start < 10
@@ -0,0 +1,52 @@
+import itertools
+import pickle
+
+import numpy as np
+
+from dispatch import OptimalDispatch, linear_sum_assignment
+from eventlog import SILENT
+from simulation import Simulation, run_sim
+
+from .layouts import random_layout
+
+
+def brute_force_cost(cost):
+    rows, cols = cost.shape
+    return min(cost[np.arange(rows), list(perm)].sum() for perm in itertools.permutations(range(cols), rows))
+
+
+def test_linear_sum_assignment_matches_brute_force():
+    rng = np.random.default_rng(0)
+    for _ in range(200):
+        rows = int(rng.integers(1, 6))
+        cols = int(rng.integers(rows, 7))
+        cost = rng.integers(0, 20, (rows, cols)).astype(float)
+        assignment = linear_sum_assignment(cost)
+        assert len(set(assignment.tolist())) == rows
+        assert cost[np.arange(rows), assignment].sum() == brute_force_cost(cost)
+
+
+def run(layout, policy, seed):
+    grid, nurses, doctors, rooms = layout
+    sim = Simulation(grid, nurses, doctors, rooms, seed=seed, dispatch_policy=policy, log=SILENT)
+    return run_sim(sim, max_ticks=300, mode="event")
+
+
+def test_optimal_dispatch_shared_between_simulations():
+    layout = random_layout(20, seed=3, num_nurses=5)
+    shared = OptimalDispatch()
+    for seed in range(3):
+        assert run(layout, shared, seed) == run(layout, OptimalDispatch(), seed)
+
+    # Same layout, different staff positions: tables must not leak between runs
+    grid, nurses, doctors, rooms = layout
+    moved = (grid, nurses[::-1], doctors, rooms)
+    assert run(moved, shared, 0) == run(moved, OptimalDispatch(), 0)
+
+
+def test_optimal_dispatch_pickles_without_tables():
+    policy = OptimalDispatch()
+    run(random_layout(12, seed=4), policy, 0)
+    assert len(policy.tables) == 0  # dropped with the simulation
+    copy = pickle.loads(pickle.dumps(policy))
+    assert run(random_layout(12, seed=4), copy, 0) == run(random_layout(12, seed=4), OptimalDispatch(), 0)
@@ -0,0 +1,110 @@
+import random
+import subprocess
+import sys
+
+import engine
+from bench import legacy_get_path
+from engine import DistanceField, RouteTable, get_path, layout_version
+
+from .conftest import SIM_DIR
+from .layouts import random_layout
+
+
+def test_refresh_does_not_rehash_the_layout(monkeypatch):
+    grid, nurses, doctors, rooms = random_layout(20, seed=1)
+    table = RouteTable(grid, [(0, 1)] + nurses)
+    calls = []
+    monkeypatch.setattr(engine, "layout_version", lambda g: calls.append(1) or "x")
+    for _ in range(100):
+        assert not table.refresh()
+    assert not calls
+
+
+def test_edit_cell_rebuilds_routes():
+    grid = [[0] * 5 for _ in range(3)]
+    table = RouteTable(grid, [(0, 4)])
+    assert table.get_path((0, 0), (0, 4)) == tuple((0, c) for c in range(5))
+    layout = table.layout
+
+    table.edit_cell((0, 2), -2)
+    assert table.refresh()
+    path = table.get_path((0, 0), (0, 4))
+    assert (0, 2) not in path and len(path) == 7
+    assert table.layout != layout == layout_version([[0] * 5 for _ in range(3)])
+
+    table.edit_cell((0, 2), -2)  # no change, nothing to rebuild
+    assert not table.refresh()
+
+
+def test_rehash_catches_in_place_edits():
+    grid = [[0] * 5 for _ in range(3)]
+    table = RouteTable(grid, [(0, 4)])
+    grid[0][2] = -2
+    assert not table.refresh()
+    assert table.refresh(rehash=True)
+    assert (0, 2) not in table.get_path((0, 0), (0, 4))
+
+
+def test_layout_version_is_stable_across_processes():
+    grid, _, _, _ = random_layout(15, seed=2)
+    code = f"from engine import layout_version; print(layout_version({grid!r}))"
+    for seed in ("0", "1"):
+        out = subprocess.run(
+            [sys.executable, "-c", code], cwd=SIM_DIR, capture_output=True, text=True, check=True,
+            env={"PYTHONHASHSEED": seed},
+        )
+        assert out.stdout.strip() == layout_version(grid)
+
+
+def route_pairs(size, seed, count=200):
+    rng = random.Random(seed)
+    cells = [(r, c) for r in range(size) for c in range(size)]
+    return [(rng.choice(cells), rng.choice(cells)) for _ in range(count)]
+
+
+def test_heap_a_star_matches_legacy_a_star():
+    for seed in range(5):
+        grid, _, _, _ = random_layout(25, seed=seed)
+        grid[5][5], grid[9][3] = 4, 5  # occupied treatment rooms: destination only
+        for start, end in route_pairs(25, seed):
+            assert get_path(grid, start, end) == legacy_get_path(grid, start, end), (seed, start, end)
+
+
+def bfs_distances(grid, end):
+    """Shortest step counts to end under get_path's rules (walls never, -1/4/5 only as end)."""
+    rows, cols = len(grid), len(grid[0])
+    dist = {end: 0}
+    frontier = [end]
+    while frontier:
+        nxt = []
+        for r, c in frontier:
+            for nr, nc in ((r - 1, c), (r + 1, c), (r, c - 1), (r, c + 1)):
+                if 0 <= nr < rows and 0 <= nc < cols and (nr, nc) not in dist:
+                    dist[(nr, nc)] = dist[(r, c)] + 1
+                    if grid[nr][nc] not in (-2, -1, 4, 5):
+                        nxt.append((nr, nc))
+        frontier = nxt
+    return dist
+
+
+def test_distance_fields_match_a_star():
+    # Fields give shortest routes; A* never re-opens an improved node, so
+    # it can be longer, but reachability is the same
+    for seed in range(2):
+        grid, _, _, _ = random_layout(20, seed=seed)
+        grid[5][5] = 4
+        for _, end in route_pairs(20, seed, count=6):
+            field = DistanceField(grid, end)
+            shortest = bfs_distances(grid, end)
+            for start in ((r, c) for r in range(20) for c in range(20)):
+                expected = get_path(grid, start, end)
+                path = field.path(start)
+                assert bool(path) == bool(expected), (seed, start, end)
+                if not path:
+                    assert field.distance(start) == -1
+                    continue
+                assert len(path) - 1 == field.distance(start) == shortest[start] <= len(expected) - 1
+                assert path[0] == start and path[-1] == end
+                for (r0, c0), (r1, c1) in zip(path, path[1:]):
+                    assert abs(r0 - r1) + abs(c0 - c1) == 1
+                    assert grid[r1][c1] not in (-2, -1, 4, 5) or (r1, c1) == end
@@ -0,0 +1,29 @@
+import pytest
+
+from ensemble import Ensemble
+from eventlog import SILENT
+from simulation import Simulation
+
+from .layouts import DOCTORS, HOSPITAL, NURSES, random_layout, rooms
+
+LAYOUTS = [(HOSPITAL, NURSES, DOCTORS, rooms())] + [random_layout(20, seed=seed) for seed in range(2)]
+
+
+@pytest.mark.parametrize("layout", range(len(LAYOUTS)))
+@pytest.mark.parametrize("spawn_interval", [3, 5])
+def test_replicas_follow_their_simulations(layout, spawn_interval):
+    grid, nurses, doctors, room_config = LAYOUTS[layout]
+    seeds = range(6)
+    ensemble = Ensemble(grid, nurses, doctors, room_config, seeds=seeds)
+    sims = [Simulation([row[:] for row in grid], nurses, doctors, {pos: dict(room) for pos, room in room_config.items()},
+                       seed=seed, log=SILENT) for seed in seeds]
+    for tick in range(300):
+        ensemble.step(tick, spawn_interval)
+        stats = ensemble.stats()
+        nurse_pos = ensemble.positions(ensemble.nurse_pos).tolist()
+        doctor_pos = ensemble.positions(ensemble.doctor_pos).tolist()
+        for i, sim in enumerate(sims):
+            sim.step(tick, spawn_interval)
+            assert {key: int(value[i]) for key, value in stats.items()} == sim.stats(), (tick, i)
+            assert nurse_pos[i] == [list(nurse.position) for nurse in sim.nurses], (tick, i)
+            assert doctor_pos[i] == [list(doctor.position) for doctor in sim.doctors], (tick, i)
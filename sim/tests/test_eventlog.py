@@ -0,0 +1,23 @@
+import pickle
+
+import pytest
+
+from eventlog import INFO, SILENT, RingBuffer, SilentLog
+from simulation import Simulation, run_sim
+
+from .layouts import DOCTORS, HOSPITAL, NURSES, rooms
+
+
+def test_silent_cannot_be_enabled():
+    with pytest.raises(TypeError):
+        SILENT.add_sink(RingBuffer())
+    with pytest.raises(TypeError):
+        SILENT.set_level(INFO)
+    assert not (SILENT.debug or SILENT.info or SILENT.warning) and not SILENT.sinks
+
+
+def test_silent_runs_and_pickles():
+    sim = Simulation(HOSPITAL, NURSES, DOCTORS, rooms(), seed=0, log=SILENT)
+    run_sim(sim, max_ticks=50)
+    log = pickle.loads(pickle.dumps(sim)).log
+    assert isinstance(log, SilentLog) and not log.info
@@ -0,0 +1,50 @@
+import json
+import os
+import subprocess
+import sys
+
+from bench import bench_import_time
+
+from .conftest import SIM_DIR
+
+HEAVY = ("matplotlib", "PIL", "requests", "tokenc")
+
+# Cold-start budget per headless entry point (numpy alone is ~0.1 s; with
+# matplotlib and requests an import takes several times longer)
+IMPORT_BUDGET_S = 0.5
+
+
+def loaded_after(code):
+    """Heavy modules in sys.modules after running code in a fresh interpreter."""
+    script = f"import sys\n{code}\nimport json\nprint(json.dumps([m for m in {HEAVY!r} if m in sys.modules]))"
+    env = {k: v for k, v in os.environ.items() if not k.startswith(("WOODWIDE", "PROMPT_COMPRESSOR"))}
+    env["PYTHONPATH"] = os.pathsep.join([SIM_DIR, os.path.dirname(SIM_DIR)])
+    proc = subprocess.run([sys.executable, "-c", script], cwd=SIM_DIR, env=env, capture_output=True, text=True, check=True)
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def test_headless_entry_points_skip_heavy_dependencies():
+    assert loaded_after("import simulation, sweep, main\nimport sim.__main__") == []
+
+
+def test_headless_run_and_local_analysis_skip_heavy_dependencies():
+    code = """
+import numpy as np
+import main
+from eventlog import SILENT
+from simulation import run_sim
+sim = main.create_simulation([[-1, 1, 0], [-2, 0, 0]], [(1, 1)], [(1, 2)], {(0, 2): {"severity_type": 0, "occupancy": 0}}, log=SILENT)
+run_sim(sim, max_ticks=50, mode="event")
+avg = np.random.default_rng(0).random((2, 3))
+results = main.analyze_congestion_with_woodwide(avg)
+assert results["method"] == "local_iqr"
+main.generate_gemini_improvement_prompt(sim, avg, results)
+"""
+    assert loaded_after(code) == []
+
+
+def test_headless_imports_fit_the_cold_start_budget():
+    results = bench_import_time(("simulation", "sweep", "main"), repeat=3)
+    for res in results:
+        assert res["heavy"] == [], res
+        assert res["import_s"] is not None and res["import_s"] < IMPORT_BUDGET_S, res
@@ -0,0 +1,97 @@
+import os
+import subprocess
+import sys
+
+import matplotlib
+import pytest
+
+matplotlib.use("Agg")
+
+import main
+import render
+import ring
+from eventlog import SILENT
+
+from .conftest import SIM_DIR
+from .layouts import DOCTORS, HOSPITAL, NURSES, rooms
+
+
+def test_run_visual_process_mode_cleans_up_when_the_run_fails(tmp_path, monkeypatch):
+    sim = main.create_simulation(HOSPITAL, NURSES, DOCTORS, rooms(), seed=0, log=SILENT)
+    step = sim.step
+
+    def failing_step(tick, spawn_interval=5):
+        if tick == 5:
+            raise RuntimeError("boom")
+        step(tick, spawn_interval)
+
+    monkeypatch.setattr(sim, "step", failing_step)
+    created = []
+    create = ring.TickRing.create
+    monkeypatch.setattr(ring.TickRing, "create", classmethod(lambda cls, **kw: created.append(create(**kw)) or created[-1]))
+
+    processes = []
+    real_start = render.start_renderer
+    monkeypatch.setattr(render, "start_renderer", lambda *a, **kw: processes.append(real_start(*a, **kw)) or processes[-1])
+
+    with pytest.raises(RuntimeError, match="boom"):
+        main.run_visual(sim, max_ticks=50, out_path=str(tmp_path / "frames"), renderer="process")
+
+    (tick_ring,) = created
+    (process,) = processes
+    assert not process.is_alive()
+    assert tick_ring.shm is not None and not os.path.exists(f"/dev/shm/{tick_ring.shm.name}")
+
+
+def test_render_does_not_import_pyplot():
+    code = "import sys, render; print('matplotlib.pyplot' in sys.modules, 'visualizer' in sys.modules)"
+    out = subprocess.run([sys.executable, "-c", code], cwd=SIM_DIR, capture_output=True, text=True, check=True)
+    assert out.stdout.split() == ["False", "False"]
+
+
+def test_run_visual_export_uses_agg(tmp_path):
+    code = f"""
+import matplotlib
+import main
+from tests.layouts import DOCTORS, HOSPITAL, NURSES, rooms
+main.save_congestion_to_csv = lambda avg: None
+sim = main.create_simulation(HOSPITAL, NURSES, DOCTORS, rooms(), seed=0)
+main.run_visual(sim, max_ticks=4, num_interp_frames=1, out_path={str(tmp_path / "frames")!r})
+print(matplotlib.get_backend().lower())
+"""
+    env = dict(os.environ, MPLBACKEND="template", PYTHONPATH=SIM_DIR)
+    out = subprocess.run([sys.executable, "-c", code], cwd=SIM_DIR, env=env, capture_output=True, text=True, check=True)
+    assert out.stdout.split()[-1] == "agg"
+
+
+def test_run_visual_export_saves_the_analysis_instead_of_showing_it(tmp_path, monkeypatch):
+    import matplotlib.pyplot as plt
+
+    def no_window(*args, **kwargs):
+        raise AssertionError("plt.show() called for a file export")
+
+    monkeypatch.setattr(plt, "show", no_window)
+    monkeypatch.setattr(main, "save_congestion_to_csv", lambda avg: None)
+    sim = main.create_simulation(HOSPITAL, NURSES, DOCTORS, rooms(), seed=0, log=SILENT)
+    main.run_visual(sim, max_ticks=4, num_interp_frames=1, out_path=str(tmp_path / "frames"))
+    assert len(os.listdir(tmp_path / "frames")) == 4
+    assert (tmp_path / "frames_congestion.png").stat().st_size > 0
+
+
+def test_run_visual_spawns_at_the_given_interval(tmp_path, monkeypatch):
+    from simulation import run_sim
+
+    monkeypatch.setattr(main, "save_congestion_to_csv", lambda avg: None)
+    sim = main.create_simulation(HOSPITAL, NURSES, DOCTORS, rooms(), seed=0, log=SILENT)
+    main.run_visual(sim, max_ticks=12, num_interp_frames=1, out_path=str(tmp_path / "frames"), spawn_interval=2)
+    expected = main.create_simulation(HOSPITAL, NURSES, DOCTORS, rooms(), seed=0, log=SILENT)
+    assert sim.stats() == run_sim(expected, max_ticks=12, spawn_interval=2)
+
+
+def test_cli_forwards_spawn_interval_to_run_visual(monkeypatch):
+    import sim.__main__ as cli
+
+    calls = []
+    monkeypatch.setattr(main, "run_visual", lambda sim, **kwargs: calls.append(kwargs))
+    cli.main(["run", "--visual", "--spawn-interval", "3", "-t", "7"])
+    assert calls[0]["spawn_interval"] == 3 and calls[0]["max_ticks"] == 7
@@ -0,0 +1,64 @@
+import os
+
+import matplotlib
+
+matplotlib.use("Agg")
+
+import main
+from eventlog import SILENT
+from ring import TickRing
+from simulation import Simulation
+
+from .layouts import DOCTORS, HOSPITAL, NURSES, rooms
+
+
+def simulation():
+    return Simulation(HOSPITAL, NURSES, DOCTORS, rooms(), seed=0, log=SILENT)
+
+
+def test_dropped_staff_set_truncated():
+    sim = simulation()
+    ring = TickRing.create(slots=4, max_agents=len(NURSES) + len(DOCTORS) - 1)
+    try:
+        ring.write(sim)
+        assert ring.truncated
+        assert len(ring.read()[2]) == ring.max_agents
+    finally:
+        ring.close()
+
+
+def test_lapped_reader_counts_skipped_ticks():
+    sim = simulation()
+    ring = TickRing.create(slots=4, max_agents=64)
+    try:
+        for tick in range(10):
+            sim.step(tick)
+            ring.write(sim)
+        ticks = []
+        while (snapshot := ring.read()) is not None:
+            ticks.append(snapshot[0])
+        assert ticks == [6, 7, 8, 9] and ring.skipped == 6
+    finally:
+        ring.close()
+
+
+def test_wait_for_slot_waits_for_the_reader():
+    sim = simulation()
+    ring = TickRing.create(slots=2, max_agents=64)
+    try:
+        ring.write(sim)
+        assert ring.wait_for_slot()
+        ring.write(sim)
+        assert not ring.wait_for_slot(alive=lambda: False)
+        ring.read()
+        assert ring.wait_for_slot(alive=lambda: False)
+    finally:
+        ring.close()
+
+
+def test_process_export_keeps_every_tick(tmp_path, monkeypatch):
+    monkeypatch.setattr(main, "save_congestion_to_csv", lambda avg: None)
+    sim = simulation()
+    out = tmp_path / "frames"
+    main.run_visual(sim, max_ticks=20, num_interp_frames=1, out_path=str(out), renderer="process", ring_slots=2)
+    assert len(os.listdir(out)) == 20
@@ -0,0 +1,54 @@
+import pickle
+
+import pytest
+
+from dispatch import OptimalDispatch, greedy_dispatch
+from eventlog import INFO, SILENT, EventLog, RingBuffer
+from simulation import Simulation, run_sim
+
+from .layouts import DOCTORS, HOSPITAL, NURSES, random_layout, rooms
+
+LAYOUTS = [(HOSPITAL, NURSES, DOCTORS, rooms())] + [random_layout(20, seed=seed) for seed in range(3)]
+
+
+def staff(sim):
+    return [(agent.id, agent.state, agent.position) for agent in sim.nurses + sim.doctors]
+
+
+def test_free_list_heaps_stay_bounded_on_long_runs():
+    sim = Simulation(HOSPITAL, NURSES, DOCTORS, rooms(), seed=0, log=SILENT)
+    run_sim(sim, max_ticks=20000, mode="event")
+    assert len(sim.idle_nurses.heap) <= len(NURSES)
+    for severity_type, free in sim.free_rooms.items():
+        assert len(free.heap) <= len(rooms()), severity_type
+
+
+@pytest.mark.parametrize("layout", range(len(LAYOUTS)))
+@pytest.mark.parametrize("max_ticks,spawn_interval", [(137, 5), (400, 3), (400, 9)])
+def test_event_mode_matches_tick_mode(layout, max_ticks, spawn_interval):
+    runs = {}
+    for mode in ("tick", "event"):
+        grid, nurses, doctors, room_config = LAYOUTS[layout]
+        records = RingBuffer()
+        sim = Simulation([row[:] for row in grid], nurses, doctors, {pos: dict(room) for pos, room in room_config.items()},
+                         seed=3, log=EventLog(INFO, [records]))
+        stats = run_sim(sim, max_ticks=max_ticks, mode=mode, spawn_interval=spawn_interval)
+        runs[mode] = (stats, staff(sim), list(records))
+    assert runs["event"] == runs["tick"]
+    assert runs["tick"][2]  # the runs did something
+
+
+@pytest.mark.parametrize("policy", [greedy_dispatch, OptimalDispatch()], ids=["greedy", "optimal"])
+def test_pickled_simulation_continues_identically(policy):
+    grid, nurses, doctors, room_config = random_layout(20, seed=4)
+    sim = Simulation(grid, nurses, doctors, room_config, seed=5, log=EventLog(INFO, [RingBuffer()]),
+                     dispatch_policy=policy)
+    for tick in range(150):
+        sim.step(tick, 3)
+    copy = pickle.loads(pickle.dumps(sim))
+    for tick in range(150, 400):
+        sim.step(tick, 3)
+        copy.step(tick, 3)
+        assert copy.stats() == sim.stats(), tick
+        assert staff(copy) == staff(sim), tick
+    assert list(copy.log.sinks[0]) == list(sim.log.sinks[0])
@@ -0,0 +1,43 @@
+import matplotlib
+
+matplotlib.use("Agg")
+
+import numpy as np
+
+from eventlog import SILENT
+from recording import TraceRecorder
+from simulation import Simulation, run_sim
+from visualizer import HospitalVisualizer
+
+from .layouts import random_layout
+
+
+def full_heatmap(frame, shape):
+    """The heatmap rebuilt from scratch, as update() used to each frame."""
+    counts = np.zeros(shape, dtype=int)
+    swap_cells = {}
+    for pos1, pos2, type1, id1, type2, id2 in frame["swaps"]:
+        swap_cells[f"{type1}_{id1}"] = swap_cells[f"{type2}_{id2}"] = (pos1, pos2)
+    for entity_id, pos in frame["curr_positions"].items():
+        for r, c in swap_cells.get(entity_id, (pos,)):
+            counts[r, c] += 1
+    return counts
+
+
+def test_heatmap_is_updated_incrementally():
+    grid, nurses, doctors, rooms = random_layout(12, seed=3)
+    sim = Simulation(grid, nurses, doctors, rooms, seed=1, log=SILENT)
+    recorder = TraceRecorder(sim)
+    run_sim(sim, max_ticks=120, spawn_interval=2, trace=recorder)
+    trace = recorder.finish()
+
+    viz = HospitalVisualizer.from_trace(trace, num_interp_frames=2)
+    viz.heatmap_labels_on = True
+    for frame in trace.frames(num_interp_frames=2):
+        viz.update(frame)
+        expected = full_heatmap(frame, (viz.rows, viz.cols))
+        assert np.array_equal(viz.heatmap_data, expected), frame["tick"]
+        labels = {cell: text.get_text() for cell, text in viz.heatmap_texts.items() if text.get_text()}
+        assert labels == {(r, c): str(expected[r, c]) for r, c in zip(*np.nonzero(expected))}
+        assert viz.heatmap_shown == set(labels)
+    assert viz.heatmap_data.max() > 1  # cells were shared or swapped at some point
@@ -0,0 +1,165 @@
+import json
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pytest
+import requests
+
+import woodwide
+from woodwide import WoodWideClient, WoodWideError
+
+
+class StubServer(ThreadingHTTPServer):
+    """
+    Local stand-in for the Wood Wide API. Each request takes the next
+    action from `script` ("ok" once it is empty): "ok", an error status
+    such as "503", or "hang" (sleep past the client's read timeout).
+    """
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), StubHandler)
+        self.script = []
+        self.requests = []  # (path, client port)
+        self.uploads = []
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def reply(self, status, body, headers=()):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        for name, value in headers:
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        server = self.server
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        server.requests.append((self.path, self.client_address[1]))
+        action = server.script.pop(0) if server.script else "ok"
+        if action == "hang":
+            time.sleep(0.5)
+            try:
+                self.reply(200, {})
+            except OSError:
+                pass  # the client gave up
+            return
+        if action != "ok":
+            status = int(action)
+            self.reply(status, {"error": action}, [("Retry-After", "0")] if status == 429 else ())
+            return
+        if self.path.startswith("/api/datasets"):
+            server.uploads.append(body)
+            self.reply(200, {"id": f"ds{len(server.uploads)}"})
+        else:
+            self.reply(200, {"prediction": {"0": "normal"}})
+
+
+@pytest.fixture
+def server():
+    server = StubServer()
+    thread = threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def client(server):
+    client = WoodWideClient("key", server.url, backoff=0.01, max_backoff=0.05, seed=0)
+    yield client
+    client.close()
+
+
+POINTS = (np.array([0, 0, 1]), np.array([0, 1, 0]), np.array([0.5, 1.25, 3.0]))
+
+
+def test_retries_503_and_429_with_backoff(server, client):
+    server.script = ["503", "429"]
+    assert client.infer("m1", "ds1") == {"prediction": {"0": "normal"}}
+    assert client.attempts == 3
+
+
+def test_gives_up_after_retries(server, client):
+    server.script = ["503"] * 4
+    with pytest.raises(WoodWideError) as error:
+        client.infer("m1", "ds1")
+    assert error.value.status_code == 503 and client.attempts == client.retries + 1
+
+
+def test_client_errors_are_not_retried(server, client):
+    server.script = ["400"]
+    with pytest.raises(WoodWideError) as error:
+        client.upload_dataset(POINTS, "name")
+    assert error.value.status_code == 400 and error.value.step == "upload"
+    assert client.attempts == 1
+
+
+def test_read_timeout_is_retried(server, client):
+    client.timeout = (1.0, 0.2)
+    server.script = ["hang"]
+    assert client.infer("m1", "ds1") == {"prediction": {"0": "normal"}}
+    assert client.attempts == 2
+
+
+def test_read_timeout_raises_once_retries_run_out(server, client):
+    client.timeout = (1.0, 0.1)
+    client.retries = 1
+    server.script = ["hang", "hang"]
+    start = time.monotonic()
+    with pytest.raises(requests.exceptions.Timeout):
+        client.infer("m1", "ds1")
+    assert time.monotonic() - start < 1.0
+
+
+def test_deadline_stops_retrying(server, client):
+    client.backoff = client.max_backoff = 0.5
+    client.deadline = 0.0
+    server.script = ["503", "503"]
+    with pytest.raises(WoodWideError):
+        client.infer("m1", "ds1")
+    assert client.attempts == 1
+
+
+def test_connections_are_reused(server, client):
+    for _ in range(5):
+        client.infer_points(POINTS, "m1", "name")
+    ports = {port for _, port in server.requests}
+    assert len(server.requests) == 10 and len(ports) == 1
+
+
+def test_upload_is_built_in_memory(server, client, monkeypatch):
+    def no_temp_files(*args, **kwargs):
+        raise AssertionError("upload wrote a temp file")
+
+    monkeypatch.setattr(tempfile, "NamedTemporaryFile", no_temp_files)
+    monkeypatch.setattr(tempfile, "mkstemp", no_temp_files)
+    assert client.upload_dataset(POINTS, "congestion") == "ds1"
+    (body,) = server.uploads
+    assert b"row,col,congestion\n0,0,0.5000\n0,1,1.2500\n1,0,3.0000\n" in body
+    assert b'name="name"\r\n\r\ncongestion' in body
+
+
+def test_background_inference(server, client):
+    futures = [client.infer_points_async(POINTS, "m1", f"run{i}") for i in range(4)]
+    assert [f.result(timeout=10) for f in futures] == [{"prediction": {"0": "normal"}}] * 4
+
+
+def test_get_client_is_shared(server):
+    assert woodwide.get_client("key", server.url) is woodwide.get_client("key", server.url + "/")
+    assert woodwide.get_client("key", server.url) is not woodwide.get_client("other", server.url)
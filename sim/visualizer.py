@@ -1,10 +1,24 @@
 import matplotlib.pyplot as plt
 import matplotlib.patches as patches
 from matplotlib.animation import FuncAnimation
+from matplotlib.collections import EllipseCollection
+from matplotlib.colors import ListedColormap
+from matplotlib.ticker import MaxNLocator
 import numpy as np
 
+# Background cell values, their color names and labels (other values draw as free)
+CELL_KINDS = (0, -2, -1, 1, 4, 5)
+CELL_COLOR_NAMES = ('free', 'wall', 'spawn', 'waiting', 'treatment_low', 'treatment_high')
+CELL_LABELS = ('', 'WALL', 'SPAWN', 'WAIT', 'LOW', 'HIGH')
+
+# Per-cell text labels are only drawn while at most this many cells are in view
+LABEL_CELL_LIMIT = 2500
+# Layouts with more rows or columns than this get automatic ticks, not one per cell
+TICK_CELL_LIMIT = 60
+
 class HospitalVisualizer:
-    def __init__(self, hospital, nurses, doctors, treatment_rooms):
+    def __init__(self, hospital, nurses, doctors, treatment_rooms, label_cell_limit=LABEL_CELL_LIMIT,
+                 num_interp_frames=5):
         self.hospital = hospital
         self.nurses = nurses
         self.doctors = doctors
@@ -36,52 +50,38 @@ class HospitalVisualizer:
         }
 
         # Interpolation settings
-        self.num_interp_frames = 5  # Number of frames to interpolate between ticks
+        self.num_interp_frames = num_interp_frames  # Number of frames to interpolate between ticks
         self.current_frame = 0
 
+        self.label_cell_limit = label_cell_limit
         self.setup_grid()
         self.setup_heatmap()
+        self.setup_agents()
+        self.refresh_labels()
+        for ax in (self.ax_grid, self.ax_heatmap):
+            ax.callbacks.connect('xlim_changed', self.refresh_labels)
+            ax.callbacks.connect('ylim_changed', self.refresh_labels)
 
     def setup_grid(self):
+        # Background: one indexed-color image instead of a patch per cell
+        cell_values = np.asarray(self.hospital)
+        self.cell_index = np.zeros(cell_values.shape, dtype=np.int8)  # free, and any other value
+        for index, value in enumerate(CELL_KINDS[1:], start=1):
+            self.cell_index[cell_values == value] = index
+        cmap = ListedColormap([self.colors[name] for name in CELL_COLOR_NAMES])
+        self.background_img = self.ax_grid.imshow(self.cell_index, cmap=cmap, vmin=-0.5, vmax=len(CELL_KINDS) - 0.5,
+                                                  interpolation='nearest', alpha=0.3)
+
         self.ax_grid.set_xlim(-0.5, self.cols - 0.5)
         self.ax_grid.set_ylim(-0.5, self.rows - 0.5)
         self.ax_grid.set_aspect('equal')
         self.ax_grid.invert_yaxis()
-        self.ax_grid.set_xticks(range(self.cols))
-        self.ax_grid.set_yticks(range(self.rows))
-        self.ax_grid.grid(True, alpha=0.3, linewidth=1.5)
+        self.set_cell_ticks(self.ax_grid)
         self.ax_grid.set_title('Hospital Layout', fontsize=12, fontweight='bold')
 
-        # Draw background cells
-        for r in range(self.rows):
-            for c in range(self.cols):
-                cell_value = self.hospital[r][c]
-
-                if cell_value == -2:  # Wall
-                    color = self.colors['wall']
-                elif cell_value == -1:  # Spawn
-                    color = self.colors['spawn']
-                elif cell_value == 0:  # Free
-                    color = self.colors['free']
-                elif cell_value == 1:  # Waiting room
-                    color = self.colors['waiting']
-                elif cell_value == 4:  # Low severity treatment
-                    color = self.colors['treatment_low']
-                elif cell_value == 5:  # High severity treatment
-                    color = self.colors['treatment_high']
-                else:
-                    color = self.colors['free']
-
-                rect = patches.Rectangle((c - 0.5, r - 0.5), 1, 1,
-                                         linewidth=0, facecolor=color, alpha=0.3)
-                self.ax_grid.add_patch(rect)
-
-                # Add cell labels
-                labels = {-2: 'WALL', -1: 'SPAWN', 0: '', 1: 'WAIT', 4: 'LOW', 5: 'HIGH'}
-                if cell_value in labels and labels[cell_value]:
-                    self.ax_grid.text(c, r, labels[cell_value],
-                                    ha='center', va='center',
-                                    fontsize=8, alpha=0.5, fontweight='bold')
+        # Cell labels are created for the cells in view, once few enough are visible
+        self.cell_labels = {}
+        self.cell_labels_on = False
 
         # Legend
         legend_elements = [
@@ -95,28 +95,86 @@ class HospitalVisualizer:
 
     def setup_heatmap(self):
         self.ax_heatmap.set_title('Entity Density Heatmap', fontsize=12, fontweight='bold')
-        self.heatmap_data = np.zeros((self.rows, self.cols))
+        self.heatmap_data = np.zeros((self.rows, self.cols), dtype=int)
         self.heatmap_img = self.ax_heatmap.imshow(self.heatmap_data,
                                                   cmap='YlOrRd',
                                                   interpolation='nearest',
                                                   vmin=0, vmax=5)
-        self.ax_heatmap.set_xticks(range(self.cols))
-        self.ax_heatmap.set_yticks(range(self.rows))
-        self.ax_heatmap.grid(True, alpha=0.3, linewidth=1.5, color='white')
+        self.set_cell_ticks(self.ax_heatmap, color='white')
 
         # Add colorbar
         cbar = plt.colorbar(self.heatmap_img, ax=self.ax_heatmap)
         cbar.set_label('Number of Entities', rotation=270, labelpad=20)
 
-        # Text annotations for counts
-        self.heatmap_texts = []
-        for r in range(self.rows):
-            row_texts = []
-            for c in range(self.cols):
-                text = self.ax_heatmap.text(c, r, '0', ha='center', va='center',
-                                           fontsize=14, fontweight='bold', color='black')
-                row_texts.append(text)
-            self.heatmap_texts.append(row_texts)
+        # Text annotations for counts, keyed by (row, col) and created the first
+        # time a cell is occupied
+        self.heatmap_texts = {}
+        self.heatmap_labels_on = False
+        # heatmap_data is kept between frames: heatmap_cells holds the cells
+        # each entity is counted in, so only entities that moved touch it.
+        # heatmap_shown holds the cells whose label is non-empty.
+        self.heatmap_cells = {}
+        self.heatmap_shown = set()
+
+    def set_cell_ticks(self, ax, **grid_kw):
+        """One tick and grid line per cell on small layouts, automatic integer ticks on large ones."""
+        if max(self.rows, self.cols) <= TICK_CELL_LIMIT:
+            ax.set_xticks(range(self.cols))
+            ax.set_yticks(range(self.rows))
+            ax.grid(True, alpha=0.3, linewidth=1.5, **grid_kw)
+        else:
+            ax.xaxis.set_major_locator(MaxNLocator(integer=True))
+            ax.yaxis.set_major_locator(MaxNLocator(integer=True))
+
+    def cells_in_view(self, ax):
+        """(r0, r1, c0, c1) window of cells visible in ax, or None when it holds more than label_cell_limit."""
+        x0, x1 = sorted(ax.get_xlim())
+        y0, y1 = sorted(ax.get_ylim())
+        c0, c1 = max(0, int(np.floor(x0 + 0.5))), min(self.cols, int(np.ceil(x1 + 0.5)))
+        r0, r1 = max(0, int(np.floor(y0 + 0.5))), min(self.rows, int(np.ceil(y1 + 0.5)))
+        if (r1 - r0) * (c1 - c0) > self.label_cell_limit:
+            return None
+        return r0, r1, c0, c1
+
+    def refresh_labels(self, ax=None):
+        """Show per-cell labels only while few enough cells are in view (connected to zoom/pan)."""
+        window = self.cells_in_view(self.ax_grid)
+        self.cell_labels_on = window is not None
+        if window is not None:
+            r0, r1, c0, c1 = window
+            rows, cols = np.nonzero(self.cell_index[r0:r1, c0:c1])
+            for r, c in zip((rows + r0).tolist(), (cols + c0).tolist()):
+                if (r, c) not in self.cell_labels:
+                    self.cell_labels[(r, c)] = self.ax_grid.text(
+                        c, r, CELL_LABELS[self.cell_index[r, c]], ha='center', va='center',
+                        fontsize=8, alpha=0.5, fontweight='bold', clip_on=True)
+        for text in self.cell_labels.values():
+            text.set_visible(self.cell_labels_on)
+
+        self.heatmap_labels_on = self.cells_in_view(self.ax_heatmap) is not None
+        for text in self.heatmap_texts.values():
+            text.set_visible(self.heatmap_labels_on)
+
+    def setup_agents(self):
+        # One persistent collection per agent type (radius in data units); frames
+        # only move offsets and recolor, nothing is created or removed
+        self.agent_artists = {}
+        for entity_type, radius in (('nurse', 0.12), ('doctor', 0.12), ('patient', 0.10)):
+            artist = EllipseCollection(
+                2 * radius, 2 * radius, 0, units='xy',
+                offsets=np.empty((0, 2)), offset_transform=self.ax_grid.transData,
+                facecolors=self.colors.get(entity_type, self.colors['patient_low']),
+                edgecolors='black', linewidths=2, zorder=3,
+            )
+            self.ax_grid.add_collection(artist, autolim=False)
+            self.agent_artists[entity_type] = artist
+
+        # Tick stats live inside the grid axes so blitting redraws them
+        self.stats_text = self.ax_grid.text(
+            0.01, 0.99, '', transform=self.ax_grid.transAxes, ha='left', va='top',
+            fontsize=9, fontweight='bold', zorder=4,
+            bbox=dict(facecolor='white', alpha=0.8, edgecolor='none'),
+        )
 
     def get_entity_positions(self, active_tasks):
         positions = {}
@@ -137,11 +195,11 @@ class HospitalVisualizer:
 
         # Add patients
         for task in active_tasks:
-            if 'patient' in task:
-                pos = task['patient'].position
+            if task.patient is not None:
+                pos = task.patient.position
                 if pos not in positions:
                     positions[pos] = {'nurses': [], 'doctors': [], 'patients': []}
-                positions[pos]['patients'].append(task['patient'])
+                positions[pos]['patients'].append(task.patient)
 
         return positions
 
@@ -165,10 +223,6 @@ class HospitalVisualizer:
         t = tick_data['interp_t']
         swaps = tick_data.get('swaps', [])
 
-        # Clear previous entities
-        for artist in self.ax_grid.patches[self.rows * self.cols:]:
-            artist.remove()
-
         # Get entity positions with interpolation
         interpolated_positions = {}
 
@@ -193,35 +247,42 @@ class HospitalVisualizer:
                 interpolated_positions[interp_pos] = []
             interpolated_positions[interp_pos].append(entity_id)
 
-        # Update heatmap data (use final positions for heatmap)
-        self.heatmap_data = np.zeros((self.rows, self.cols))
-
-        # Build a set of swapping entity IDs for quick lookup
-        swapping_entity_ids = set()
-        swap_positions_map = {}  # Maps entity_id to both positions it should be counted in
-
-        for swap in swaps:
-            pos1, pos2, type1, id1, type2, id2 = swap
-            entity_id1 = f'{type1}_{id1}'
-            entity_id2 = f'{type2}_{id2}'
-            swapping_entity_ids.add(entity_id1)
-            swapping_entity_ids.add(entity_id2)
-            swap_positions_map[entity_id1] = [pos1, pos2]
-            swap_positions_map[entity_id2] = [pos1, pos2]
-
-        # Count entities in heatmap
+        # Update heatmap counts from the final positions; a swapping entity
+        # counts in both cells. Only entities whose cells changed are touched.
+        swap_cells = {}
+        for pos1, pos2, type1, id1, type2, id2 in swaps:
+            swap_cells[f'{type1}_{id1}'] = swap_cells[f'{type2}_{id2}'] = (pos1, pos2)
+
+        counted = self.heatmap_cells
+        changed = set()
+        for entity_id in counted.keys() - curr_positions.keys():
+            for r, c in counted.pop(entity_id):
+                self.heatmap_data[r, c] -= 1
+                changed.add((r, c))
         for entity_id, pos in curr_positions.items():
-            if entity_id in swapping_entity_ids:
-                # This entity is swapping, count it in BOTH positions
-                for swap_pos in swap_positions_map[entity_id]:
-                    r, c = swap_pos
-                    self.heatmap_data[r, c] += 1
-            else:
-                # Normal case: count in current position only
-                r, c = pos
+            cells = swap_cells.get(entity_id, (pos,))
+            old_cells = counted.get(entity_id, ())
+            if old_cells == cells:
+                continue
+            for r, c in old_cells:
+                self.heatmap_data[r, c] -= 1
+                changed.add((r, c))
+            for r, c in cells:
                 self.heatmap_data[r, c] += 1
-
-        # Draw entities as circles at interpolated positions
+                changed.add((r, c))
+            counted[entity_id] = cells
+
+        # Severity per patient entity; replayed traces provide it, live runs read the tasks
+        patient_high = tick_data.get('patient_high')
+        if patient_high is None:
+            patient_high = {
+                f'patient_{task.patient.id}': task.patient.severity >= 4
+                for task in active_tasks if task.patient is not None
+            }
+
+        # Collect the drawn (x, y) of every entity, per agent type
+        offsets = {'nurse': [], 'doctor': [], 'patient': []}
+        patient_colors = []
         for interp_pos, entity_ids in interpolated_positions.items():
             r_interp, c_interp = interp_pos
 
@@ -231,25 +292,12 @@ class HospitalVisualizer:
             for entity_id in entity_ids:
                 entity_type = entity_id.split('_')[0]
 
-                if entity_type == 'nurse':
-                    nurse_id = int(entity_id.split('_')[1])
-                    nurse = next(n for n in self.nurses if n.id == nurse_id)
-                    all_entities.append(('nurse', nurse))
-                elif entity_type == 'doctor':
-                    doctor_id = int(entity_id.split('_')[1])
-                    doctor = next(d for d in self.doctors if d.id == doctor_id)
-                    all_entities.append(('doctor', doctor))
-                elif entity_type == 'patient':
-                    patient_id = int(entity_id.split('_')[1])
-                    # Find patient in active tasks
-                    for task in active_tasks:
-                        if 'patient' in task and task['patient'].id == patient_id:
-                            patient = task['patient']
-                            severity_high = patient.severity >= 4
-                            all_entities.append(('patient', patient, severity_high))
-                            break
-
-            # Draw entities in a circle around the cell center
+                if entity_type == 'nurse' or entity_type == 'doctor':
+                    all_entities.append((entity_type, entity_id))
+                elif entity_type == 'patient' and entity_id in patient_high:
+                    all_entities.append(('patient', entity_id, patient_high[entity_id]))
+
+            # Place entities in a circle around the cell center
             num_entities = len(all_entities)
             if num_entities == 1:
                 positions_offset = [(0, 0)]
@@ -267,47 +315,100 @@ class HospitalVisualizer:
             for i, entity_info in enumerate(all_entities):
                 entity_type = entity_info[0]
                 offset_x, offset_y = positions_offset[i]
-
-                if entity_type == 'nurse':
-                    color = self.colors['nurse']
-                    radius = 0.12
-                elif entity_type == 'doctor':
-                    color = self.colors['doctor']
-                    radius = 0.12
-                elif entity_type == 'patient':
+                offsets[entity_type].append((c_interp + offset_x, r_interp + offset_y))
+                if entity_type == 'patient':
                     severity_high = entity_info[2]
-                    color = self.colors['patient_high'] if severity_high else self.colors['patient_low']
-                    radius = 0.10
+                    patient_colors.append(self.colors['patient_high'] if severity_high else self.colors['patient_low'])
 
-                circle = patches.Circle((c_interp + offset_x, r_interp + offset_y), radius,
-                                       facecolor=color, edgecolor='black', linewidth=2)
-                self.ax_grid.add_patch(circle)
+        # Move the persistent agent artists
+        for entity_type, artist in self.agent_artists.items():
+            artist.set_offsets(np.array(offsets[entity_type], dtype=float).reshape(-1, 2))
+        if patient_colors:
+            self.agent_artists['patient'].set_facecolor(patient_colors)
 
         # Update heatmap
-        self.heatmap_img.set_data(self.heatmap_data)
-
-        # Update heatmap text annotations
-        for r in range(self.rows):
-            for c in range(self.cols):
-                count = int(self.heatmap_data[r, c])
-                self.heatmap_texts[r][c].set_text(str(count) if count > 0 else '')
-                # Change text color based on background
-                if count > 2:
-                    self.heatmap_texts[r][c].set_color('white')
-                else:
-                    self.heatmap_texts[r][c].set_color('black')
-
-        # Update title with stats
-        self.fig.suptitle(
-            f'ER Simulation - Tick {tick} | '
+        if changed:
+            self.heatmap_img.set_data(self.heatmap_data)
+
+        # Update heatmap text annotations whose count changed
+        for r, c in changed:
+            count = int(self.heatmap_data[r, c])
+            text = self.heatmap_texts.get((r, c))
+            if text is None:
+                if count == 0:
+                    continue
+                text = self.ax_heatmap.text(c, r, '', ha='center', va='center', fontsize=14,
+                                            fontweight='bold', clip_on=True,
+                                            visible=self.heatmap_labels_on,
+                                            animated=self.heatmap_img.get_animated())
+                self.heatmap_texts[(r, c)] = text
+            text.set_text(str(count) if count > 0 else '')
+            # Change text color based on background
+            text.set_color('white' if count > 2 else 'black')
+            if count > 0:
+                self.heatmap_shown.add((r, c))
+            else:
+                self.heatmap_shown.discard((r, c))
+
+        # Update stats line
+        self.stats_text.set_text(
+            f'Tick {tick} | '
             f'Active Patients: {stats["active_patients"]} | '
             f'Waiting: {stats["waiting"]} | '
             f'Nurses: {stats["nurses_busy"]}/{stats["nurses_total"]} | '
-            f'Doctors: {stats["doctors_busy"]}/{stats["doctors_total"]}',
-            fontsize=14, fontweight='bold'
+            f'Doctors: {stats["doctors_busy"]}/{stats["doctors_total"]}'
         )
 
-        return self.ax_grid.patches + [self.heatmap_img]
+        return self.animated_artists()
+
+    def animated_artists(self):
+        """
+        Artists that change between frames. With blit=True the rest of the
+        figure is drawn once and only these are redrawn, so the non-empty
+        heatmap labels are included each frame, changed or not.
+        """
+        labels = []
+        if self.heatmap_labels_on:
+            labels = [self.heatmap_texts[cell] for cell in self.heatmap_shown]
+        return list(self.agent_artists.values()) + [self.heatmap_img, self.stats_text] + labels
+
+    def init_frame(self):
+        """FuncAnimation init_func: the artists to exclude from the blitted background."""
+        return list(self.agent_artists.values()) + [self.heatmap_img, self.stats_text] + list(self.heatmap_texts.values())
+
+    @classmethod
+    def from_trace(cls, trace, **kwargs):
+        """Visualizer for replaying a recording.Trace (no live simulation needed)."""
+        return cls(trace.hospital.tolist(), [], [], trace.treatment_rooms(), **kwargs)
+
+    def seek(self, trace, tick):
+        """Draw the recorded state right after `tick`."""
+        frame = next(trace.frames(start=tick, stop=tick + 1, num_interp_frames=1))
+        frame["prev_positions"] = frame["curr_positions"]
+        frame["swaps"] = []
+        return self.update(frame)
+
+    def replay(self, trace, start=None, stop=None, speed=1.0, step=1, interval=100, show=True):
+        """
+        Animate a recording.Trace, optionally only the ticks in [start, stop).
+
+        speed scales the playback rate (2.0 = twice as fast) and step shows
+        every step-th tick; neither re-runs the simulation.
+        """
+        frames = trace.frames(start, stop, step=step, num_interp_frames=self.num_interp_frames)
+        self.anim = FuncAnimation(
+            self.fig,
+            self.update,
+            frames=frames,
+            init_func=self.init_frame,
+            interval=max(1, int(interval / speed)),
+            blit=True,
+            repeat=False,
+            cache_frame_data=False,
+        )
+        if show:
+            self.show()
+        return self.anim
 
     def show(self):
         plt.tight_layout()
@@ -0,0 +1,190 @@
+"""
+HTTP client for Wood Wide AI inference.
+
+One WoodWideClient per (api key, base URL), shared through get_client, so
+every analysis of a run or sweep reuses the same pooled connections. Each
+request has connect and read timeouts, and failed attempts (connection
+errors, timeouts, 429 and 5xx) are retried with jittered exponential
+backoff until the client's deadline. Datasets are uploaded from memory.
+
+run_in_background runs any call (e.g. an analysis) on a small shared
+thread pool and returns a concurrent.futures.Future, so a simulation can
+keep going while inference is in flight.
+"""
+import io
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
+
+# Statuses worth another attempt: rate limiting and transient server errors
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+BACKGROUND_WORKERS = 4
+
+_clients = {}
+_clients_lock = threading.Lock()
+_executor = None
+_executor_lock = threading.Lock()
+
+
+class WoodWideError(requests.exceptions.RequestException):
+    """A Wood Wide request answered with an error status (after any retries)."""
+    def __init__(self, status_code, text, step):
+        super().__init__(f"{step} failed with status {status_code}")
+        self.status_code = status_code
+        self.text = text
+        self.step = step
+
+
+class WoodWideClient:
+    """
+    Pooled, retrying Wood Wide AI client.
+
+    Args:
+        api_key: Bearer token
+        base_url: API root, e.g. https://beta.woodwide.ai
+        connect_timeout, read_timeout: Per-attempt timeouts in seconds
+        retries: Extra attempts after the first for retryable failures
+        backoff: Base delay in seconds; attempt n waits up to backoff * 2**n
+        max_backoff: Cap on a single delay
+        deadline: Seconds after which no further attempt is started
+        pool_size: Connections kept open to the host
+    """
+    def __init__(
+        self,
+        api_key,
+        base_url="https://beta.woodwide.ai",
+        connect_timeout=5.0,
+        read_timeout=60.0,
+        retries=3,
+        backoff=0.5,
+        max_backoff=8.0,
+        deadline=180.0,
+        pool_size=8,
+        seed=None,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = (connect_timeout, read_timeout)
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.deadline = deadline
+        self.rng = random.Random(seed)
+        self.attempts = 0
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({"accept": "application/json", "Authorization": f"Bearer {api_key}"})
+
+    def _delay(self, attempt, response=None):
+        """Full-jitter backoff, or the server's Retry-After if it asks for longer."""
+        delay = self.rng.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after is not None:
+            try:
+                delay = max(delay, min(float(retry_after), self.max_backoff))
+            except ValueError:
+                pass
+        return delay
+
+    def post(self, path, step, **kwargs):
+        """
+        POST to base_url + path, retrying retryable failures. Returns the
+        decoded JSON body; raises WoodWideError for an error status and the
+        last requests exception if every attempt failed to connect.
+
+        File payloads must be seekable; they are rewound before each attempt.
+        """
+        start = time.monotonic()
+        files = kwargs.get("files") or {}
+        for attempt in range(self.retries + 1):
+            for spec in files.values():
+                spec[1].seek(0)
+            self.attempts += 1
+            response = None
+            try:
+                response = self.session.post(self.base_url + path, timeout=self.timeout, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                if attempt == self.retries:
+                    raise
+                error = None
+            else:
+                if response.status_code == 200:
+                    return response.json()
+                error = WoodWideError(response.status_code, response.text, step)
+                if response.status_code not in RETRY_STATUSES or attempt == self.retries:
+                    raise error
+
+            delay = self._delay(attempt, response)
+            if time.monotonic() - start + delay > self.deadline:
+                if error is not None:
+                    raise error
+                raise requests.exceptions.Timeout(f"{step}: deadline of {self.deadline}s reached")
+            time.sleep(delay)
+
+    def upload_dataset(self, valid_points, name, filename="congestion_infer.csv"):
+        """Upload (rows, cols, congestion) points as a row,col,congestion CSV dataset; returns its id."""
+        point_rows, point_cols, point_congestion = valid_points
+        buffer = io.BytesIO()
+        np.savetxt(
+            buffer,
+            np.column_stack([point_rows, point_cols, point_congestion]),
+            fmt=("%d", "%d", "%.4f"),
+            delimiter=",",
+            header="row,col,congestion",
+            comments="",
+        )
+        body = self.post(
+            "/api/datasets",
+            "upload",
+            files={"file": (filename, buffer, "text/csv")},
+            data={"name": name, "overwrite": "true"},
+        )
+        return body.get("id")
+
+    def infer(self, model_id, dataset_id):
+        """Run an existing model on an uploaded dataset; returns the response JSON."""
+        return self.post(f"/api/models/prediction/{model_id}/infer", "inference", params={"dataset_id": dataset_id})
+
+    def infer_points(self, valid_points, model_id, name):
+        """upload_dataset then infer in one call."""
+        return self.infer(model_id, self.upload_dataset(valid_points, name))
+
+    def infer_points_async(self, valid_points, model_id, name):
+        """infer_points on the background pool; returns a Future."""
+        return run_in_background(self.infer_points, valid_points, model_id, name)
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def get_client(api_key, base_url, **kwargs):
+    """The shared WoodWideClient for (api_key, base_url), created on first use."""
+    key = (api_key, base_url.rstrip("/"))
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = _clients[key] = WoodWideClient(api_key, base_url, **kwargs)
+        return client
+
+
+def run_in_background(fn, *args, **kwargs):
+    """Run fn(*args, **kwargs) on the shared background thread pool; returns a Future."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=BACKGROUND_WORKERS, thread_name_prefix="woodwide")
+    return _executor.submit(fn, *args, **kwargs)